@@ -0,0 +1,257 @@
+# demand analytics: how long demands stay open (per category and per assignee) and how many are
+# completed each week. counts and averages are aggregated by the database, percentiles are
+# calculated over compact arrays of durations. reports are cached per period
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import TruncWeek
+from django.utils.timezone import localtime, now
+from demands.models import (
+    ArchivedDemandHistory,
+    changed_fields_mask,
+    Demands,
+    DemandsHistory,
+)
+from utils.date_filters import local_midnight
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure python percentiles give the same result
+    np = None
+
+
+# seconds a report stays cached (a closed period only changes if a demand is restored)
+ANALYTICS_CACHE_TIMEOUT = getattr(settings, "ANALYTICS_CACHE_TIMEOUT", 60 * 10)
+ANALYTICS_CACHE_PREFIX = "demands_analytics"
+PERCENTILES = [50, 90]
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def completion_events(history_model, first_day, last_day):
+    # the revision that completed each demand, for demands completed within the period.
+    # a demand restored and completed again counts once, by its last completion
+    completed_mask = changed_fields_mask(["completed"])
+    completions = history_model.objects.alias(
+        completed_changed=F("changed_fields").bitand(completed_mask)
+    ).filter(completed_changed__gt=0, data__completed=True)
+
+    last_completion = (
+        completions.filter(demand=OuterRef("demand"))
+        .order_by("-revision")
+        .values("revision")[:1]
+    )
+    events = completions.filter(
+        demand__completed=True,
+        created_at__gte=local_midnight(first_day),
+        created_at__lt=local_midnight(last_day + timedelta(days=1)),
+        revision=Subquery(last_completion),
+    )
+    if history_model is ArchivedDemandHistory:
+        # the archive is organised by year of completion
+        events = events.filter(year__gte=first_day.year, year__lte=last_day.year)
+
+    return events.annotate(
+        lead_time=ExpressionWrapper(
+            F("created_at") - F("demand__created_at"), output_field=DurationField()
+        )
+    )
+
+
+def weekly_throughput(events):
+    # {monday: completed demands}
+    return {
+        localtime(row["week"]).date(): row["total"]
+        for row in events.annotate(week=TruncWeek("created_at"))
+        .values("week")
+        .annotate(total=Count("id"))
+        .order_by()
+    }
+
+
+def grouped_averages(events, field):
+    # {value of the field: (completed demands, average lead time)}
+    return {
+        row[field]: (row["total"], row["average"])
+        for row in events.values(field)
+        .annotate(total=Count("id"), average=Avg("lead_time"))
+        .order_by()
+    }
+
+
+def percentile(values, q):
+    # linear interpolation between the closest ranks (same as numpy's default method)
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def grouped_percentiles(keys, seconds):
+    # {key: [p50, p90]} of the seconds of each key. keys and seconds are parallel sequences
+    if not keys:
+        return {}
+
+    if np is not None:
+        codes_by_key = {}
+        codes = np.fromiter(
+            (codes_by_key.setdefault(key, len(codes_by_key)) for key in keys),
+            dtype=np.int32,
+            count=len(keys),
+        )
+        values = np.asarray(seconds, dtype=np.float64)
+
+        # one sort puts every group in a contiguous slice
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        values = values[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        keys_by_code = {code: key for key, code in codes_by_key.items()}
+
+        return {
+            keys_by_code[int(codes[start])]: np.percentile(group, PERCENTILES).tolist()
+            for start, group in zip(starts, np.split(values, starts[1:]))
+        }
+
+    groups = {}
+    for key, value in zip(keys, seconds):
+        groups.setdefault(key, []).append(value)
+    return {key: [percentile(values, q) for q in PERCENTILES] for key, values in groups.items()}
+
+
+def in_days(seconds):
+    return round(seconds / SECONDS_PER_DAY, 1) if seconds is not None else None
+
+
+def user_names(user_ids):
+    users = (
+        get_user_model()
+        .objects.filter(id__in=[user_id for user_id in user_ids if user_id])
+        .only("username", "first_name", "last_name")
+    )
+    names = {user.id: str(user) for user in users}
+    names[None] = "Sem executor"
+    return names
+
+
+def summary_rows(groups, names):
+    # rows of the report table, most completed demands first.
+    # groups: {key: {"completed", "average", "percentiles", "open", "open_percentiles"}}
+    rows = []
+    for key, group in groups.items():
+        percentiles = group.get("percentiles") or [None] * len(PERCENTILES)
+        open_percentiles = group.get("open_percentiles") or [None] * len(PERCENTILES)
+        rows.append(
+            {
+                "name": names.get(key, key) or "Sem categoria",
+                "completed": group.get("completed", 0),
+                "average_days": in_days(group.get("average")),
+                "p50_days": in_days(percentiles[0]),
+                "p90_days": in_days(percentiles[1]),
+                "open": group.get("open", 0),
+                "open_p50_days": in_days(open_percentiles[0]),
+                "open_p90_days": in_days(open_percentiles[1]),
+            }
+        )
+    return sorted(rows, key=lambda row: (-row["completed"], -row["open"], row["name"]))
+
+
+def period_weeks(first_day, last_day):
+    # mondays of every week that touches the period
+    monday = first_day - timedelta(days=first_day.weekday())
+    weeks = []
+    while monday <= last_day:
+        weeks.append(monday)
+        monday += timedelta(weeks=1)
+    return weeks
+
+
+def build_report(first_day, last_day):
+    dimensions = {"category": "demand__category", "assigned_to": "demand__assigned_to"}
+    groups = {dimension: {} for dimension in dimensions}
+    throughput = {}
+    keys = {dimension: [] for dimension in dimensions}
+    seconds = []
+
+    # current and archived demands, aggregated separately and merged here
+    for history_model in [DemandsHistory, ArchivedDemandHistory]:
+        events = completion_events(history_model, first_day, last_day)
+
+        for week, total in weekly_throughput(events).items():
+            throughput[week] = throughput.get(week, 0) + total
+
+        for dimension, field in dimensions.items():
+            for key, (total, average) in grouped_averages(events, field).items():
+                group = groups[dimension].setdefault(key, {"completed": 0, "average": 0})
+                # weighted mean of the two tables
+                merged = group["completed"] + total
+                group["average"] = (
+                    group["average"] * group["completed"] + average.total_seconds() * total
+                ) / merged
+                group["completed"] = merged
+
+        # compact arrays for the percentiles: one key per dimension and the lead time in seconds
+        for category, assigned_to, lead_time in events.values_list(
+            "demand__category", "demand__assigned_to", "lead_time"
+        ):
+            keys["category"].append(category)
+            keys["assigned_to"].append(assigned_to)
+            seconds.append(lead_time.total_seconds())
+
+    for dimension in dimensions:
+        for key, values in grouped_percentiles(keys[dimension], seconds).items():
+            groups[dimension][key]["percentiles"] = values
+
+    # demands still open: how old they are now
+    current_time = now()
+    open_keys = {dimension: [] for dimension in dimensions}
+    open_seconds = []
+    for category, assigned_to, created_at in Demands.objects.filter(
+        completed=False, created_at__isnull=False
+    ).values_list("category", "assigned_to", "created_at"):
+        open_keys["category"].append(category)
+        open_keys["assigned_to"].append(assigned_to)
+        open_seconds.append((current_time - created_at).total_seconds())
+
+    for dimension in dimensions:
+        open_counts = Counter(open_keys[dimension])
+        for key, values in grouped_percentiles(open_keys[dimension], open_seconds).items():
+            group = groups[dimension].setdefault(key, {})
+            group["open"] = open_counts[key]
+            group["open_percentiles"] = values
+
+    names = user_names(groups["assigned_to"])
+    total_completed = sum(throughput.values())
+
+    return {
+        "first_day": first_day,
+        "last_day": last_day,
+        "calculated_at": current_time,
+        "completed": total_completed,
+        "open": len(open_seconds),
+        "lead_time_days": [
+            in_days(value)
+            for value in (
+                grouped_percentiles([None] * len(seconds), seconds).get(None)
+                or [None] * len(PERCENTILES)
+            )
+        ],
+        "weeks": [
+            {"monday": monday, "completed": throughput.get(monday, 0)}
+            for monday in period_weeks(first_day, last_day)
+        ],
+        "categories": summary_rows(groups["category"], {}),
+        "assignees": summary_rows(groups["assigned_to"], names),
+    }
+
+
+def demand_analytics(first_day, last_day):
+    key = f"{ANALYTICS_CACHE_PREFIX}:{first_day.isoformat()}:{last_day.isoformat()}"
+    report = cache.get(key)
+    if report is None:
+        report = build_report(first_day, last_day)
+        cache.set(key, report, ANALYTICS_CACHE_TIMEOUT)
+    return report
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DemandsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'demands'
+
+    def ready(self):
+        # registers the signal receivers
+        from demands import signals  # noqa: F401
@@ -0,0 +1,96 @@
+# moves old completed demands (and their history) to the archive tables, keeping the demands
+# table small: open demands and recent completed ones only
+from django.db import transaction
+from django.utils.timezone import localtime
+from demands.models import (
+    ArchivedDemand,
+    ArchivedDemandHistory,
+    Demands,
+    DemandsHistory,
+)
+
+
+# columns copied as they are
+DEMAND_FIELDS = [
+    "category",
+    "title",
+    "description",
+    "due_date",
+    "assigned_to_id",
+    "assigned_by_id",
+    "created_at",
+    "updated_at",
+    "completed",
+]
+HISTORY_FIELDS = [
+    "revision",
+    "is_checkpoint",
+    "data",
+    "changed_fields",
+    "created_at",
+]
+
+
+def archivable_demands(before):
+    # completed demands not changed since the given datetime
+    return Demands.objects.filter(completed=True, updated_at__lt=before)
+
+
+@transaction.atomic
+def archive_batch(demand_ids):
+    # locks the demands again: one may have been restored meanwhile
+    demands = list(
+        Demands.objects.select_for_update()
+        .filter(id__in=demand_ids, completed=True)
+        .only("id", *DEMAND_FIELDS)
+    )
+    if not demands:
+        return 0
+
+    years = {}
+    archived = []
+    for demand in demands:
+        years[demand.id] = localtime(demand.updated_at).year
+        archived.append(
+            ArchivedDemand(
+                original_id=demand.id,
+                year=years[demand.id],
+                **{field: getattr(demand, field) for field in DEMAND_FIELDS},
+            )
+        )
+    ArchivedDemand.objects.bulk_create(archived)
+
+    # {demand id: archived id} (bulk_create doesn't set the ids on mysql). if the id of a
+    # demand was archived before, the newest archived row is the one just created
+    archived_ids = dict(
+        ArchivedDemand.objects.filter(original_id__in=years)
+        .order_by("id")
+        .values_list("original_id", "id")
+    )
+
+    ArchivedDemandHistory.objects.bulk_create(
+        ArchivedDemandHistory(
+            demand_id=archived_ids[entry.demand_id],
+            year=years[entry.demand_id],
+            **{field: getattr(entry, field) for field in HISTORY_FIELDS},
+        )
+        for entry in DemandsHistory.objects.filter(demand_id__in=years)
+    )
+
+    # history and search tokens go with the demands (cascade)
+    Demands.objects.filter(id__in=years).delete()
+    return len(archived)
+
+
+def archive_demands(before, batch_size=500):
+    # small transactions, so the demands table is never locked for long
+    total = 0
+    while True:
+        demand_ids = list(
+            archivable_demands(before).order_by("id").values_list("id", flat=True)[
+                :batch_size
+            ]
+        )
+        if not demand_ids:
+            return total
+        total += archive_batch(demand_ids)
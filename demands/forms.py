@@ -51,7 +51,7 @@ class DemandsForm(forms.ModelForm):
 
         # formats the date to ISO 8601 format (yyyy-MM-dd)
         if self.initial.get("due_date"):
-            self.initial["due_date"] = self.inital["due_date"].strftime("%Y-%m-%d")
+            self.initial["due_date"] = self.initial["due_date"].strftime("%Y-%m-%d")
 
         # turning fields into readonly if user is in the history page or if demand is completed (can't edit)
         if readonly or demand and demand.completed:
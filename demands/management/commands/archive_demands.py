@@ -0,0 +1,46 @@
+# scheduled job that moves old completed demands to the archive tables (see notes.txt)
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from demands.archive import archivable_demands, archive_demands
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Moves completed demands older than the given months, with their history, to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=12,
+            help="Completed demands not changed for this many months are archived (default: 12).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Demands moved per transaction (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only counts the demands, without moving them.",
+        )
+
+    def handle(self, *args, **options):
+        before = now() - relativedelta(months=options["months"])
+
+        if options["dry_run"]:
+            pending = archivable_demands(before).count()
+            self.stdout.write(f"{pending} demanda(s) a arquivar.")
+            return
+
+        archived = archive_demands(before, options["batch_size"])
+        logger.info(
+            f"ARCHIVE_DEMANDS | {archived} demanda(s) arquivada(s) (anteriores a {before.strftime('%d/%m/%Y')})."
+        )
+        self.stdout.write(self.style.SUCCESS(f"{archived} demanda(s) arquivada(s)."))
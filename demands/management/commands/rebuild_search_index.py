@@ -0,0 +1,16 @@
+# rebuilds the search index of the demands (DemandSearchToken) from the demands table
+from django.core.management.base import BaseCommand
+from demands.search import rebuild_search_index
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search index of the demands (DemandSearchToken)."
+
+    def handle(self, *args, **options):
+        demands = rebuild_search_index()
+        logger.info(f"REBUILD_SEARCH_INDEX | {demands} demanda(s) indexada(s).")
+        self.stdout.write(self.style.SUCCESS(f"{demands} demanda(s) indexada(s)."))
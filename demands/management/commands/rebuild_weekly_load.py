@@ -0,0 +1,16 @@
+# rebuilds the weekly workload rollup (DemandWeeklyLoad) from the demands table
+from django.core.management.base import BaseCommand
+from demands.services import rebuild_weekly_load
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the open demands per user and week (DemandWeeklyLoad)."
+
+    def handle(self, *args, **options):
+        rows = rebuild_weekly_load()
+        logger.info(f"REBUILD_WEEKLY_LOAD | {rows} linha(s) recriada(s).")
+        self.stdout.write(self.style.SUCCESS(f"{rows} linha(s) recriada(s)."))
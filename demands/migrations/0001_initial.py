@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Demands',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[(None, '---------'), ('Suporte Técnico', 'Suporte Técnico'), ('Administrativo', 'Administrativo')], max_length=20, null=True)),
+                ('title', models.CharField(max_length=255, null=True)),
+                ('description', models.TextField(null=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('completed', models.BooleanField(blank=True, default=False)),
+            ],
+            options={
+                'db_table': 'demands',
+            },
+        ),
+        migrations.CreateModel(
+            name='DemandsHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[(None, '---------'), ('Suporte Técnico', 'Suporte Técnico'), ('Administrativo', 'Administrativo')], max_length=20, null=True)),
+                ('title', models.CharField(max_length=255, null=True)),
+                ('description', models.TextField(null=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('completed', models.BooleanField(blank=True, default=False)),
+            ],
+            options={
+                'db_table': 'demands_history',
+            },
+        ),
+    ]
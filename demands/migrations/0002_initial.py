@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 03:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('demands', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demands',
+            name='assigned_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dem_assigned_by', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='demands',
+            name='assigned_to',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dem_assigned_to', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='demandshistory',
+            name='assigned_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demh_assigned_by', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='demandshistory',
+            name='assigned_to',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demh_assigned_to', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='demandshistory',
+            name='demand',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history_entries', to='demands.demands'),
+        ),
+        migrations.AddIndex(
+            model_name='demands',
+            index=models.Index(fields=['completed', 'assigned_to', '-updated_at', '-created_at'], name='demands_assigned_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demands',
+            index=models.Index(fields=['completed', '-updated_at', '-created_at'], name='demands_completed_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 03:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_weekly_load(apps, schema_editor):
+    Demands = apps.get_model("demands", "Demands")
+    DemandWeeklyLoad = apps.get_model("demands", "DemandWeeklyLoad")
+
+    counts = {}
+    for user_id, due_date in Demands.objects.filter(
+        completed=False, assigned_to__isnull=False, due_date__isnull=False
+    ).values_list("assigned_to", "due_date").iterator():
+        iso_year, iso_week, _ = due_date.isocalendar()
+        key = (user_id, iso_year, iso_week)
+        counts[key] = counts.get(key, 0) + 1
+
+    DemandWeeklyLoad.objects.bulk_create(
+        DemandWeeklyLoad(
+            user_id=user_id, iso_year=iso_year, iso_week=iso_week, open_count=count
+        )
+        for (user_id, iso_year, iso_week), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandWeeklyLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iso_year', models.PositiveSmallIntegerField()),
+                ('iso_week', models.PositiveSmallIntegerField()),
+                ('open_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dem_weekly_load', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'demands_weekly_load',
+                'indexes': [models.Index(fields=['iso_year', 'iso_week'], name='demands_weekly_load_week_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'iso_year', 'iso_week'), name='demands_weekly_load_unique')],
+            },
+        ),
+        migrations.RunPython(fill_weekly_load, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 03:28
+
+import re
+import unicodedata
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# tokenizer of demands/search.py at the time of this migration
+FIELD_WEIGHTS = [
+    ("title", 3),
+    ("category", 2),
+    ("description", 1),
+]
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 40
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo", "por",
+    "que", "se", "um", "uma",
+}
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in re.findall(r"\w+", text)
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def demand_tokens(demand):
+    tokens = {}
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(getattr(demand, field)):
+            tokens[token] = tokens.get(token, 0) + weight
+    return tokens
+
+
+def fill_search_index(apps, schema_editor):
+    Demands = apps.get_model("demands", "Demands")
+    DemandSearchToken = apps.get_model("demands", "DemandSearchToken")
+
+    DemandSearchToken.objects.bulk_create(
+        (
+            DemandSearchToken(demand_id=demand.id, token=token, weight=min(weight, 32767))
+            for demand in Demands.objects.only("title", "category", "description").iterator()
+            for token, weight in demand_tokens(demand).items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0003_weekly_load'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('demand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='demands.demands')),
+            ],
+            options={
+                'db_table': 'demands_search_token',
+                'indexes': [models.Index(fields=['token', 'demand'], name='demands_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
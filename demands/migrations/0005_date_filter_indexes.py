@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0004_search_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demands',
+            index=models.Index(fields=['completed', 'due_date'], name='demands_completed_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demands',
+            index=models.Index(fields=['completed', 'created_at'], name='demands_completed_created_idx'),
+        ),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.2 on 2026-10-18 03:40
+
+import json
+import django.core.serializers.json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+
+# values of demands.models at the time of this migration
+HISTORY_FIELDS = [
+    "category",
+    "title",
+    "description",
+    "due_date",
+    "assigned_to",
+    "assigned_by",
+    "completed",
+]
+HISTORY_CHECKPOINT_INTERVAL = 10
+
+
+def convert_history(apps, schema_editor):
+    # full copies -> revisions with the changed fields, a checkpoint every n revisions
+    DemandsHistory = apps.get_model("demands", "DemandsHistory")
+    fields = [DemandsHistory._meta.get_field(name) for name in HISTORY_FIELDS]
+
+    converted = []
+    demand_id = None
+    for entry in DemandsHistory.objects.order_by("demand_id", "created_at", "id").iterator():
+        state = json.loads(
+            json.dumps(
+                {field.name: field.value_from_object(entry) for field in fields},
+                cls=DjangoJSONEncoder,
+            )
+        )
+
+        if entry.demand_id != demand_id:
+            demand_id = entry.demand_id
+            revision = 0
+            since_checkpoint = HISTORY_CHECKPOINT_INTERVAL
+            recorded_state = {}
+
+        revision += 1
+        entry.revision = revision
+        if since_checkpoint >= HISTORY_CHECKPOINT_INTERVAL:
+            entry.is_checkpoint = True
+            entry.data = state
+            since_checkpoint = 1
+        else:
+            entry.is_checkpoint = False
+            entry.data = {
+                name: value
+                for name, value in state.items()
+                if name not in recorded_state or recorded_state[name] != value
+            }
+            since_checkpoint += 1
+        recorded_state = state
+        converted.append(entry)
+
+        if len(converted) >= 500:
+            DemandsHistory.objects.bulk_update(
+                converted, ["revision", "is_checkpoint", "data"]
+            )
+            converted = []
+
+    DemandsHistory.objects.bulk_update(converted, ["revision", "is_checkpoint", "data"])
+
+
+def restore_snapshots(apps, schema_editor):
+    # reverse: every revision becomes a full copy again, with the state replayed up to it
+    DemandsHistory = apps.get_model("demands", "DemandsHistory")
+    fields = [DemandsHistory._meta.get_field(name) for name in HISTORY_FIELDS]
+
+    restored = []
+    demand_id = None
+    for entry in DemandsHistory.objects.order_by("demand_id", "revision").iterator():
+        if entry.demand_id != demand_id:
+            demand_id = entry.demand_id
+            state = {}
+
+        state = dict(entry.data) if entry.is_checkpoint else {**state, **entry.data}
+        for field in fields:
+            setattr(entry, field.attname, field.to_python(state.get(field.name)))
+        entry.completed = bool(entry.completed)
+        entry.updated_at = entry.created_at
+        restored.append(entry)
+
+        if len(restored) >= 500:
+            DemandsHistory.objects.bulk_update(
+                restored, [field.name for field in fields] + ["updated_at"]
+            )
+            restored = []
+
+    DemandsHistory.objects.bulk_update(
+        restored, [field.name for field in fields] + ["updated_at"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0005_date_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandshistory',
+            name='revision',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='demandshistory',
+            name='is_checkpoint',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='demandshistory',
+            name='data',
+            field=models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.RunPython(convert_history, restore_snapshots),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='assigned_by',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='assigned_to',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='category',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='completed',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='due_date',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='demandshistory',
+            name='updated_at',
+        ),
+        migrations.AlterField(
+            model_name='demandshistory',
+            name='revision',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='demandshistory',
+            constraint=models.UniqueConstraint(fields=('demand', 'revision'), name='demands_history_revision_unique'),
+        ),
+    ]
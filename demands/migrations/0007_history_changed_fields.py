@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+# values of demands.models at the time of this migration
+HISTORY_FIELDS = [
+    "category",
+    "title",
+    "description",
+    "due_date",
+    "assigned_to",
+    "assigned_by",
+    "completed",
+]
+
+
+def fill_changed_fields(apps, schema_editor):
+    # replays the revisions of each demand and compares every one with the previous state
+    DemandsHistory = apps.get_model("demands", "DemandsHistory")
+
+    updated = []
+    demand_id = None
+    for entry in DemandsHistory.objects.order_by("demand_id", "revision").iterator():
+        if entry.demand_id != demand_id:
+            demand_id = entry.demand_id
+            state = None
+
+        if state is not None:
+            entry.changed_fields = 0
+            for position, name in enumerate(HISTORY_FIELDS):
+                if name in entry.data and (name not in state or state[name] != entry.data[name]):
+                    entry.changed_fields |= 1 << position
+            updated.append(entry)
+
+        state = dict(entry.data) if entry.is_checkpoint else {**state, **entry.data}
+
+        if len(updated) >= 500:
+            DemandsHistory.objects.bulk_update(updated, ["changed_fields"])
+            updated = []
+
+    DemandsHistory.objects.bulk_update(updated, ["changed_fields"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0006_history_deltas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandshistory',
+            name='changed_fields',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_changed_fields, migrations.RunPython.noop),
+    ]
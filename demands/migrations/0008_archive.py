@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-18 03:41
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0007_history_changed_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDemand',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('category', models.CharField(choices=[(None, '---------'), ('Suporte Técnico', 'Suporte Técnico'), ('Administrativo', 'Administrativo')], max_length=20, null=True)),
+                ('title', models.CharField(max_length=255, null=True)),
+                ('description', models.TextField(null=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('completed', models.BooleanField(blank=True, default=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('assigned_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dem_archived_assigned_by', to=settings.AUTH_USER_MODEL)),
+                ('assigned_to', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dem_archived_assigned_to', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'demands_archive',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ArchivedDemandHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('revision', models.PositiveIntegerField()),
+                ('is_checkpoint', models.BooleanField(default=False)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('changed_fields', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('demand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history_entries', to='demands.archiveddemand')),
+            ],
+            options={
+                'db_table': 'demands_history_archive',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddemand',
+            index=models.Index(fields=['year', '-updated_at', '-created_at'], name='demands_archive_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddemand',
+            index=models.Index(fields=['assigned_to', '-updated_at', '-created_at'], name='demands_archive_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddemandhistory',
+            index=models.Index(fields=['year'], name='demands_harchive_year_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='archiveddemandhistory',
+            constraint=models.UniqueConstraint(fields=('demand', 'revision'), name='demands_history_archive_revision_unique'),
+        ),
+    ]
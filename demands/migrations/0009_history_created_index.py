@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0008_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandshistory',
+            index=models.Index(fields=['created_at'], name='demands_history_created_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+import re
+import unicodedata
+from django.db import migrations
+
+
+# tokenizer of demands/search.py at the time of this migration
+FIELD_WEIGHTS = [
+    ("title", 3),
+    ("category", 2),
+    ("description", 1),
+]
+USER_FIELD_WEIGHTS = [
+    ("assigned_to", 1),
+    ("assigned_by", 1),
+]
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 40
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo", "por",
+    "que", "se", "um", "uma",
+}
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in re.findall(r"\w+", text)
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def demand_tokens(demand):
+    texts = [(getattr(demand, field), weight) for field, weight in FIELD_WEIGHTS]
+    for field, weight in USER_FIELD_WEIGHTS:
+        user = getattr(demand, field)
+        if user is not None:
+            texts.append((user.username, weight))
+
+    tokens = {}
+    for text, weight in texts:
+        for token in tokenize(text):
+            tokens[token] = tokens.get(token, 0) + weight
+    return tokens
+
+
+def rebuild_search_index(apps, schema_editor):
+    # the usernames of the users of each demand become searchable words
+    Demands = apps.get_model("demands", "Demands")
+    DemandSearchToken = apps.get_model("demands", "DemandSearchToken")
+
+    DemandSearchToken.objects.all().delete()
+    demands = Demands.objects.select_related("assigned_to", "assigned_by").only(
+        "title",
+        "category",
+        "description",
+        "assigned_to__username",
+        "assigned_by__username",
+    )
+    DemandSearchToken.objects.bulk_create(
+        (
+            DemandSearchToken(demand_id=demand.id, token=token, weight=min(weight, 32767))
+            for demand in demands.iterator(chunk_size=500)
+            for token, weight in demand_tokens(demand).items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demands', '0009_history_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
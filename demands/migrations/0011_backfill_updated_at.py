@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+# the api cursor is (updated_at, id): rows created before updated_at existed have it null and
+# can't be compared. they get the creation date (or the migration date if that is null too)
+def backfill_updated_at(apps, schema_editor):
+    Demands = apps.get_model("demands", "Demands")
+    Demands.objects.filter(updated_at__isnull=True).update(
+        updated_at=Coalesce("created_at", Value(timezone.now()))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("demands", "0010_search_usernames"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+# archived demands used to keep the id of the demand as their primary key: it becomes
+# original_id and the archive gets ids of its own (the existing ones are kept)
+def copy_original_ids(apps, schema_editor):
+    ArchivedDemand = apps.get_model("demands", "ArchivedDemand")
+    ArchivedDemand.objects.update(original_id=F("id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("demands", "0011_backfill_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archiveddemand",
+            name="original_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(copy_original_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="archiveddemand",
+            name="original_id",
+            field=models.BigIntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="archiveddemand",
+            name="id",
+            field=models.BigAutoField(
+                auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+            ),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Subquery
 from django.conf import settings
 
 
@@ -8,11 +11,118 @@ CATEGORY_CHOICES = [
     ("Administrativo", "Administrativo"),
 ]
 
+# fields of a demand kept in its history (DemandsHistory.data).
+# the position is the bit in DemandsHistory.changed_fields: only append new fields
+HISTORY_FIELDS = [
+    "category",
+    "title",
+    "description",
+    "due_date",
+    "assigned_to",
+    "assigned_by",
+    "completed",
+]
+HISTORY_FIELD_LABELS = {
+    "category": "Categoria",
+    "title": "Título",
+    "description": "Descrição",
+    "due_date": "Prazo",
+    "assigned_to": "Executor",
+    "assigned_by": "Gestor",
+    "completed": "Concluída",
+}
+# every nth revision stores the full state, so rebuilding any revision reads at most n rows
+HISTORY_CHECKPOINT_INTERVAL = 10
+
+
+def changed_fields_mask(names):
+    mask = 0
+    for name in names:
+        mask |= 1 << HISTORY_FIELDS.index(name)
+    return mask
+
+
+# history api shared by Demands and ArchivedDemand (both have history_entries)
+class DemandHistoryMixin:
+    def history_state(self):
+        # current values of the fields kept in the history, as stored in DemandsHistory.data
+        state = {
+            name: self._meta.get_field(name).value_from_object(self)
+            for name in HISTORY_FIELDS
+        }
+        return json.loads(json.dumps(state, cls=DjangoJSONEncoder))
+
+    def snapshot(self, state, entry):
+        # unsaved copy of the demand with the values of a revision
+        values = {}
+        for name, value in state.items():
+            field = self._meta.get_field(name)
+            values[field.attname] = field.to_python(value)
+
+        demand = type(self)(
+            id=self.id,
+            created_at=self.created_at,
+            updated_at=entry.created_at,
+            **values,
+        )
+        demand.revision = entry.revision
+        demand.history = entry
+        return demand
 
-class Demands(models.Model):
+    def history_snapshots(self, first_revision, last_revision):
+        # state of the demand at each revision between first and last (oldest first), in one query:
+        # the deltas are replayed from the closest checkpoint before the first revision
+        checkpoint = (
+            self.history_entries.filter(
+                is_checkpoint=True, revision__lte=first_revision
+            )
+            .order_by("-revision")
+            .values("revision")[:1]
+        )
+        entries = self.history_entries.filter(
+            revision__gte=Subquery(checkpoint),
+            revision__lte=last_revision,
+        ).order_by("revision")
+
+        snapshots = []
+        state = {}
+        for entry in entries:
+            state = dict(entry.data) if entry.is_checkpoint else {**state, **entry.data}
+            if entry.revision >= first_revision:
+                snapshots.append(self.snapshot(state, entry))
+        return snapshots
+
+    def state_at(self, revision):
+        # the demand as it was at the given revision (None if it doesn't exist)
+        snapshots = self.history_snapshots(revision, revision)
+        return snapshots[0] if snapshots else None
+
+
+class Demands(DemandHistoryMixin, models.Model):
     class Meta:
         db_table = "demands"
         # db_table = "demand_assignments"
+        indexes = [
+            # own demands list: completed + assigned_to, newest first
+            models.Index(
+                fields=["completed", "assigned_to", "-updated_at", "-created_at"],
+                name="demands_assigned_updated_idx",
+            ),
+            # managers list: completed only, newest first
+            models.Index(
+                fields=["completed", "-updated_at", "-created_at"],
+                name="demands_completed_updated_idx",
+            ),
+            # date filters (dq): one range per column, merged by the database
+            models.Index(
+                fields=["completed", "due_date"],
+                name="demands_completed_due_idx",
+            ),
+            models.Index(
+                fields=["completed", "created_at"],
+                name="demands_completed_created_idx",
+            ),
+        ]
 
     category = models.CharField(
         max_length=20, null=True, blank=False, choices=CATEGORY_CHOICES
@@ -46,10 +156,38 @@ class Demands(models.Model):
     # archived = models.BooleanField(default=False, null=False, blank=True)
 
 
-class DemandsHistory(models.Model):
+# shared by DemandsHistory and ArchivedDemandHistory
+class HistoryEntryMixin:
+    @property
+    def changed_field_names(self):
+        return [
+            name
+            for position, name in enumerate(HISTORY_FIELDS)
+            if self.changed_fields & (1 << position)
+        ]
+
+    @property
+    def changed_field_labels(self):
+        return [HISTORY_FIELD_LABELS[name] for name in self.changed_field_names]
+
+
+# history of a demand stored as deltas: each revision keeps only the fields that changed,
+# and every HISTORY_CHECKPOINT_INTERVAL revisions a checkpoint keeps the full state.
+# the state at a revision is rebuilt with Demands.state_at / Demands.history_snapshots
+class DemandsHistory(HistoryEntryMixin, models.Model):
     class Meta:
         db_table = "demands_history"
         # db_table = "demand_assignments_history"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["demand", "revision"],
+                name="demands_history_revision_unique",
+            ),
+        ]
+        indexes = [
+            # completions within a period (demands.analytics)
+            models.Index(fields=["created_at"], name="demands_history_created_idx"),
+        ]
 
     demand = models.ForeignKey(
         "Demands",
@@ -59,33 +197,143 @@ class DemandsHistory(models.Model):
         blank=False,
     )
 
+    # 1, 2, 3... for each demand
+    revision = models.PositiveIntegerField()
+    # full state (checkpoint) or only the changed fields (delta)
+    is_checkpoint = models.BooleanField(default=False)
+    # {field: value} of HISTORY_FIELDS, users by id and dates in iso format
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    # fields changed by this revision, one bit per HISTORY_FIELDS position (0 for the creation)
+    changed_fields = models.PositiveIntegerField(default=0)
+
+    # when the revision was recorded
+    created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+
+
+# open demands per user and iso week (by due_date), kept up to date by demands.services.record_history.
+# can be rebuilt from the demands table with "python manage.py rebuild_weekly_load"
+class DemandWeeklyLoad(models.Model):
+    class Meta:
+        db_table = "demands_weekly_load"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "iso_year", "iso_week"],
+                name="demands_weekly_load_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["iso_year", "iso_week"], name="demands_weekly_load_week_idx"
+            ),
+        ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="dem_weekly_load",
+    )
+    iso_year = models.PositiveSmallIntegerField()
+    iso_week = models.PositiveSmallIntegerField()
+    open_count = models.IntegerField(default=0)
+
+
+# search index of the demands: accent and case folded words of category, title and description.
+# kept up to date by demands.search.index_demand (called by demands.services.record_history)
+class DemandSearchToken(models.Model):
+    class Meta:
+        db_table = "demands_search_token"
+        indexes = [
+            # prefix search (token LIKE 'abc%') returning the demands
+            models.Index(fields=["token", "demand"], name="demands_search_token_idx"),
+        ]
+
+    demand = models.ForeignKey(
+        "Demands",
+        related_name="search_tokens",
+        on_delete=models.CASCADE,
+    )
+    token = models.CharField(max_length=40)
+    # relevance of the word in the demand (title counts more than description)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+
+# completed demands moved out of the demands table by "python manage.py archive_demands",
+# organised by the year they were completed, with their history
+class ArchivedDemand(DemandHistoryMixin, models.Model):
+    class Meta:
+        db_table = "demands_archive"
+        indexes = [
+            models.Index(
+                fields=["year", "-updated_at", "-created_at"],
+                name="demands_archive_year_idx",
+            ),
+            models.Index(
+                fields=["assigned_to", "-updated_at", "-created_at"],
+                name="demands_archive_assigned_idx",
+            ),
+        ]
+
+    # id the demand had in the demands table. archived rows have ids of their own:
+    # the id of an archived demand may be given to a new demand
+    original_id = models.BigIntegerField(db_index=True)
+    # year of completion (updated_at, local time)
+    year = models.PositiveSmallIntegerField()
+
     category = models.CharField(
         max_length=20, null=True, blank=False, choices=CATEGORY_CHOICES
     )
     title = models.CharField(max_length=255, null=True, blank=False)
     description = models.TextField(null=True, blank=False)
-    # deadline for completion
     due_date = models.DateField(null=True, blank=True)
 
-    # user who received the demand
     assigned_to = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
-        related_name="dem_assigned_to",
+        related_name="dem_archived_assigned_to",
         null=True,
         blank=False,
     )
-    # user who made the distribution
     assigned_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
-        related_name="dem_assigned_by",
+        related_name="dem_archived_assigned_by",
         null=True,
         blank=False,
     )
 
-    created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
-    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    # copied from the demand, not set automatically
+    created_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
 
-    completed = models.BooleanField(default=False, null=False, blank=True)
-    # archived = models.BooleanField(default=False, null=False, blank=True)
+    completed = models.BooleanField(default=True, null=False, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+class ArchivedDemandHistory(HistoryEntryMixin, models.Model):
+    class Meta:
+        db_table = "demands_history_archive"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["demand", "revision"],
+                name="demands_history_archive_revision_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["year"], name="demands_harchive_year_idx"),
+        ]
+
+    demand = models.ForeignKey(
+        "ArchivedDemand",
+        related_name="history_entries",
+        on_delete=models.CASCADE,
+    )
+    year = models.PositiveSmallIntegerField()
+
+    revision = models.PositiveIntegerField()
+    is_checkpoint = models.BooleanField(default=False)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    changed_fields = models.PositiveIntegerField(default=0)
+
+    # copied from the history, not set automatically
+    created_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,132 @@
+# full-text search of the demands, portable to any database: an app-maintained table of
+# folded words (DemandSearchToken), searched by prefix and ranked by relevance
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+from django.db.models import OuterRef, Q, Subquery, Sum, Value
+from demands.models import Demands, DemandSearchToken
+
+
+# weight of a word by the field where it was found
+FIELD_WEIGHTS = [
+    ("title", 3),
+    ("category", 2),
+    ("description", 1),
+]
+# usernames of the users of the demand (searched as words too)
+USER_FIELD_WEIGHTS = [
+    ("assigned_to", 1),
+    ("assigned_by", 1),
+]
+
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 40
+# most frequent portuguese words, they don't help to find anything
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo", "por",
+    "que", "se", "um", "uma",
+}
+
+
+def fold(text):
+    # "Ação" -> "acao"
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in re.findall(r"\w+", fold(text))
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def demand_tokens(demand):
+    # {token: weight} of a demand (its users should be loaded with select_related)
+    texts = [(getattr(demand, field), weight) for field, weight in FIELD_WEIGHTS]
+    for field, weight in USER_FIELD_WEIGHTS:
+        user = getattr(demand, field)
+        if user is not None:
+            texts.append((user.username, weight))
+
+    tokens = {}
+    for text, weight in texts:
+        for token in tokenize(text):
+            tokens[token] = tokens.get(token, 0) + weight
+    return tokens
+
+
+def search_tokens(demand):
+    return [
+        DemandSearchToken(demand_id=demand.id, token=token, weight=min(weight, 32767))
+        for token, weight in demand_tokens(demand).items()
+    ]
+
+
+def index_demands(demands):
+    # one delete and one insert for every demand given
+    DemandSearchToken.objects.filter(demand__in=[demand.id for demand in demands]).delete()
+    DemandSearchToken.objects.bulk_create(
+        token for demand in demands for token in search_tokens(demand)
+    )
+
+
+def index_demand(demand):
+    index_demands([demand])
+
+
+def with_search_fields(demands):
+    # loads only what demand_tokens reads
+    return demands.select_related(*(field for field, _ in USER_FIELD_WEIGHTS)).only(
+        *(field for field, _ in FIELD_WEIGHTS),
+        *(f"{field}__username" for field, _ in USER_FIELD_WEIGHTS),
+    )
+
+
+def index_user_demands(user):
+    # after a change of username
+    index_demands(
+        list(with_search_fields(Demands.objects.filter(Q(assigned_to=user) | Q(assigned_by=user))))
+    )
+
+
+def search_demands(demands, query):
+    # every word of the query must match the beginning of a word of the demand.
+    # adds search_rank (sum of the weights of the matching words) to the queryset
+    terms = tokenize(query)
+    if not terms:
+        # nothing searchable (only stopwords or symbols)
+        return demands.none().annotate(search_rank=Value(0))
+
+    for term in terms:
+        demands = demands.filter(
+            id__in=DemandSearchToken.objects.filter(token__startswith=term).values(
+                "demand"
+            )
+        )
+
+    rank = Subquery(
+        DemandSearchToken.objects.filter(demand=OuterRef("pk"))
+        .filter(reduce(or_, (Q(token__startswith=term) for term in terms)))
+        .values("demand")
+        .annotate(rank=Sum("weight"))
+        .values("rank")
+    )
+    return demands.annotate(search_rank=rank)
+
+
+def rebuild_search_index(chunk_size=500):
+    DemandSearchToken.objects.all().delete()
+    total = 0
+    batch = []
+    for demand in with_search_fields(Demands.objects.all()).iterator(chunk_size=chunk_size):
+        batch.extend(search_tokens(demand))
+        total += 1
+        if len(batch) >= chunk_size:
+            DemandSearchToken.objects.bulk_create(batch)
+            batch = []
+    DemandSearchToken.objects.bulk_create(batch)
+    return total
@@ -0,0 +1,350 @@
+import heapq
+from collections import Counter
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, ExtractIsoYear, ExtractWeek
+from django.utils.timezone import now
+from demands.models import (
+    HISTORY_CHECKPOINT_INTERVAL,
+    changed_fields_mask,
+    Demands,
+    DemandsHistory,
+    DemandWeeklyLoad,
+)
+from demands.search import index_demand, index_demands
+from leaves.availability import unavailable_user_ids, unavailable_users_by_day
+
+
+def workload_weeks(today=None):
+    # mondays of the previous, current and next iso weeks
+    today = today or now().date()
+    monday = today - timedelta(days=today.weekday())
+    return {
+        "previous": monday - timedelta(weeks=1),
+        "current": monday,
+        "next": monday + timedelta(weeks=1),
+    }
+
+
+def iso_week(day):
+    iso_year, week, _ = day.isocalendar()
+    return iso_year, week
+
+
+def weekly_workload(users=None, today=None):
+    # open demands per user due in the previous, current and next weeks, read from the weekly rollup
+    weeks = workload_weeks(today)
+    keys = {name: iso_week(monday) for name, monday in weeks.items()}
+    if users is None:
+        users = get_user_model().objects.filter(is_superuser=False, is_active=True)
+
+    week_filter = Q()
+    for iso_year, week in keys.values():
+        week_filter |= Q(iso_year=iso_year, iso_week=week)
+
+    counts = {}
+    for user_id, iso_year, week, open_count in DemandWeeklyLoad.objects.filter(
+        week_filter
+    ).values_list("user_id", "iso_year", "iso_week", "open_count"):
+        counts[(user_id, (iso_year, week))] = open_count
+
+    demand_count = []
+    for user in users:
+        amount_previous = counts.get((user.id, keys["previous"]), 0)
+        amount_current = counts.get((user.id, keys["current"]), 0)
+        amount_next = counts.get((user.id, keys["next"]), 0)
+        demand_count.append(
+            {
+                "user_id": user.id,
+                "user": user.get_full_name() or user.username,
+                "amount_current": amount_current,
+                "amount_previous": amount_previous,
+                "amount_next": amount_next,
+                "total": amount_current + amount_previous + amount_next,
+            }
+        )
+
+    demand_count.sort(key=lambda x: (x["total"], x["user"]))
+    return demand_count
+
+
+# users suggested in the demand form
+RECOMMENDATIONS = 3
+
+
+class AssigneeQueue:
+    # eligible users as a priority queue keyed by their open demands in a week.
+    # pop() gives the least loaded user and counts the new demand for them,
+    # so consecutive pops spread the demands
+    def __init__(self, users):
+        self.heap = [
+            (user.week_load, str(user).lower(), user.id, user) for user in users
+        ]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def top(self, amount):
+        return [
+            {"user": user, "user_id": user.id, "open_count": load}
+            for load, _, _, user in heapq.nsmallest(amount, self.heap)
+        ]
+
+    def pop(self):
+        load, name, user_id, user = self.heap[0]
+        heapq.heapreplace(self.heap, (load + 1, name, user_id, user))
+        return user
+
+
+def assignee_queue(due_date, users=None):
+    # users not on leave nor suspended (§ 1º) on the due date, with their load in its week:
+    # one query for the leaves and one for the users
+    if users is None:
+        users = get_user_model().objects.filter(is_superuser=False, is_active=True)
+    iso_year, week = iso_week(due_date)
+
+    week_load = DemandWeeklyLoad.objects.filter(
+        user=OuterRef("pk"), iso_year=iso_year, iso_week=week
+    ).values("open_count")[:1]
+
+    users = users.exclude(id__in=unavailable_user_ids(due_date)).annotate(
+        week_load=Coalesce(Subquery(week_load), 0)
+    )
+    return AssigneeQueue(users)
+
+
+def recommend_assignees(due_date, amount=RECOMMENDATIONS):
+    return assignee_queue(due_date).top(amount)
+
+
+# fields of a demand that move it between weekly rollup rows
+def load_state(demand):
+    return {
+        "assigned_to_id": demand.assigned_to_id,
+        "due_date": demand.due_date,
+        "completed": demand.completed,
+    }
+
+
+def load_key(state):
+    # rollup row counting the demand, or None if it isn't an open demand with a deadline
+    if state is None or state["completed"]:
+        return None
+    if not state["assigned_to_id"] or not state["due_date"]:
+        return None
+    return (state["assigned_to_id"], *iso_week(state["due_date"]))
+
+
+def change_weekly_load(key, amount):
+    user_id, iso_year, week = key
+    load, _ = DemandWeeklyLoad.objects.get_or_create(
+        user_id=user_id, iso_year=iso_year, iso_week=week
+    )
+    DemandWeeklyLoad.objects.filter(id=load.id).update(
+        open_count=F("open_count") + amount
+    )
+
+
+def load_changes(previous_state, demand):
+    # [(rollup row, +1 or -1)] moved by a change of the demand
+    old_key = load_key(previous_state)
+    new_key = load_key(load_state(demand))
+    if old_key == new_key:
+        return []
+    return [(key, amount) for key, amount in [(old_key, -1), (new_key, 1)] if key]
+
+
+def update_weekly_load(previous_state, demand):
+    for key, amount in load_changes(previous_state, demand):
+        change_weekly_load(key, amount)
+
+
+def latest_history_entries(demands):
+    # {demand id: revisions since its last checkpoint}, enough to rebuild the latest recorded
+    # state of each demand, in a single query
+    checkpoint = (
+        DemandsHistory.objects.filter(demand=OuterRef("demand"), is_checkpoint=True)
+        .order_by("-revision")
+        .values("revision")[:1]
+    )
+    entries = {}
+    for entry in DemandsHistory.objects.filter(
+        demand__in=demands, revision__gte=Subquery(checkpoint)
+    ).order_by("demand", "revision"):
+        entries.setdefault(entry.demand_id, []).append(entry)
+    return entries
+
+
+def history_entry(demand, entries=None):
+    # next revision of the demand: only the fields that changed since the last one,
+    # or the full state when it starts a new checkpoint. None if nothing changed.
+    # entries: revisions since the last checkpoint (loaded here if not given)
+    if entries is None:
+        entries = latest_history_entries([demand]).get(demand.id, [])
+    current_state = demand.history_state()
+
+    recorded_state = {}
+    for entry in entries:
+        recorded_state.update(entry.data)
+    changed = [
+        name
+        for name, value in current_state.items()
+        if name not in recorded_state or recorded_state[name] != value
+    ]
+    if entries and not changed:
+        return None
+
+    if not entries or len(entries) >= HISTORY_CHECKPOINT_INTERVAL:
+        data = current_state
+        is_checkpoint = True
+    else:
+        data = {name: current_state[name] for name in changed}
+        is_checkpoint = False
+
+    return DemandsHistory(
+        demand=demand,
+        revision=entries[-1].revision + 1 if entries else 1,
+        is_checkpoint=is_checkpoint,
+        data=data,
+        # the first revision is the creation, nothing "changed"
+        changed_fields=changed_fields_mask(changed) if entries else 0,
+    )
+
+
+# every change of a demand goes through here: history entry + weekly rollup + search index.
+# previous_state: load_state(demand) taken before the change (None for a new demand)
+@transaction.atomic
+def record_history(demand, previous_state=None):
+    history = history_entry(demand)
+    if history:
+        history.save()
+
+    update_weekly_load(previous_state, demand)
+    index_demand(demand)
+
+    return history
+
+
+# § 2º (explanation in leaves/views.py): deadlines can't fall inside a leave, so the open demands
+# of the user due in the leave period are spread over the colleagues available on each due date,
+# least loaded in the due week first. one bulk update of the demands and one bulk insert of history.
+# returns ({new assignee: [demands]}, [demands nobody could take])
+@transaction.atomic
+def redistribute_demands(user, start_date, end_date, assigned_by):
+    demands = list(
+        Demands.objects.select_for_update()
+        .filter(
+            assigned_to=user,
+            completed=False,
+            due_date__range=(start_date, end_date),
+        )
+        .order_by("due_date", "id")
+    )
+    if not demands:
+        return {}, []
+
+    unavailable = unavailable_users_by_day(demands[0].due_date, demands[-1].due_date)
+    colleagues = list(
+        get_user_model()
+        .objects.filter(is_superuser=False, is_active=True)
+        .exclude(id=user.id)
+    )
+
+    week_filter = Q()
+    for iso_year, week in {iso_week(demand.due_date) for demand in demands}:
+        week_filter |= Q(iso_year=iso_year, iso_week=week)
+    loads = {
+        (user_id, (iso_year, week)): open_count
+        for user_id, iso_year, week, open_count in DemandWeeklyLoad.objects.filter(
+            week_filter, user__in=colleagues
+        ).values_list("user_id", "iso_year", "iso_week", "open_count")
+    }
+
+    reassigned = {}
+    remaining = []
+    previous_states = {}
+    updated_at = now()
+    for due_date, group in groupby(demands, key=attrgetter("due_date")):
+        week = iso_week(due_date)
+        eligible = [
+            colleague for colleague in colleagues if colleague.id not in unavailable[due_date]
+        ]
+        if not eligible:
+            remaining.extend(group)
+            continue
+
+        for colleague in eligible:
+            colleague.week_load = loads.get((colleague.id, week), 0)
+        queue = AssigneeQueue(eligible)
+
+        for demand in group:
+            previous_states[demand.id] = load_state(demand)
+            colleague = queue.pop()
+            # counted for the next due dates of the same week
+            loads[(colleague.id, week)] = loads.get((colleague.id, week), 0) + 1
+            demand.assigned_to = colleague
+            demand.assigned_by = assigned_by
+            demand.updated_at = updated_at
+            reassigned.setdefault(colleague, []).append(demand)
+
+    moved = [demand for demand in demands if demand.id in previous_states]
+    if not moved:
+        return {}, remaining
+
+    Demands.objects.bulk_update(moved, ["assigned_to", "assigned_by", "updated_at"])
+
+    entries = latest_history_entries(moved)
+    DemandsHistory.objects.bulk_create(
+        history
+        for history in (
+            history_entry(demand, entries.get(demand.id, [])) for demand in moved
+        )
+        if history
+    )
+
+    # the usernames of the demands are searchable
+    index_demands(moved)
+
+    changes = Counter()
+    for demand in moved:
+        for key, amount in load_changes(previous_states[demand.id], demand):
+            changes[key] += amount
+    for key, amount in changes.items():
+        if amount:
+            change_weekly_load(key, amount)
+
+    return reassigned, remaining
+
+
+@transaction.atomic
+def rebuild_weekly_load():
+    DemandWeeklyLoad.objects.all().delete()
+    rows = (
+        Demands.objects.filter(
+            completed=False,
+            assigned_to__isnull=False,
+            due_date__isnull=False,
+        )
+        .annotate(
+            iso_year=ExtractIsoYear("due_date"),
+            iso_week=ExtractWeek("due_date"),
+        )
+        .values("assigned_to", "iso_year", "iso_week")
+        .annotate(open_count=Count("id"))
+        .order_by()
+    )
+    DemandWeeklyLoad.objects.bulk_create(
+        DemandWeeklyLoad(
+            user_id=row["assigned_to"],
+            iso_year=row["iso_year"],
+            iso_week=row["iso_week"],
+            open_count=row["open_count"],
+        )
+        for row in rows
+    )
+    return len(rows)
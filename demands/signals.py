@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from demands.search import index_user_demands
+from users.models import CustomUser
+
+
+# the usernames are in the search index of the demands (demands/search.py)
+@receiver(pre_save, sender=CustomUser)
+def remember_username(sender, instance, update_fields, **kwargs):
+    if instance.pk and (update_fields is None or "username" in update_fields):
+        instance._indexed_username = (
+            sender.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=CustomUser)
+def reindex_renamed_user(sender, instance, created, **kwargs):
+    indexed_username = instance.__dict__.pop("_indexed_username", None)
+    if created or indexed_username in (None, instance.username):
+        return
+    index_user_demands(instance)
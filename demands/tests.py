@@ -1,3 +1,1575 @@
-from django.test import TestCase
+import csv
+import random
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from unittest import mock, skipIf
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from demands import analytics
+from demands.analytics import (
+    build_report,
+    completion_events,
+    demand_analytics,
+    grouped_percentiles,
+    weekly_throughput,
+)
+from demands.archive import archive_batch
+from demands.models import (
+    HISTORY_CHECKPOINT_INTERVAL,
+    HISTORY_FIELDS,
+    ArchivedDemand,
+    changed_fields_mask,
+    Demands,
+    DemandSearchToken,
+    DemandsHistory,
+    DemandWeeklyLoad,
+)
+from demands.search import fold, rebuild_search_index, search_demands, tokenize
+from demands.services import (
+    AssigneeQueue,
+    assignee_queue,
+    load_state,
+    rebuild_weekly_load,
+    recommend_assignees,
+    record_history,
+    redistribute_demands,
+    update_weekly_load,
+)
+from demands.views import API_MAX_LIMIT, API_ORDERING, get_demands
+from leaves.models import Leaves
+from utils.business_days import get_calendar
+from utils.date_filters import (
+    days_range,
+    local_midnight,
+    month_range,
+    period_filter,
+    request_period,
+)
+from utils.export import iterate_in_chunks, stream_csv
+from utils.pagination import make_keyset_token, read_keyset_token
+from utils.testing import QueryPlanMixin
 
-# Create your tests here.
+
+SAO_PAULO = ZoneInfo("America/Sao_Paulo")
+
+
+class DemandsQueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            get_user_model().objects.create(username=f"user{i}", email=f"user{i}@app.com")
+            for i in range(10)
+        ]
+        Demands.objects.bulk_create(
+            Demands(
+                category="Administrativo",
+                title=f"Demanda {i}",
+                description="Descrição",
+                due_date=now().date() + timedelta(days=i),
+                assigned_to=user,
+                assigned_by=users[-1],
+                completed=i % 3 == 0,
+            )
+            for user in users
+            for i in range(10)
+        )
+        cls.user = users[0]
+
+    def get_request(self):
+        request = RequestFactory().get("/app/demands/")
+        request.user = self.user
+        return request
+
+    def test_get_demands_own_uses_index(self):
+        demands = get_demands(self.get_request(), False, can_manage_users=False)
+        self.assertUsesIndex(demands, "demands")
+
+    def test_get_demands_all_uses_index(self):
+        demands = get_demands(self.get_request(), True, can_manage_users=True)
+        self.assertUsesIndex(demands, "demands")
+
+
+class DemandsViewQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.users = [
+            get_user_model().objects.create(
+                username=f"user{i}", email=f"user{i}@app.com", first_name=f"Nome {i}"
+            )
+            for i in range(5)
+        ]
+
+    def create_demands(self, amount):
+        Demands.objects.bulk_create(
+            Demands(
+                category="Administrativo",
+                title=f"Demanda {i}",
+                description="Descrição",
+                due_date=now().date(),
+                assigned_to=self.users[i % len(self.users)],
+                assigned_by=self.users[(i + 1) % len(self.users)],
+            )
+            for i in range(amount)
+        )
+
+    def setUp(self):
+        # group names may be cached across requests (utils/permissions.py)
+        cache.clear()
+
+    def count_queries(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("demands_view"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        self.create_demands(1)
+        one_row = self.count_queries()
+
+        self.create_demands(settings.PER_PAGE * 2)
+        full_page = self.count_queries()
+
+        self.assertEqual(one_row, full_page)
+
+    def test_users_are_loaded_with_the_demands(self):
+        self.create_demands(settings.PER_PAGE)
+        self.client.force_login(self.manager)
+        # session + user + groups (permission check) + demands count + page with the users
+        # joined (the users count of the context processor is lazy and unused here)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("demands_view"))
+        self.assertContains(response, "Nome 1")
+
+    def test_groups_are_cached_across_requests_with_a_shared_cache(self):
+        self.create_demands(1)
+        self.client.force_login(self.manager)
+        with mock.patch("utils.permissions.cache_is_shared", return_value=True):
+            self.client.get(reverse("demands_view"))
+            # the groups come from the cache on the next requests
+            with self.assertNumQueries(4):
+                self.client.get(reverse("demands_view"))
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.demands = Demands.objects.bulk_create(
+            Demands(
+                category="Administrativo",
+                title=f"Demanda {i}",
+                description="Descrição",
+                due_date=now().date(),
+                assigned_to=cls.manager,
+                assigned_by=cls.manager,
+            )
+            for i in range(10)
+        )
+        # distinct update times, in the reverse order of the ids
+        start = now()
+        for i, demand in enumerate(cls.demands):
+            Demands.objects.filter(id=demand.id).update(updated_at=start - timedelta(minutes=i))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def api(self, cursor=None, limit=3):
+        data = {"fields": "id", "limit": limit}
+        if cursor is not None:
+            data["cursor"] = cursor
+        return self.client.get(reverse("demands_api"), data)
+
+    def page(self, cursor=None):
+        response = self.api(cursor)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [row[0] for row in data["rows"]], data["next"], data["previous"]
+
+    def walk(self):
+        # [(ids, next, previous)] of every page, following the next cursors
+        pages = [self.page()]
+        while pages[-1][1]:
+            pages.append(self.page(pages[-1][1]))
+        return pages
+
+    def expected_ids(self):
+        return list(
+            Demands.objects.order_by(*API_ORDERING).values_list("id", flat=True)
+        )
+
+    def test_token_round_trip(self):
+        demand = Demands.objects.get(id=self.demands[3].id)
+        values = [demand.updated_at, demand.id]
+        for direction in ["next", "previous"]:
+            token = make_keyset_token(API_ORDERING, values, direction)
+            self.assertEqual(
+                read_keyset_token(token, Demands.objects.all(), API_ORDERING),
+                (values, direction),
+            )
+        self.assertEqual(
+            read_keyset_token("", Demands.objects.all(), API_ORDERING), (None, "next")
+        )
+
+    def test_pages_cover_every_row_once(self):
+        pages = self.walk()
+        self.assertEqual([len(ids) for ids, _, _ in pages], [3, 3, 3, 1])
+        self.assertEqual([i for ids, _, _ in pages for i in ids], self.expected_ids())
+        self.assertIsNone(pages[0][2])
+
+    def test_previous_pages_mirror_the_next_ones(self):
+        pages = self.walk()
+        for previous_page, page in zip(pages, pages[1:]):
+            self.assertEqual(self.page(page[2])[0], previous_page[0])
+
+    def test_ties_on_updated_at(self):
+        Demands.objects.update(updated_at=now())
+        pages = self.walk()
+        ids = [i for ids, _, _ in pages for i in ids]
+        self.assertEqual(ids, sorted((demand.id for demand in self.demands), reverse=True))
+        for previous_page, page in zip(pages, pages[1:]):
+            self.assertEqual(self.page(page[2])[0], previous_page[0])
+
+    def test_invalid_cursors_are_rejected(self):
+        _, token, _ = self.page()
+        demand = self.demands[0]
+        invalid = {
+            "tampered": token[:-2] + ("aa" if not token.endswith("aa") else "bb"),
+            "garbage": "not-a-token",
+            "foreign ordering": make_keyset_token(("-revision",), [1], "next"),
+            "unknown direction": make_keyset_token(API_ORDERING, [now(), demand.id], "up"),
+            "null updated_at": make_keyset_token(API_ORDERING, [None, demand.id], "next"),
+            "not a date": make_keyset_token(API_ORDERING, ["ontem", demand.id], "next"),
+        }
+        for name, cursor in invalid.items():
+            with self.subTest(name):
+                response = self.api(cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_invalid_page_token_of_the_history_is_a_bad_request(self):
+        response = self.client.get(
+            reverse("demand_history", args=[self.demands[0].id]), {"page": "not-a-token"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class DemandsApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.ana = get_user_model().objects.create_user(
+            username="ana", email="ana@app.com", password="password"
+        )
+        Demands.objects.bulk_create(
+            Demands(
+                category="Administrativo",
+                title=f"Demanda {i}",
+                description="Descrição",
+                due_date=now().date(),
+                assigned_to=cls.ana if i < 2 else cls.manager,
+                assigned_by=cls.manager,
+            )
+            for i in range(API_MAX_LIMIT + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def api(self, data=None, **headers):
+        return self.client.get(reverse("demands_api"), data or {}, **headers)
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.api({"limit": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        repeated = self.api({"limit": 5}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated.content, b"")
+        # other parameters, other etag
+        self.assertEqual(
+            self.api({"limit": 6}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200
+        )
+
+    def test_etag_changes_with_the_demands_and_the_users(self):
+        etag = self.api({"fields": "id,assigned_to_username"})["ETag"]
+
+        def changed(previous):
+            response = self.api(
+                {"fields": "id,assigned_to_username"}, HTTP_IF_NONE_MATCH=previous
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], previous)
+            return response
+
+        demand = Demands.objects.filter(assigned_to=self.ana).first()
+        previous_state = load_state(demand)
+        demand.title = "Outro título"
+        demand.save()
+        record_history(demand, previous_state)
+        etag = changed(etag)["ETag"]
+
+        # the usernames are served with the demands
+        self.ana.username = "ana.souza"
+        self.ana.save()
+        response = changed(etag)
+        self.assertIn(["ana.souza"], [row[1:] for row in response.json()["rows"]])
+
+    def test_unknown_fields_are_rejected(self):
+        for fields in ["id,password", "assigned_to__email", "id,,nome"]:
+            with self.subTest(fields=fields):
+                response = self.api({"fields": fields})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+        response = self.api({"fields": " title , id,title "})
+        self.assertEqual(response.json()["fields"], ["title", "id"])
+
+    def test_limit(self):
+        cases = [
+            (str(API_MAX_LIMIT * 10), API_MAX_LIMIT),
+            ("7", 7),
+            ("0", 1),
+            ("-5", 1),
+            ("muitas", settings.PER_PAGE),
+        ]
+        for limit, expected in cases:
+            with self.subTest(limit=limit):
+                rows = self.api({"fields": "id", "limit": limit}).json()["rows"]
+                self.assertEqual(len(rows), expected)
+
+    def test_users_only_see_their_own_demands(self):
+        self.client.force_login(self.ana)
+        data = self.api({"fields": "id,assigned_to", "limit": API_MAX_LIMIT}).json()
+        self.assertEqual(
+            sorted(row[0] for row in data["rows"]),
+            sorted(Demands.objects.filter(assigned_to=self.ana).values_list("id", flat=True)),
+        )
+        self.assertEqual({row[1] for row in data["rows"]}, {self.ana.id})
+        self.assertIsNone(data["next"])
+
+    def test_login_is_required(self):
+        self.client.logout()
+        response = self.api()
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn("ETag", response)
+
+
+def read_csv(response):
+    # [header, *rows] of a streamed csv
+    content = b"".join(response.streaming_content).decode("utf-8")
+    return list(csv.reader(content.removeprefix("\ufeff").splitlines(), delimiter=";"))
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.ana = get_user_model().objects.create_user(
+            username="ana", email="ana@app.com", password="password"
+        )
+        cls.demands = []
+        for i in range(8):
+            demand = Demands.objects.create(
+                category="Administrativo",
+                title=f"Relatório {i}" if i % 2 else f"Planilha {i}",
+                description="Descrição",
+                due_date=date(2025, 6, 10) if i < 5 else date(2025, 8, 10),
+                assigned_to=cls.ana,
+                assigned_by=cls.manager,
+                completed=i == 7,
+            )
+            record_history(demand)
+            cls.demands.append(demand)
+        # same update time for every row: the chunks are split by the id
+        Demands.objects.update(
+            created_at=datetime(2025, 1, 2, 9, tzinfo=SAO_PAULO),
+            updated_at=datetime(2025, 1, 2, 9, tzinfo=SAO_PAULO),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def test_chunks_have_no_duplicates_or_gaps(self):
+        demands = Demands.objects.values("id", "updated_at")
+        expected = list(Demands.objects.order_by("-id").values_list("id", flat=True))
+        for chunk_size, queries_count in [(3, 3), (4, 3), (8, 2), (100, 1)]:
+            with self.subTest(chunk_size=chunk_size):
+                for ordering in [("-id",), ("-updated_at", "-id"), ("updated_at", "id")]:
+                    with CaptureQueriesContext(connection) as queries:
+                        ids = [
+                            row["id"]
+                            for row in iterate_in_chunks(demands, ordering, chunk_size)
+                        ]
+                    self.assertEqual(len(queries), queries_count)
+                    self.assertEqual(
+                        ids, expected if ordering[0].startswith("-") else expected[::-1]
+                    )
+        self.assertEqual(list(iterate_in_chunks(Demands.objects.none().values("id"))), [])
+
+    def test_stream_csv(self):
+        read = []
+
+        def rows():
+            for row in [
+                {"name": "Ana; Souza", "day": date(2025, 6, 1), "done": True, "none": None},
+                {
+                    "name": "Bia",
+                    "day": datetime(2025, 6, 1, 2, 30, tzinfo=ZoneInfo("UTC")),
+                    "done": False,
+                    "none": None,
+                },
+            ]:
+                read.append(row)
+                yield row
+
+        response = stream_csv(
+            "lista.csv",
+            [("Nome", "name"), ("Dia", "day"), ("Feita", "done"), ("Vazio", "none")],
+            rows(),
+        )
+        # nothing is read before the response is streamed
+        self.assertEqual(read, [])
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="lista.csv"')
+        self.assertEqual(
+            read_csv(response),
+            [
+                ["Nome", "Dia", "Feita", "Vazio"],
+                ["Ana; Souza", "01/06/2025", "Sim", ""],
+                # local time
+                ["Bia", "31/05/2025 23:30", "Não", ""],
+            ],
+        )
+
+    def export(self, data=None):
+        with mock.patch(
+            "demands.views.iterate_in_chunks", partial(iterate_in_chunks, chunk_size=3)
+        ):
+            response = self.client.get(reverse("demands_export"), data or {})
+            self.assertEqual(response.status_code, 200)
+            return read_csv(response)
+
+    def test_export_applies_the_filters(self):
+        ids = [demand.id for demand in self.demands]
+        cases = [
+            ({}, ids[:7]),
+            ({"completed": "1"}, ids[7:]),
+            ({"q": "relatorio"}, ids[1:7:2]),
+            ({"dq": "2025-06"}, ids[:5]),
+            ({"dq_from": "2025-08-31", "dq_to": "2025-08-01"}, ids[5:7]),
+            ({"q": "planilha", "dq": "2025-08"}, [ids[6]]),
+        ]
+        for data, expected in cases:
+            with self.subTest(data=data):
+                header, *rows = self.export(data)
+                self.assertEqual(header[0], "ID")
+                self.assertEqual(sorted(int(row[0]) for row in rows), expected)
+
+    def test_export_is_for_managers(self):
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(reverse("demands_export")).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("demands_export")).status_code, 302)
+
+
+class DateFiltersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="ana", email="ana@app.com")
+
+    def test_month_range(self):
+        cases = [
+            ("2025-06", (date(2025, 6, 1), date(2025, 7, 1))),
+            ("2024-12", (date(2024, 12, 1), date(2025, 1, 1))),
+            ("2024-02", (date(2024, 2, 1), date(2024, 3, 1))),
+            ("2025-13", None),
+            ("06/2025", None),
+            ("", None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(month_range(value), expected)
+
+    def test_days_range(self):
+        cases = [
+            ("2025-06-10", "2025-06-20", (date(2025, 6, 10), date(2025, 6, 21))),
+            ("2025-06-10", "2025-06-10", (date(2025, 6, 10), date(2025, 6, 11))),
+            # swapped
+            ("2025-06-20", "2025-06-10", (date(2025, 6, 10), date(2025, 6, 21))),
+            # open-ended
+            ("2025-06-10", "", (date(2025, 6, 10), None)),
+            ("", "2025-06-30", (None, date(2025, 7, 1))),
+            ("", "", None),
+            ("2025-06-31", "", None),
+            ("2025-06-10", "amanhã", None),
+            ("10/06/2025", "2025-06-20", None),
+        ]
+        for start, end, expected in cases:
+            with self.subTest(start=start, end=end):
+                self.assertEqual(days_range(start, end), expected)
+
+    def test_request_period(self):
+        factory = RequestFactory()
+        cases = [
+            ({"dq": " 2025-06 "}, (date(2025, 6, 1), date(2025, 7, 1))),
+            # the month wins over the days
+            ({"dq": "2025-06", "dq_from": "2025-01-01"}, (date(2025, 6, 1), date(2025, 7, 1))),
+            ({"dq": "junho"}, None),
+            (
+                {"dq_from": "2025-06-20", "dq_to": "2025-06-10"},
+                (date(2025, 6, 10), date(2025, 6, 21)),
+            ),
+            ({"dq_to": "2025-06-10"}, (None, date(2025, 6, 11))),
+            ({"dq": "", "dq_from": " ", "dq_to": ""}, None),
+            ({}, None),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(request_period(factory.get("/", params)), expected)
+
+    def test_local_midnight(self):
+        # sao paulo is utc-3
+        self.assertEqual(
+            local_midnight(date(2025, 7, 1)),
+            datetime(2025, 7, 1, 3, tzinfo=ZoneInfo("UTC")),
+        )
+
+    def test_period_filter_uses_local_days(self):
+        # the last minutes of june in sao paulo are already july in utc, and the first ones of
+        # june are still may
+        times = {
+            "first": datetime(2025, 6, 1, 0, 0, tzinfo=SAO_PAULO),
+            "last": datetime(2025, 6, 30, 23, 30, tzinfo=SAO_PAULO),
+            "before": datetime(2025, 5, 31, 23, 30, tzinfo=SAO_PAULO),
+            "after": datetime(2025, 7, 1, 0, 30, tzinfo=SAO_PAULO),
+        }
+        ids = {}
+        for name, created_at in times.items():
+            demand = Demands.objects.create(
+                category="Administrativo",
+                title=name,
+                description="Descrição",
+                due_date=None,
+                assigned_to=self.user,
+                assigned_by=self.user,
+            )
+            Demands.objects.filter(id=demand.id).update(
+                created_at=created_at, updated_at=created_at
+            )
+            ids[name] = demand.id
+        # a due date in the period is enough
+        due = Demands.objects.create(
+            category="Administrativo",
+            title="due",
+            description="Descrição",
+            due_date=date(2025, 6, 30),
+            assigned_to=self.user,
+            assigned_by=self.user,
+        )
+        Demands.objects.filter(id=due.id).update(
+            created_at=times["before"], updated_at=times["before"]
+        )
+        ids["due"] = due.id
+
+        def titles(period):
+            condition = period_filter(
+                period, date_fields=["due_date"], datetime_fields=["created_at", "updated_at"]
+            )
+            return set(Demands.objects.filter(condition).values_list("title", flat=True))
+
+        cases = [
+            (month_range("2025-06"), {"first", "last", "due"}),
+            (days_range("2025-06-30", "2025-06-01"), {"first", "last", "due"}),
+            (days_range("2025-07-01", ""), {"after"}),
+            (days_range("", "2025-05-31"), {"before", "due"}),
+        ]
+        for period, expected in cases:
+            with self.subTest(period=period):
+                self.assertEqual(titles(period), expected)
+
+
+class DemandHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            get_user_model().objects.create(username=f"user{i}", email=f"user{i}@app.com")
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.demand = Demands.objects.create(
+            category="Administrativo",
+            title="Demanda",
+            description="Descrição",
+            due_date=now().date(),
+            assigned_to=self.users[0],
+            assigned_by=self.users[2],
+        )
+        record_history(self.demand)
+        # full state and changed fields expected at each revision
+        self.states = [self.demand.history_state()]
+        self.changes = [[]]
+
+    def change(self, **values):
+        previous_state = load_state(self.demand)
+        for name, value in values.items():
+            setattr(self.demand, name, value)
+        self.demand.save()
+        self.assertIsNotNone(record_history(self.demand, previous_state))
+        state = self.demand.history_state()
+        self.changes.append([name for name in HISTORY_FIELDS if state[name] != self.states[-1][name]])
+        self.states.append(state)
+
+    def make_revisions(self, amount):
+        for i in range(amount):
+            # every change alternates its values, so each one records a revision
+            turn = i // 4 % 2
+            changes = [
+                {"title": f"Demanda {i}"},
+                {"assigned_to": self.users[1 - turn], "due_date": now().date() + timedelta(days=i)},
+                {"description": f"Descrição {i}", "completed": turn == 0},
+                {"category": "Administrativo" if turn else "Suporte Técnico"},
+            ]
+            self.change(**changes[i % len(changes)])
+
+    def test_every_revision_rebuilds_the_full_state(self):
+        self.make_revisions(HISTORY_CHECKPOINT_INTERVAL * 2 + 5)
+
+        snapshots = self.demand.history_snapshots(1, len(self.states))
+        self.assertEqual([snapshot.history_state() for snapshot in snapshots], self.states)
+        for revision, state in enumerate(self.states, start=1):
+            self.assertEqual(self.demand.state_at(revision).history_state(), state)
+
+    def test_snapshots_across_a_checkpoint(self):
+        self.make_revisions(HISTORY_CHECKPOINT_INTERVAL + 5)
+        first = HISTORY_CHECKPOINT_INTERVAL - 1
+        last = HISTORY_CHECKPOINT_INTERVAL + 3
+
+        snapshots = self.demand.history_snapshots(first, last)
+        self.assertEqual([snapshot.revision for snapshot in snapshots], list(range(first, last + 1)))
+        self.assertEqual(
+            [snapshot.history_state() for snapshot in snapshots], self.states[first - 1 : last]
+        )
+
+    def test_checkpoints_and_deltas(self):
+        self.make_revisions(HISTORY_CHECKPOINT_INTERVAL * 2 + 5)
+        entries = list(self.demand.history_entries.order_by("revision"))
+
+        self.assertEqual([entry.revision for entry in entries], list(range(1, len(self.states) + 1)))
+        self.assertEqual(
+            [entry.revision for entry in entries if entry.is_checkpoint],
+            [1, HISTORY_CHECKPOINT_INTERVAL + 1, HISTORY_CHECKPOINT_INTERVAL * 2 + 1],
+        )
+        for entry, state, changes in zip(entries, self.states, self.changes):
+            if entry.is_checkpoint:
+                self.assertEqual(entry.data, state)
+            else:
+                self.assertEqual(entry.data, {name: state[name] for name in changes})
+
+    def test_changed_fields_bitmask(self):
+        self.make_revisions(HISTORY_CHECKPOINT_INTERVAL + 5)
+        entries = self.demand.history_entries.order_by("revision")
+
+        self.assertEqual([entry.changed_field_names for entry in entries], self.changes)
+        self.assertEqual(entries[0].changed_fields, 0)
+        self.assertEqual(
+            entries[2].changed_fields,
+            changed_fields_mask(["due_date", "assigned_to"]),
+        )
+        self.assertEqual(entries[2].changed_field_labels, ["Prazo", "Executor"])
+
+    def test_unchanged_demand_records_nothing(self):
+        self.assertIsNone(record_history(self.demand, load_state(self.demand)))
+        self.assertEqual(self.demand.history_entries.count(), 1)
+
+
+class AssigneeQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana, cls.bia, cls.caio, cls.duda = [
+            get_user_model().objects.create(username=username, email=f"{username}@app.com")
+            for username in ["ana", "bia", "caio", "duda"]
+        ]
+        # a due date in the middle of a week of business days
+        calendar = get_calendar(now().date())
+        cls.due_date = calendar.add(now().date() + timedelta(days=30), 1)
+
+    def queue(self, loads):
+        # loads: [(user, open demands in the week)]
+        for user, load in loads:
+            user.week_load = load
+        return AssigneeQueue([user for user, _ in loads])
+
+    def test_pops_the_least_loaded_first(self):
+        queue = self.queue([(self.ana, 2), (self.bia, 0), (self.caio, 1)])
+        self.assertEqual(
+            [queue.pop() for _ in range(6)],
+            [self.bia, self.bia, self.caio, self.ana, self.bia, self.caio],
+        )
+
+    def test_ties_are_broken_by_name_then_id(self):
+        users = [
+            get_user_model().objects.create(
+                username=f"maria{i}",
+                email=f"maria{i}@app.com",
+                first_name="Maria",
+                last_name="Souza",
+            )
+            for i in range(2)
+        ]
+        self.ana.first_name = "ANA"
+        queue = self.queue([(users[1], 0), (users[0], 0), (self.ana, 0)])
+        self.assertEqual([queue.pop() for _ in range(3)], [self.ana, users[0], users[1]])
+
+    def test_top_does_not_count_new_demands(self):
+        queue = self.queue([(self.ana, 2), (self.bia, 0), (self.caio, 1)])
+        top = [(row["user"], row["open_count"]) for row in queue.top(2)]
+        self.assertEqual(top, [(self.bia, 0), (self.caio, 1)])
+        self.assertEqual([(row["user"], row["open_count"]) for row in queue.top(2)], top)
+        self.assertEqual(len(queue), 3)
+
+    def test_users_on_leave_are_excluded(self):
+        calendar = get_calendar(self.due_date)
+        next_day = calendar.add(self.due_date, 1)
+        third_day = calendar.add(self.due_date, 3)
+        leaves = [
+            # on leave on the due date
+            (self.ana, self.due_date - timedelta(days=1), self.due_date + timedelta(days=5), False),
+            # suspended (§ 1º): a short leave starting the next business day
+            (self.bia, next_day, next_day + timedelta(days=5), False),
+            # a leave starting 3 business days later is suspended only from the next business day
+            (self.caio, third_day, third_day + timedelta(days=5), False),
+            # interrupted leaves don't count
+            (self.duda, self.due_date, self.due_date + timedelta(days=5), True),
+        ]
+        Leaves.objects.bulk_create(
+            Leaves(
+                user=user,
+                description="F",
+                start_date=start,
+                end_date=end,
+                interrupted=interrupted,
+            )
+            for user, start, end, interrupted in leaves
+        )
+        iso_year, week, _ = self.due_date.isocalendar()
+        DemandWeeklyLoad.objects.bulk_create(
+            DemandWeeklyLoad(user=user, iso_year=iso_year, iso_week=week, open_count=load)
+            for user, load in [(self.ana, 0), (self.caio, 3), (self.duda, 1)]
+        )
+
+        queue = assignee_queue(self.due_date)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(
+            [(row["user"], row["open_count"]) for row in recommend_assignees(self.due_date)],
+            [(self.duda, 1), (self.caio, 3)],
+        )
+
+    def test_recommendations_script_is_included_once(self):
+        manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        manager.groups.add(Group.objects.create(name="manage_users"))
+        self.client.force_login(manager)
+
+        response = self.client.get(reverse("demand_create"))
+        content = response.content.decode()
+        self.assertEqual(content.count("dueDate.addEventListener"), 1)
+        title = content[content.index("<title>") : content.index("</title>")]
+        self.assertNotIn("addEventListener", title)
+
+
+class WeeklyLoadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana, cls.bia = [
+            get_user_model().objects.create(username=username, email=f"{username}@app.com")
+            for username in ["ana", "bia"]
+        ]
+        # monday of iso week 1 of 2025, still in 2024
+        cls.first_week = date(2024, 12, 30)
+        cls.second_week = date(2025, 1, 8)
+
+    def create_demand(self, user, due_date):
+        demand = Demands.objects.create(
+            category="Administrativo",
+            title="Demanda",
+            description="Descrição",
+            due_date=due_date,
+            assigned_to=user,
+            assigned_by=self.bia,
+        )
+        record_history(demand)
+        return demand
+
+    def change(self, demand, **fields):
+        previous_state = load_state(demand)
+        for name, value in fields.items():
+            setattr(demand, name, value)
+        demand.save()
+        record_history(demand, previous_state)
+
+    def loads(self):
+        # {(username, iso year, iso week): open demands}, without the emptied rows
+        return {
+            (username, iso_year, week): open_count
+            for username, iso_year, week, open_count in DemandWeeklyLoad.objects.filter(
+                open_count__gt=0
+            ).values_list("user__username", "iso_year", "iso_week", "open_count")
+        }
+
+    def test_changes_move_the_counts(self):
+        demand = self.create_demand(self.ana, self.first_week)
+        other = self.create_demand(self.ana, self.first_week)
+        self.assertEqual(self.loads(), {("ana", 2025, 1): 2})
+
+        steps = [
+            ("reassign", {"assigned_to": self.bia}, {("ana", 2025, 1): 1, ("bia", 2025, 1): 1}),
+            (
+                "reschedule",
+                {"due_date": self.second_week},
+                {("ana", 2025, 1): 1, ("bia", 2025, 2): 1},
+            ),
+            ("edit", {"title": "Outro título"}, {("ana", 2025, 1): 1, ("bia", 2025, 2): 1}),
+            ("complete", {"completed": True}, {("ana", 2025, 1): 1}),
+            ("reopen", {"completed": False}, {("ana", 2025, 1): 1, ("bia", 2025, 2): 1}),
+            ("unassign", {"assigned_to": None}, {("ana", 2025, 1): 1}),
+        ]
+        for step, fields, expected in steps:
+            with self.subTest(step=step):
+                self.change(demand, **fields)
+                self.assertEqual(self.loads(), expected)
+
+        self.change(other, completed=True)
+        self.assertEqual(self.loads(), {})
+
+    def test_unchanged_load_writes_nothing(self):
+        demand = self.create_demand(self.ana, self.first_week)
+        previous_state = load_state(demand)
+        demand.title = "Outro título"
+        demand.save()
+        with CaptureQueriesContext(connection) as queries:
+            update_weekly_load(previous_state, demand)
+        self.assertEqual(len(queries), 0)
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        demands = [
+            self.create_demand(user, due_date)
+            for user in [self.ana, self.bia]
+            for due_date in [self.first_week, self.first_week, self.second_week]
+        ]
+        self.change(demands[0], assigned_to=self.bia)
+        self.change(demands[1], due_date=self.second_week)
+        self.change(demands[2], completed=True)
+        self.change(demands[3], due_date=None)
+        self.change(demands[4], assigned_to=None)
+        incremental = self.loads()
+
+        self.assertEqual(rebuild_weekly_load(), len(incremental))
+        self.assertEqual(self.loads(), incremental)
+        self.assertFalse(DemandWeeklyLoad.objects.filter(open_count__lte=0).exists())
+
+
+class RedistributeDemandsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # superusers never receive demands
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password", is_superuser=True
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.ana, cls.bia, cls.caio, cls.duda = [
+            get_user_model().objects.create(username=username, email=f"{username}@app.com")
+            for username in ["ana", "bia", "caio", "duda"]
+        ]
+
+        # a monday of a week without holidays, and the thursday of that week
+        calendar = get_calendar(now().date())
+        monday = now().date() + timedelta(days=21 - now().weekday())
+        while not all(calendar.is_business_day(monday + timedelta(days=i)) for i in range(5)):
+            monday += timedelta(weeks=1)
+        cls.monday = monday
+        cls.thursday = monday + timedelta(days=3)
+
+    def setUp(self):
+        cache.clear()
+        # bia already has a demand in the week
+        self.create_demand(self.bia, self.monday, "Demanda da Bia")
+
+    def create_demand(self, user, due_date, title):
+        demand = Demands.objects.create(
+            category="Administrativo",
+            title=title,
+            description="Descrição",
+            due_date=due_date,
+            assigned_to=user,
+            assigned_by=self.manager,
+        )
+        record_history(demand)
+        return demand
+
+    def create_demands(self, amount, due_date):
+        return [
+            self.create_demand(self.ana, due_date, f"Demanda {due_date:%d/%m} {i}")
+            for i in range(amount)
+        ]
+
+    def take_leave(self, user, start_date, end_date):
+        Leaves.objects.create(
+            user=user, description="F", start_date=start_date, end_date=end_date
+        )
+
+    def week_loads(self):
+        iso_year, week, _ = self.monday.isocalendar()
+        return dict(
+            DemandWeeklyLoad.objects.filter(iso_year=iso_year, iso_week=week).values_list(
+                "user__username", "open_count"
+            )
+        )
+
+    def test_demands_go_to_the_least_loaded_available_colleagues(self):
+        monday_demands = self.create_demands(3, self.monday)
+        thursday_demands = self.create_demands(2, self.thursday)
+        # duda is on leave on thursday (suspended from tuesday on)
+        self.take_leave(self.duda, self.thursday, self.thursday)
+
+        reassigned, remaining = redistribute_demands(
+            self.ana, self.monday, self.thursday, self.manager
+        )
+
+        self.assertEqual(remaining, [])
+        expected = {
+            monday_demands[0].id: self.caio,
+            monday_demands[1].id: self.duda,
+            monday_demands[2].id: self.bia,
+            thursday_demands[0].id: self.caio,
+            thursday_demands[1].id: self.bia,
+        }
+        self.assertEqual(
+            {demand.id: user for user, demands in reassigned.items() for demand in demands},
+            expected,
+        )
+        for demand in Demands.objects.filter(id__in=expected):
+            self.assertEqual(demand.assigned_to, expected[demand.id])
+            self.assertEqual(demand.assigned_by, self.manager)
+
+        self.assertEqual(self.week_loads(), {"ana": 0, "bia": 3, "caio": 2, "duda": 1})
+
+    def test_history_and_search_index_are_updated(self):
+        demand = self.create_demands(1, self.monday)[0]
+        redistribute_demands(self.ana, self.monday, self.monday, self.manager)
+
+        history = demand.history_entries.order_by("-revision").first()
+        self.assertEqual(history.revision, 2)
+        self.assertEqual(history.data["assigned_to"], self.caio.id)
+        mask = changed_fields_mask(["assigned_to"])
+        self.assertEqual(history.changed_fields & mask, mask)
+        self.assertTrue(
+            DemandSearchToken.objects.filter(demand=demand, token="caio").exists()
+        )
+        self.assertFalse(
+            DemandSearchToken.objects.filter(demand=demand, token="ana").exists()
+        )
+
+    def test_demands_without_available_colleagues_remain(self):
+        demands = self.create_demands(2, self.thursday)
+        for user in [self.bia, self.caio, self.duda]:
+            self.take_leave(user, self.thursday, self.thursday)
+
+        reassigned, remaining = redistribute_demands(
+            self.ana, self.monday, self.thursday, self.manager
+        )
+        self.assertEqual(reassigned, {})
+        self.assertEqual(remaining, demands)
+        self.assertEqual(Demands.objects.filter(assigned_to=self.ana).count(), 2)
+
+    def test_queries_do_not_depend_on_the_number_of_demands(self):
+        def count_queries(amount):
+            Demands.objects.filter(assigned_to=self.ana).delete()
+            demands = self.create_demands(amount, self.monday)
+            with CaptureQueriesContext(connection) as queries:
+                redistribute_demands(self.ana, self.monday, self.monday, self.manager)
+            Demands.objects.filter(id__in=[demand.id for demand in demands]).delete()
+            return len(queries)
+
+        # the first run creates the rollup rows of the colleagues
+        count_queries(3)
+        # every colleague receives demands in both cases
+        self.assertEqual(count_queries(3), count_queries(9))
+
+    @override_settings(SEND_EMAILS=True)
+    def test_leave_form_redistributes_and_sends_one_email_per_colleague(self):
+        monday_demands = self.create_demands(3, self.monday)
+        self.client.force_login(self.manager)
+
+        with mock.patch("leaves.views.get_connection", wraps=get_connection) as connection_:
+            response = self.client.post(
+                reverse("leave_create"),
+                {
+                    "user": self.ana.id,
+                    "description": "F",
+                    "start_date": self.monday,
+                    "end_date": self.thursday,
+                    "redistribute_demands": "on",
+                },
+            )
+        self.assertRedirects(response, reverse("leaves_active_history", args=[self.ana.id]))
+        connection_.assert_called_once()
+
+        emails = {
+            email.to[0]: email.body
+            for email in mail.outbox
+            if email.subject == "Demandas Redistribuídas"
+        }
+        self.assertEqual(set(emails), {"bia@app.com", "caio@app.com", "duda@app.com"})
+        self.assertIn(monday_demands[0].title, emails["caio@app.com"])
+        self.assertIn(monday_demands[1].title, emails["duda@app.com"])
+        self.assertIn(monday_demands[2].title, emails["bia@app.com"])
+
+
+class ArchiveTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def create_demand(self, title, **kwargs):
+        demand = Demands.objects.create(
+            category="Administrativo",
+            title=title,
+            description="Descrição",
+            assigned_to=self.manager,
+            assigned_by=self.manager,
+            **kwargs,
+        )
+        record_history(demand)
+        return demand
+
+    def archive(self, demand):
+        previous_state = load_state(demand)
+        demand.completed = True
+        demand.save()
+        record_history(demand, previous_state)
+        self.assertEqual(archive_batch([demand.id]), 1)
+        return ArchivedDemand.objects.order_by("-id").first()
+
+    def test_archived_demand_keeps_its_history(self):
+        demand = self.create_demand("Antiga")
+        archived = self.archive(demand)
+
+        self.assertEqual(archived.original_id, demand.id)
+        self.assertEqual(archived.title, "Antiga")
+        self.assertFalse(Demands.objects.filter(id=demand.id).exists())
+        self.assertEqual(
+            list(archived.history_entries.values_list("revision", flat=True).order_by("revision")),
+            [1, 2],
+        )
+        self.assertTrue(archived.state_at(2).completed)
+
+    def test_history_is_looked_up_in_the_given_table(self):
+        demand = self.create_demand("Antiga")
+        archived = self.archive(demand)
+        # the id of the archived demand is given to a new one
+        reused = self.create_demand("Nova", id=demand.id)
+        another = self.archive(self.create_demand("Outra"))
+
+        response = self.client.get(reverse("demand_history", args=[reused.id]))
+        self.assertContains(response, "Histórico de Nova")
+        response = self.client.get(reverse("archived_demand_history", args=[archived.id]))
+        self.assertContains(response, "Histórico de Antiga")
+        self.assertContains(
+            response,
+            reverse(
+                "archived_demand_history_details",
+                args=[archived.id, archived.history_entries.get(revision=2).id],
+            ),
+        )
+        # archived demands are not found by the id they had, nor demands by archived ids
+        response = self.client.get(reverse("demand_history", args=[another.original_id]))
+        self.assertRedirects(response, reverse("demands_view"))
+        response = self.client.get(reverse("archived_demand_history", args=[another.id + 1]))
+        self.assertRedirects(response, reverse("demands_view"))
+
+    def test_reused_id_is_archived_again(self):
+        first = self.archive(self.create_demand("Antiga"))
+        second = self.archive(self.create_demand("Nova", id=first.original_id))
+
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(first.original_id, second.original_id)
+        self.assertEqual(second.title, "Nova")
+        self.assertEqual(second.history_entries.count(), 2)
+        self.assertEqual(first.history_entries.count(), 2)
+
+    def test_completed_list_links_to_the_archive(self):
+        archived = self.archive(self.create_demand("Antiga"))
+        response = self.client.get(reverse("demands_completed_view"), {"archived": "1"})
+        self.assertContains(response, reverse("archived_demand_history", args=[archived.id]))
+
+
+class AnalyticsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(
+            username="ana", email="ana@app.com", first_name="Ana"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def local(self, day, hour=12, minute=0):
+        return datetime.combine(day, time(hour, minute), tzinfo=SAO_PAULO)
+
+    def create_demand(self, created_at, category="Administrativo"):
+        demand = Demands.objects.create(
+            category=category,
+            title="Demanda",
+            description="Descrição",
+            due_date=created_at.date(),
+            assigned_to=self.user,
+            assigned_by=self.user,
+        )
+        history = record_history(demand)
+        Demands.objects.filter(id=demand.id).update(created_at=created_at)
+        DemandsHistory.objects.filter(id=history.id).update(created_at=created_at)
+        demand.created_at = created_at
+        return demand
+
+    def change(self, demand, when, **fields):
+        # a new revision of the demand, recorded at the given time
+        previous_state = load_state(demand)
+        for name, value in fields.items():
+            setattr(demand, name, value)
+        demand.save()
+        history = record_history(demand, previous_state)
+        DemandsHistory.objects.filter(id=history.id).update(created_at=when)
+        Demands.objects.filter(id=demand.id).update(updated_at=when)
+        return history
+
+    def completed_demand(self, created_day, completed_at, category="Administrativo"):
+        demand = self.create_demand(self.local(created_day), category)
+        self.change(demand, completed_at, completed=True)
+        return demand
+
+    def test_last_completion_counts(self):
+        reopened = self.create_demand(self.local(date(2025, 6, 1)))
+        self.change(reopened, self.local(date(2025, 6, 3)), completed=True)
+        self.change(reopened, self.local(date(2025, 6, 5)), completed=False)
+        self.change(reopened, self.local(date(2025, 6, 10)), completed=True)
+        # edited after the completion: not a completion
+        self.change(reopened, self.local(date(2025, 6, 12)), title="Outro título")
+
+        # completed and reopened: still open
+        open_demand = self.create_demand(self.local(date(2025, 6, 1)))
+        self.change(open_demand, self.local(date(2025, 6, 4)), completed=True)
+        self.change(open_demand, self.local(date(2025, 6, 6)), completed=False)
+
+        events = completion_events(DemandsHistory, date(2025, 6, 1), date(2025, 6, 30))
+        self.assertEqual(
+            [(event.demand_id, event.revision, event.lead_time) for event in events],
+            [(reopened.id, 4, timedelta(days=9))],
+        )
+        # the first completion doesn't count in its own period
+        self.assertFalse(
+            completion_events(DemandsHistory, date(2025, 6, 1), date(2025, 6, 6)).exists()
+        )
+
+    def test_live_and_archived_history_are_merged(self):
+        self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 3)))
+        archived = [
+            self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 5))),
+            self.completed_demand(
+                date(2025, 6, 2), self.local(date(2025, 6, 3)), "Suporte Técnico"
+            ),
+        ]
+        self.assertEqual(archive_batch([demand.id for demand in archived]), 2)
+
+        report = build_report(date(2025, 6, 1), date(2025, 6, 30))
+        self.assertEqual(report["completed"], 3)
+        self.assertEqual(
+            [(row["name"], row["completed"], row["average_days"], row["p50_days"])
+             for row in report["categories"]],
+            [("Administrativo", 2, 3.0, 3.0), ("Suporte Técnico", 1, 1.0, 1.0)],
+        )
+        self.assertEqual(
+            [(row["name"], row["completed"], row["average_days"]) for row in report["assignees"]],
+            [("Ana", 3, 2.3)],
+        )
+        self.assertEqual(report["lead_time_days"], [2.0, 3.6])
+
+    def test_weeks_are_local(self):
+        # sunday 23:30 and monday 00:30 in sao paulo are both monday in utc
+        self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 8), 23, 30))
+        self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 9), 0, 30))
+
+        events = completion_events(DemandsHistory, date(2025, 6, 1), date(2025, 6, 30))
+        self.assertEqual(
+            weekly_throughput(events), {date(2025, 6, 2): 1, date(2025, 6, 9): 1}
+        )
+        weeks = build_report(date(2025, 6, 1), date(2025, 6, 30))["weeks"]
+        self.assertEqual(
+            [(week["monday"], week["completed"]) for week in weeks[:3]],
+            [(date(2025, 5, 26), 0), (date(2025, 6, 2), 1), (date(2025, 6, 9), 1)],
+        )
+
+    @skipIf(analytics.np is None, "numpy is not installed")
+    def test_percentiles_without_numpy_match_numpy(self):
+        generator = random.Random(1)
+        cases = [
+            (["a"], [10.0]),
+            (["a", "b", "a"], [1.0, 2.0, 3.0]),
+            (
+                [generator.choice("abcd") for _ in range(500)],
+                [generator.uniform(0, 10**6) for _ in range(500)],
+            ),
+        ]
+        for keys, seconds in cases:
+            with self.subTest(size=len(keys)):
+                with_numpy = grouped_percentiles(keys, seconds)
+                with mock.patch("demands.analytics.np", None):
+                    without_numpy = grouped_percentiles(keys, seconds)
+                self.assertEqual(set(with_numpy), set(without_numpy))
+                for key, values in with_numpy.items():
+                    for value, expected in zip(values, without_numpy[key]):
+                        self.assertAlmostEqual(value, expected, places=6)
+        self.assertEqual(grouped_percentiles([], []), {})
+
+    def test_reports_are_cached_per_period(self):
+        self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 3)))
+        june = (date(2025, 6, 1), date(2025, 6, 30))
+
+        with mock.patch("demands.analytics.build_report", wraps=build_report) as build:
+            report = demand_analytics(*june)
+            # a new completion is only seen after the cache expires
+            self.completed_demand(date(2025, 6, 1), self.local(date(2025, 6, 4)))
+            self.assertEqual(demand_analytics(*june), report)
+            self.assertEqual(build.call_count, 1)
+
+            self.assertEqual(demand_analytics(date(2025, 6, 1), date(2025, 8, 31))["completed"], 2)
+            self.assertEqual(build.call_count, 2)
+
+        self.assertEqual(report["completed"], 1)
+
+
+class HistoryMigrationTest(TransactionTestCase):
+    # full copies of the demand in every history row (0005) -> deltas and checkpoints (0007)
+    before = [("demands", "0005_date_filter_indexes")]
+    after = [("demands", "0007_history_changed_fields")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        self.executor.loader.build_graph()
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_full_copies_become_deltas(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+        Demands = apps.get_model("demands", "Demands")
+        DemandsHistory = apps.get_model("demands", "DemandsHistory")
+
+        users = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@app.com") for i in range(2)
+        ]
+        demand = Demands.objects.create(title="Demanda", category="Administrativo")
+        day = now().date()
+        copies = []
+        for i in range(HISTORY_CHECKPOINT_INTERVAL + 3):
+            copies.append(
+                {
+                    "category": "Administrativo",
+                    "title": f"Demanda {i // 2}",
+                    "description": "Descrição",
+                    "due_date": day + timedelta(days=i // 3),
+                    "assigned_to": users[i % 2],
+                    "assigned_by": users[0],
+                    "completed": False,
+                }
+            )
+            DemandsHistory.objects.create(demand=demand, **copies[-1])
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+        apps = self.executor.loader.project_state(self.after).apps
+        DemandsHistory = apps.get_model("demands", "DemandsHistory")
+        entries = list(DemandsHistory.objects.filter(demand_id=demand.id).order_by("revision"))
+
+        self.assertEqual([entry.revision for entry in entries], list(range(1, len(copies) + 1)))
+        self.assertEqual(
+            [entry.revision for entry in entries if entry.is_checkpoint],
+            [1, HISTORY_CHECKPOINT_INTERVAL + 1],
+        )
+
+        state = {}
+        previous = None
+        for entry, copy in zip(entries, copies):
+            expected = {
+                **copy,
+                "due_date": copy["due_date"].isoformat(),
+                "assigned_to": copy["assigned_to"].id,
+                "assigned_by": copy["assigned_by"].id,
+            }
+            state = dict(entry.data) if entry.is_checkpoint else {**state, **entry.data}
+            self.assertEqual(state, expected)
+
+            changed = [
+                name for name in HISTORY_FIELDS if previous and previous[name] != expected[name]
+            ]
+            self.assertEqual(entry.changed_fields, changed_fields_mask(changed))
+            previous = expected
+
+    def test_migrating_back_restores_full_copies(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+        Demands = apps.get_model("demands", "Demands")
+        DemandsHistory = apps.get_model("demands", "DemandsHistory")
+
+        users = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@app.com") for i in range(2)
+        ]
+        demand = Demands.objects.create(title="Demanda", category="Administrativo")
+        fields = [
+            "category",
+            "title",
+            "description",
+            "due_date",
+            "assigned_to_id",
+            "assigned_by_id",
+            "completed",
+        ]
+        for i in range(HISTORY_CHECKPOINT_INTERVAL + 3):
+            DemandsHistory.objects.create(
+                demand=demand,
+                category="Administrativo" if i < 5 else "Suporte Técnico",
+                title=f"Demanda {i // 2}",
+                description=None if i < 3 else "Descrição",
+                due_date=now().date() + timedelta(days=i // 3),
+                assigned_to=users[i % 2],
+                assigned_by=users[0],
+                completed=i > 10,
+            )
+        copies = list(DemandsHistory.objects.order_by("id").values_list(*fields))
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.before)
+
+        apps = self.executor.loader.project_state(self.before).apps
+        DemandsHistory = apps.get_model("demands", "DemandsHistory")
+        self.assertEqual(list(DemandsHistory.objects.order_by("id").values_list(*fields)), copies)
+
+
+class DemandSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create(username="gestora", email="gestora@app.com")
+        cls.user = get_user_model().objects.create(username="joao.silva", email="joao@app.com")
+
+    def create_demand(self, title, description="Descrição", assigned_to=None):
+        demand = Demands.objects.create(
+            category="Administrativo",
+            title=title,
+            description=description,
+            assigned_to=assigned_to or self.user,
+            assigned_by=self.manager,
+        )
+        record_history(demand)
+        return demand
+
+    def search(self, query):
+        return list(search_demands(Demands.objects.all(), query).order_by("-search_rank", "id"))
+
+    def test_tokenize_folds_accents_and_case(self):
+        self.assertEqual(fold("Ação TÉCNICA"), "acao tecnica")
+        self.assertEqual(
+            tokenize("A instalação do Servidor, e-mail!"), ["instalacao", "servidor", "mail"]
+        )
+        self.assertEqual(tokenize("de a o"), [])
+
+    def test_search_by_prefix_without_accents(self):
+        demand = self.create_demand("Instalação de impressora")
+        self.create_demand("Troca de monitor")
+
+        self.assertEqual(self.search("instal"), [demand])
+        self.assertEqual(self.search("INSTALACAO impress"), [demand])
+        self.assertEqual(self.search("instalação monitor"), [])
+        self.assertEqual(self.search("de"), [])
+
+    def test_title_ranks_above_description(self):
+        in_description = self.create_demand("Troca de monitor", "Verificar a impressora")
+        in_title = self.create_demand("Impressora travada")
+
+        self.assertEqual(self.search("impressora"), [in_title, in_description])
+
+    def test_search_by_username(self):
+        other = get_user_model().objects.create(username="maria", email="maria@app.com")
+        demand = self.create_demand("Troca de monitor")
+        self.create_demand("Troca de teclado", assigned_to=other)
+
+        self.assertEqual(self.search("joao"), [demand])
+        self.assertEqual(self.search("joao.silva"), [demand])
+        self.assertEqual(len(self.search("gestora")), 2)
+
+    def test_renamed_user_is_reindexed(self):
+        demand = self.create_demand("Troca de monitor")
+        self.user.username = "jsilva"
+        self.user.save()
+
+        self.assertEqual(self.search("jsilva"), [demand])
+        self.assertEqual(self.search("joao"), [])
+
+    def test_rebuild_search_index(self):
+        self.create_demand("Instalação de impressora")
+        self.create_demand("Troca de monitor", "Impressora")
+        tokens = set(DemandSearchToken.objects.values_list("demand", "token", "weight"))
+
+        DemandSearchToken.objects.all().delete()
+        self.assertEqual(rebuild_search_index(), 2)
+        self.assertEqual(
+            set(DemandSearchToken.objects.values_list("demand", "token", "weight")), tokens
+        )
+
+
+class SearchIndexMigrationTest(TransactionTestCase):
+    # demands created before the search index (0003) are indexed by 0004, usernames by 0010
+    before = [("demands", "0003_weekly_load")]
+    index = [("demands", "0004_search_token")]
+    usernames = [("demands", "0010_search_usernames")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self, target):
+        self.executor.loader.build_graph()
+        self.executor.migrate(target)
+        return self.executor.loader.project_state(target).apps
+
+    def test_backfill(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+        Demands = apps.get_model("demands", "Demands")
+        user = User.objects.create(username="joao.silva", email="joao@app.com")
+        demand = Demands.objects.create(
+            title="Instalação de impressora", category="Administrativo", assigned_to=user
+        )
+
+        apps = self.migrate(self.index)
+        tokens = apps.get_model("demands", "DemandSearchToken").objects.filter(demand_id=demand.id)
+        self.assertEqual(
+            dict(tokens.values_list("token", "weight")),
+            {"instalacao": 3, "impressora": 3, "administrativo": 2},
+        )
+
+        apps = self.migrate(self.usernames)
+        tokens = apps.get_model("demands", "DemandSearchToken").objects.filter(demand_id=demand.id)
+        self.assertEqual(
+            dict(tokens.values_list("token", "weight")),
+            {"instalacao": 3, "impressora": 3, "administrativo": 2, "joao": 1, "silva": 1},
+        )
+
+
+class UpdatedAtMigrationTest(TransactionTestCase):
+    # demands without updated_at get one (0011), so the api cursor never carries a null
+    before = [("demands", "0010_search_usernames")]
+    after = [("demands", "0011_backfill_updated_at")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        Demands = apps.get_model("demands", "Demands")
+        created = Demands.objects.create(title="Criada", category="Administrativo")
+        legacy = Demands.objects.create(title="Antiga", category="Administrativo")
+        Demands.objects.filter(id=created.id).update(updated_at=None)
+        Demands.objects.filter(id=legacy.id).update(updated_at=None, created_at=None)
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+        Demands = self.executor.loader.project_state(self.after).apps.get_model(
+            "demands", "Demands"
+        )
+        self.assertEqual(Demands.objects.get(id=created.id).updated_at, created.created_at)
+        self.assertIsNotNone(Demands.objects.get(id=legacy.id).updated_at)
+
+
+class ArchiveMigrationTest(TransactionTestCase):
+    # archived demands with the id of the demand as primary key (0011) -> original_id (0012)
+    before = [("demands", "0011_backfill_updated_at")]
+    after = [("demands", "0012_archive_original_id")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_ids_become_original_ids(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        ArchivedDemand = apps.get_model("demands", "ArchivedDemand")
+        ArchivedDemandHistory = apps.get_model("demands", "ArchivedDemandHistory")
+        archived = ArchivedDemand.objects.create(id=42, year=2020, title="Antiga")
+        ArchivedDemandHistory.objects.create(demand=archived, year=2020, revision=1)
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+        apps = self.executor.loader.project_state(self.after).apps
+        ArchivedDemand = apps.get_model("demands", "ArchivedDemand")
+
+        archived = ArchivedDemand.objects.get(id=42)
+        self.assertEqual(archived.original_id, 42)
+        self.assertEqual(archived.history_entries.count(), 1)
+        # new rows get ids of their own
+        self.assertEqual(
+            ArchivedDemand.objects.create(original_id=42, year=2021, title="Nova").id, 43
+        )
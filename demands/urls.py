@@ -5,10 +5,17 @@ from demands import views
 urlpatterns = [
     path("", views.demands_view, name="demands_view"),
     path("completed/", views.demands_completed_view, name="demands_completed_view"),
+    path("api/", views.demands_api, name="demands_api"),  # json for dashboards (read-only)
+    path("analytics/", views.demands_analytics, name="demands_analytics"),  # aging and weekly throughput
+    path("export/", views.demands_export, name="demands_export"),  # csv (same filters as the lists)
     path("create/", views.demand_create, name="demand_create"),
+    path("recommendations/", views.demand_recommendations, name="demand_recommendations"),
     # path("edit/<int:demand_id>/", views.demand_edit, name="demand_edit"),
     # path("conclude/<int:demand_id>/", views.demand_conclude, name="demand_conclude"),
     # path("restore/<int:demand_id>/", views.demand_restore, name="demand_restore"),
-    # path("history/<int:demand_id>/<int:history_id>/", views.demand_history_details, name="demand_history_details"),
-    # path("history/<int:demand_id>/", views.demand_history, name="demand_history"),
+    path("history/<int:demand_id>/<int:history_id>/", views.demand_history_details, name="demand_history_details"),
+    path("history/<int:demand_id>/", views.demand_history, name="demand_history"),
+    # archived demands (ids of the archive)
+    path("history/archived/<int:demand_id>/<int:history_id>/", views.demand_history_details, {"archived": True}, name="archived_demand_history_details"),
+    path("history/archived/<int:demand_id>/", views.demand_history, {"archived": True}, name="archived_demand_history"),
 ]
@@ -3,19 +3,35 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponseForbidden, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
 from django.shortcuts import render, redirect
 from django.urls import reverse
-from utils.pagination import make_pagination
+from utils.export import iterate_in_chunks, stream_csv
+from utils.pagination import InvalidKeysetToken, make_keyset_pagination, make_pagination
 from utils.decorators import group_required, deny_if_not_in_group, user_is_in_group
 from django.utils.timezone import now
 from django.utils.html import strip_tags
 from django.core.signing import TimestampSigner
 from django.core.mail import EmailMultiAlternatives
-from datetime import date, datetime, timedelta
-from demands.models import Demands, DemandsHistory
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from demands.analytics import demand_analytics
+from demands.models import ArchivedDemand, Demands
 from demands.forms import DemandsForm
-from django.db.models import Q
+from demands.search import search_demands
+from utils.date_filters import parse_day, period_filter, request_period
+from demands.services import (
+    recommend_assignees,
+    record_history,
+    weekly_workload,
+    workload_weeks,
+)
+from django.db.models import Count, Max, Q, Value
 from django.db import transaction
+import hashlib
 import logging
 
 
@@ -23,41 +39,58 @@ logger = logging.getLogger(__name__)
 signer = TimestampSigner()
 
 
+# columns shown by demands/partials/tb_demands.html (users are displayed by their names)
+DEMAND_LIST_FIELDS = [
+    "category",
+    "title",
+    "description",
+    "due_date",
+    "created_at",
+    "updated_at",
+    "completed",
+    *(
+        f"{relation}__{field}"
+        for relation in ["assigned_to", "assigned_by"]
+        for field in ["username", "first_name", "last_name"]
+    ),
+]
+
+
 def get_demands(request, is_completed, can_manage_users=None):
     # query
-    q = request.GET.get("q", "").strip().lower()
-    # date_query
-    dq = request.GET.get("dq", "").strip()  # "YYYY-MM" format
+    q = request.GET.get("q", "").strip()
+    # date_query: ?dq=YYYY-MM or ?dq_from=YYYY-MM-DD&dq_to=YYYY-MM-DD
+    period = request_period(request)
 
-    base_filter = Q(completed=is_completed)  # true or false
+    # true or false (compared as a value, so every database can use the completed indexes)
+    base_filter = Q(completed=Value(is_completed))
     # query = Q()
 
     if not can_manage_users:
         base_filter &= Q(assigned_to=request.user)
 
-    # filtering by search bar
-    if q:
-        base_filter &= (
-            Q(category__icontains=q)
-            | Q(title__icontains=q)
-            | Q(description__icontains=q)
-            | Q(assigned_to__username__icontains=q)
-            | Q(assigned_by__username__icontains=q)
+    # filtering by date input
+    if period:
+        base_filter &= period_filter(
+            period,
+            date_fields=["due_date"],
+            datetime_fields=["created_at", "updated_at"],
         )
 
-    # filtering by date input
-    if dq:
-        try:
-            datetime.strptime(dq, "%Y-%m")
-            base_filter &= (
-                Q(due_date__startswith=dq)
-                | Q(created_at__startswith=dq)
-                | Q(updated_at__startswith=dq)
-            )
-        except ValueError:
-            pass
+    # users in the same query, limited to the columns of the table
+    demands = (
+        Demands.objects.filter(base_filter)
+        .select_related("assigned_to", "assigned_by")
+        .only(*DEMAND_LIST_FIELDS)
+    )
 
-    return Demands.objects.filter(base_filter).order_by("-updated_at", "-created_at")
+    # filtering by search bar (search index, most relevant first)
+    if q:
+        return search_demands(demands, q).order_by(
+            "-search_rank", "-updated_at", "-created_at"
+        )
+
+    return demands.order_by("-updated_at", "-created_at")
 
 
 # demands list
@@ -68,53 +101,306 @@ def demands_view(request):
     # incomplete demands
     demands = get_demands(request, False, can_manage_users)
 
-    # final list after applying the filters
-    demands_list = []
+    page_obj, pagination_range = make_pagination(request, demands, settings.PER_PAGE)
 
-    for demand in demands:
+    return render(
+        request,
+        "demands/demands.html",
+        {
+            "page_obj": page_obj,
+            "pagination_range": pagination_range,
+            "can_manage_users": can_manage_users,
+        },
+    )
 
-        demands_list.append(
-            {
-                "demand": demand,
-            }
+
+# fields of the json api: name -> column (users by id or username)
+API_FIELDS = {
+    "id": "id",
+    "category": "category",
+    "title": "title",
+    "description": "description",
+    "due_date": "due_date",
+    "assigned_to": "assigned_to_id",
+    "assigned_to_username": "assigned_to__username",
+    "assigned_by": "assigned_by_id",
+    "assigned_by_username": "assigned_by__username",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "completed": "completed",
+}
+# description (text) only when asked for
+API_DEFAULT_FIELDS = [
+    "id",
+    "category",
+    "title",
+    "due_date",
+    "assigned_to",
+    "assigned_by",
+    "updated_at",
+    "completed",
+]
+API_MAX_LIMIT = 100
+API_ORDERING = ("-updated_at", "-id")
+
+
+def api_fields(request):
+    # ?fields=id,title -> ["id", "title"], None if any field doesn't exist
+    names = [
+        name.strip() for name in request.GET.get("fields", "").split(",") if name.strip()
+    ]
+    if any(name not in API_FIELDS for name in names):
+        return None
+    return list(dict.fromkeys(names)) or API_DEFAULT_FIELDS
+
+
+def api_limit(request):
+    try:
+        limit = int(request.GET.get("limit", settings.PER_PAGE))
+    except ValueError:
+        limit = settings.PER_PAGE
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def api_demands(request):
+    # same filters and permissions as the lists: own demands unless the user manages users
+    can_manage_users = user_is_in_group(request, "manage_users")
+    return get_demands(request, request.GET.get("completed") == "1", can_manage_users)
+
+
+def demands_api_etag(request):
+    # fingerprint of the request and of the filtered demands (amount and last change):
+    # a poll with the same etag gets 304 without loading or serializing any row.
+    # the users' last change too, as the usernames are served with the demands
+    if not request.user.is_authenticated:
+        return None
+    summary = api_demands(request).aggregate(
+        amount=Count("id"),
+        last_update=Max("updated_at"),
+        assigned_to_update=Max("assigned_to__updated_at"),
+        assigned_by_update=Max("assigned_by__updated_at"),
+    )
+    key = "|".join(
+        [
+            str(request.user.id),
+            request.GET.urlencode(),
+            str(summary["amount"]),
+            str(summary["last_update"]),
+            str(summary["assigned_to_update"]),
+            str(summary["assigned_by_update"]),
+        ]
+    )
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+# read-only json of the demands (?fields=, ?limit=, ?cursor=, and the q/dq/completed filters).
+# compact: the field names once, then one array per demand
+@login_required
+@require_GET
+@condition(etag_func=demands_api_etag)
+def demands_api(request):
+    fields = api_fields(request)
+    if fields is None:
+        return JsonResponse(
+            {"error": f"Campo inválido. Campos disponíveis: {', '.join(API_FIELDS)}."},
+            status=400,
+        )
+
+    columns = [API_FIELDS[name] for name in fields]
+    # the ordering columns are always read, for the cursor
+    demands = api_demands(request).values(*dict.fromkeys([*columns, "updated_at", "id"]))
+
+    try:
+        page_obj, _ = make_keyset_pagination(
+            request,
+            demands,
+            api_limit(request),
+            ordering=API_ORDERING,
+            page_param="cursor",
         )
+    except InvalidKeysetToken as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    response = JsonResponse(
+        {
+            "fields": fields,
+            "rows": [[row[column] for column in columns] for row in page_obj],
+            "next": page_obj.next_token,
+            "previous": page_obj.previous_token,
+        },
+        json_dumps_params={"separators": (",", ":"), "ensure_ascii": False},
+    )
+    # clients may keep the response, but must revalidate it (If-None-Match)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# csv of the demands list with the same filters (?completed=1 for the completed ones)
+@login_required
+@group_required("manage_users")
+def demands_export(request):
+    completed = request.GET.get("completed") == "1"
+    demands = get_demands(request, completed, can_manage_users=True).values(
+        "id",
+        "category",
+        "title",
+        "description",
+        "due_date",
+        "assigned_to__username",
+        "assigned_by__username",
+        "created_at",
+        "updated_at",
+        "completed",
+    )
 
-    page_obj, pagination_range = make_pagination(
-        request, demands_list, settings.PER_PAGE
+    return stream_csv(
+        "demandas_concluidas.csv" if completed else "demandas.csv",
+        [
+            ("ID", "id"),
+            ("Categoria", "category"),
+            ("Título", "title"),
+            ("Descrição", "description"),
+            ("Prazo", "due_date"),
+            ("Executor", "assigned_to__username"),
+            ("Gestor", "assigned_by__username"),
+            ("Criada em", "created_at"),
+            ("Atualizada em", "updated_at"),
+            ("Concluída", "completed"),
+        ],
+        iterate_in_chunks(demands),
     )
 
+
+# months covered by each period of the analytics page
+ANALYTICS_PERIODS = {"month": 1, "quarter": 3, "year": 12}
+
+
+# how long demands stay open and how many are completed per week
+@login_required
+@group_required("manage_users")
+def demands_analytics(request):
+    period = request.GET.get("period", "quarter")
+    if period not in ANALYTICS_PERIODS:
+        period = "quarter"
+    months = ANALYTICS_PERIODS[period]
+
+    # get period in url (/?month=YYYY-MM&period=quarter), by default the one ending this month
+    try:
+        first_day = datetime.strptime(request.GET.get("month", ""), "%Y-%m").date()
+    except ValueError:
+        first_day = now().date().replace(day=1) - relativedelta(months=months - 1)
+    last_day = first_day + relativedelta(months=months) - timedelta(days=1)
+
+    report = demand_analytics(first_day, last_day)
+    max_week = max((week["completed"] for week in report["weeks"]), default=0)
+
     return render(
         request,
-        "demands/demands.html",
+        "demands/analytics.html",
         {
-            "page_obj": page_obj,
-            "pagination_range": pagination_range,
+            "report": report,
+            "period": period,
+            "first_day": first_day,
+            "last_day": last_day,
+            # bar width of each week, from 0 to 100
+            "weeks": [
+                {**week, "width": round(week["completed"] * 100 / max_week) if max_week else 0}
+                for week in report["weeks"]
+            ],
+            "previous_month": (first_day - relativedelta(months=months)).strftime("%Y-%m"),
+            "next_month": (first_day + relativedelta(months=months)).strftime("%Y-%m"),
+            "return_page_action": reverse("demands_view"),
         },
     )
 
 
-# completed demands list
+def get_archived_demands(request, can_manage_users=None):
+    # same filters as get_demands, on the archive (cold table, plain word search)
+    q = request.GET.get("q", "").strip()
+    period = request_period(request)
+
+    base_filter = Q()
+
+    if not can_manage_users:
+        base_filter &= Q(assigned_to=request.user)
+
+    if period:
+        base_filter &= period_filter(
+            period,
+            date_fields=["due_date"],
+            datetime_fields=["created_at", "updated_at"],
+        )
+
+    for word in q.split():
+        base_filter &= (
+            Q(category__icontains=word)
+            | Q(title__icontains=word)
+            | Q(description__icontains=word)
+            | Q(assigned_to__username__icontains=word)
+            | Q(assigned_by__username__icontains=word)
+        )
+
+    return ArchivedDemand.objects.filter(base_filter)
+
+
+def demand_keys(demands, archived):
+    # only what is needed to order both tables together
+    return (
+        demands.order_by()
+        .annotate(archived=Value(archived))
+        .values_list("id", "updated_at", "created_at", "archived")
+    )
+
+
+def load_demand_rows(keys):
+    # rows of the page from each table (users joined), in the order of the keys
+    ids = {False: [], True: []}
+    for demand_id, _, _, archived in keys:
+        ids[archived].append(demand_id)
+
+    rows = {}
+    for archived, model, fields in [
+        (False, Demands, DEMAND_LIST_FIELDS),
+        (True, ArchivedDemand, [*DEMAND_LIST_FIELDS, "archived_at"]),
+    ]:
+        if ids[archived]:
+            for demand in (
+                model.objects.filter(id__in=ids[archived])
+                .select_related("assigned_to", "assigned_by")
+                .only(*fields)
+            ):
+                rows[(archived, demand.id)] = demand
+
+    return [
+        rows[(archived, demand_id)]
+        for demand_id, _, _, archived in keys
+        if (archived, demand_id) in rows
+    ]
+
+
+# completed demands list (?archived=1 includes the archive)
 @login_required
 def demands_completed_view(request):
     can_manage_users = user_is_in_group(request, "manage_users")
+    include_archived = request.GET.get("archived") == "1"
 
     # completed demands
     demands = get_demands(request, True, can_manage_users)
 
-    # final list after applying the filters
-    demands_list = []
-
-    for demand in demands:
-
-        demands_list.append(
-            {
-                "demand": demand,
-            }
+    if include_archived:
+        # one ordered list from both tables: the page is chosen on the keys only
+        keys = demand_keys(demands, False).union(
+            demand_keys(get_archived_demands(request, can_manage_users), True),
+            all=True,
+        )
+        page_obj, pagination_range = make_pagination(
+            request, keys.order_by("-updated_at", "-created_at"), settings.PER_PAGE
+        )
+        page_obj.object_list = load_demand_rows(page_obj.object_list)
+    else:
+        page_obj, pagination_range = make_pagination(
+            request, demands, settings.PER_PAGE
         )
-
-    page_obj, pagination_range = make_pagination(
-        request, demands_list, settings.PER_PAGE
-    )
 
     return render(
         request,
@@ -122,6 +408,9 @@ def demands_completed_view(request):
         {
             "page_obj": page_obj,
             "pagination_range": pagination_range,
+            "can_manage_users": can_manage_users,
+            "completed": True,
+            "include_archived": include_archived,
         },
     )
 
@@ -132,68 +421,20 @@ def demands_completed_view(request):
 @group_required("manage_users")
 def demand_create(request):
     # calculation of current, previous and next weeks
-    today = now().date()
-    current_year, current_week, _ = today.isocalendar()
-
-    # previous week
-    if current_week == 1:
-        previous_year = current_year - 1
-        previous_week = date(previous_year, 12, 28).isocalendar()[1]
-    else:
-        previous_year = current_year
-        previous_week = current_week - 1
-
-    # next week
-    if current_week in [52, 53]:  # depending on the year, it can have 52 or 53 weeks
-        next_year = current_year + 1
-        next_week = 1
-    else:
-        next_year = current_year
-        next_week = current_week + 1
+    weeks = workload_weeks()
+    current_year, current_week, _ = weeks["current"].isocalendar()
+    previous_week = weeks["previous"].isocalendar()[1]
+    next_week = weeks["next"].isocalendar()[1]
 
     # getting demand count by user
-    demands = Demands.objects.filter(completed=False, due_date__isnull=False)
-    demands_current_week = demands.filter(
-        due_date__week=current_week, due_date__year=current_year
-    )
-    demands_previous_week = demands.filter(
-        due_date__week=previous_week,
-        due_date__year=previous_year,
-    )
-    demands_next_week = demands.filter(
-        due_date__week=next_week,
-        due_date__year=next_year,
-    )
+    demand_count = weekly_workload()
 
-    demand_count = []
-    users = get_user_model().objects.filter(is_superuser=False, is_active=True)
-
-    for user in users:
-        demands_current_week_filtered = demands_current_week.filter(
-            Q(assigned_to=user)
-        ).distinct()
-        demands_previous_week_filtered = demands_previous_week.filter(
-            Q(assigned_to=user)
-        ).distinct()
-        demands_next_week_filtered = demands_next_week.filter(
-            Q(assigned_to=user)
-        ).distinct()
-
-        amount_current = demands_current_week_filtered.count()
-        amount_previous = demands_previous_week_filtered.count()
-        amount_next = demands_next_week_filtered.count()
-        total = amount_current + amount_previous + amount_next
-        demand_count.append(
-            {
-                "user": user.get_full_name() or user.username,
-                "amount_current": amount_current,
-                "amount_previous": amount_previous,
-                "amount_next": amount_next,
-                "total": total,
-            }
-        )
-
-    demand_count.sort(key=lambda x: (x["total"], x["user"]))
+    # suggested users for the due date (typed in the form, from the url or today)
+    due_date = (
+        parse_day(request.POST.get("due_date") or request.GET.get("due_date", ""))
+        or now().date()
+    )
+    recommendations = recommend_assignees(due_date)
 
     if request.method == "POST":
         form = DemandsForm(
@@ -206,21 +447,8 @@ def demand_create(request):
             demand.assigned_by = request.user
             demand.save()
 
-            # prepare data for history
-            history_data = {
-                field.name: getattr(demand, field.name)
-                for field in DemandsHistory._meta.fields
-                if field.name
-                # ignore these fields:
-                not in [
-                    "id",
-                    "demand",
-                ]
-            }
-            DemandsHistory.objects.create(
-                demand=demand,
-                **history_data,
-            )
+            # history entry and weekly workload
+            record_history(demand)
 
             if (
                 settings.SEND_EMAILS == True
@@ -283,7 +511,7 @@ def demand_create(request):
                         messages.error(request, f"Erro ao enviar email")
 
             messages.success(request, "Demanda cadastrada.")
-            return redirect("consultivo_view")
+            return redirect("demands_view")
 
         else:
             messages.error(request, f"Dados inválidos, tente novamente")
@@ -292,31 +520,176 @@ def demand_create(request):
                 "demands/demand_create.html",
                 {
                     "form": form,
+                    "recommendations": recommendations,
+                    "recommendations_date": due_date,
                     "demand_count": demand_count,
                     "current_year": current_year,
+                    "current_week": current_week,
                     "previous_week": previous_week,
                     "next_week": next_week,
                 },
             )
 
     else:
+        # the least loaded available user comes selected
+        initial = {"due_date": due_date} if "due_date" in request.GET else {}
+        if recommendations:
+            initial["assigned_to"] = recommendations[0]["user_id"]
+
         form = DemandsForm(
             assigned_to_filter={},
+            initial=initial,
         )
 
     return render(
         request,
-        "consultivo/consultivo_cadastro.html",
+        "demands/demand_create.html",
         {
             "form": form,
+            "recommendations": recommendations,
+            "recommendations_date": due_date,
             "demand_count": demand_count,
             "current_year": current_year,
+            "current_week": current_week,
             "previous_week": previous_week,
             "next_week": next_week,
         },
     )
 
 
+# suggested users for a due date (used by the demand form when the date changes)
+@group_required("manage_users")
+def demand_recommendations(request):
+    due_date = parse_day(request.GET.get("due_date", "")) or now().date()
+
+    return JsonResponse(
+        {
+            "due_date": due_date.isoformat(),
+            "users": [
+                {
+                    "id": recommendation["user_id"],
+                    "name": str(recommendation["user"]),
+                    "open_count": recommendation["open_count"],
+                }
+                for recommendation in recommend_assignees(due_date)
+            ],
+        }
+    )
+
+
+def load_snapshot_users(snapshots):
+    # users of the revisions in one query (ids of deleted users show as empty)
+    user_ids = set()
+    for snapshot in snapshots:
+        user_ids.update([snapshot.assigned_to_id, snapshot.assigned_by_id])
+    user_ids.discard(None)
+    users = get_user_model().objects.in_bulk(user_ids)
+
+    for snapshot in snapshots:
+        snapshot.assigned_to = users.get(snapshot.assigned_to_id)
+        snapshot.assigned_by = users.get(snapshot.assigned_by_id)
+    return snapshots
+
+
+def get_history_demand(request, demand_id, archived=False):
+    # returns (demand, None) or (None, response) when it doesn't exist or the user can't see it.
+    # archived demands have ids of their own (original_id is the one they had), so the url
+    # says which table to look in
+    model = ArchivedDemand if archived else Demands
+    demand = model.objects.filter(id=demand_id).first()
+    if demand is None:
+        messages.error(request, "Demanda não encontrada.")
+        return None, redirect("demands_view")
+
+    if (
+        not user_is_in_group(request, "manage_users")
+        and demand.assigned_to_id != request.user.id
+    ):
+        return None, HttpResponseForbidden(
+            render(request, "global/partials/access_denied.html")
+        )
+
+    return demand, None
+
+
+# names of the history urls of a demand or of an archived one
+def history_urls(archived):
+    if archived:
+        return {
+            "history_url": "archived_demand_history",
+            "history_details_url": "archived_demand_history_details",
+        }
+    return {
+        "history_url": "demand_history",
+        "history_details_url": "demand_history_details",
+    }
+
+
+# demand history (revisions, newest first)
+@login_required
+def demand_history(request, demand_id, archived=False):
+    demand, response = get_history_demand(request, demand_id, archived)
+    if response:
+        return response
+
+    page_obj, pagination_range = make_keyset_pagination(
+        request,
+        demand.history_entries.only("id", "demand", "revision"),
+        settings.PER_PAGE,
+        ordering=("-revision",),
+    )
+
+    # states of the revisions of the page, rebuilt from the deltas in one query
+    if page_obj.object_list:
+        snapshots = demand.history_snapshots(
+            page_obj.object_list[-1].revision, page_obj.object_list[0].revision
+        )
+        page_obj.object_list = load_snapshot_users(snapshots[::-1])
+
+    return render(
+        request,
+        "demands/demand_history.html",
+        {
+            "demand": demand,
+            "page_obj": page_obj,
+            "pagination_range": pagination_range,
+            "archived": archived,
+            **history_urls(archived),
+        },
+    )
+
+
+# demand at a specific revision
+@login_required
+def demand_history_details(request, demand_id, history_id, archived=False):
+    demand, response = get_history_demand(request, demand_id, archived)
+    if response:
+        return response
+
+    urls = history_urls(archived)
+    try:
+        history = demand.history_entries.only("id", "demand", "revision").get(id=history_id)
+    except ObjectDoesNotExist:
+        messages.error(request, "Histórico não encontrado.")
+        return redirect(urls["history_url"], demand.id)
+
+    snapshot = demand.state_at(history.revision)
+    load_snapshot_users([snapshot])
+
+    return render(
+        request,
+        "demands/demand_history_details.html",
+        {
+            "demand": demand,
+            "snapshot": snapshot,
+            # fields highlighted in the page (stored when the revision was recorded)
+            "changed_fields": snapshot.history.changed_field_names,
+            "archived": archived,
+            **urls,
+        },
+    )
+
+
 # edit demand
 # @login_required
 # def demand_edit(request, pk):
@@ -622,80 +995,3 @@ def demand_create(request):
 #         return redirect("consultivo_concluidas_view")
 
 #     return redirect("consultivo_concluidas_view")  # Redirecionar se não for POST
-
-
-# general history
-# @login_required
-# def demand_history(request, pk):
-#     demanda = get_object_or_404(DemandaConsultivo, pk=pk)
-#     historico = HistoricoDemandaConsultivo.objects.filter(demanda=demanda).order_by(
-#         "-atualizado_em"
-#     )
-
-#     page_obj, pagination_range = make_pagination(request, historico, PER_PAGE)
-
-#     return render(
-#         request,
-#         "consultivo/consultivo_historico.html",
-#         {
-#             "demanda": demanda,
-#             "page_obj": page_obj,
-#             "pagination_range": pagination_range,
-#         },
-#     )
-
-
-# specific history
-# @login_required
-# def demand_history_details(request, pk, historico_id):
-#     # Obtém o histórico específico e a demanda associada
-#     historico = get_object_or_404(
-#         HistoricoDemandaConsultivo, pk=historico_id, demanda__id=pk
-#     )
-
-#     # pk = historico.demanda.id = id da demanda (demanda_id na tabela de histórico)
-#     # historico_id = historico.id = id do histórico da demanda na tabela de histórico)
-
-#     # Buscar o histórico anterior (o mais recente antes do atual)
-#     historico_anterior = (
-#         HistoricoDemandaConsultivo.objects.filter(
-#             demanda=historico.demanda, atualizado_em__lt=historico.atualizado_em
-#         )
-#         .order_by("-atualizado_em")
-#         .first()
-#     )
-
-#     # Criar um dicionário de diferenças
-#     campos_alterados = {}
-#     if historico_anterior:
-#         for field in historico._meta.get_fields():
-#             nome_campo = field.name
-#             if hasattr(historico, nome_campo) and hasattr(
-#                 historico_anterior, nome_campo
-#             ):
-#                 valor_atual = getattr(historico, nome_campo)
-#                 valor_anterior = getattr(historico_anterior, nome_campo)
-
-#                 if valor_atual != valor_anterior:
-#                     campos_alterados[nome_campo] = True
-
-#     form = DemandaConsultivoForm(
-#         instance=historico,
-#         readonly=True,
-#         vinculacao_filter={},
-#         procurador_filter={},
-#         coordenador_aprovacao_filter={},
-#         assessor_manifestacao_filter={},
-#         assessor_despacho_coordenador_filter={},
-#         assessor_despacho_procurador_geral_filter={},
-#     )
-
-#     return render(
-#         request,
-#         "consultivo/consultivo_historico_detalhes.html",
-#         {
-#             "historico": historico,
-#             "form": form,
-#             "campos_alterados": campos_alterados,
-#         },
-#     )
@@ -0,0 +1,198 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Lower
+from django.utils.timezone import now
+from leaves.models import Leaves
+from utils.business_days import get_calendar, subtract_business_days
+
+
+# § 1º (explanation in leaves/views.py)
+# (longest leave period in days, suspension business days); None means "any longer period"
+SUSPENSION_RULES = [
+    (10, 2),
+    (20, 3),
+    (None, 4),
+]
+
+
+def suspension_days(leave_period_days):
+    for max_period, days in SUSPENSION_RULES:
+        if max_period is None or leave_period_days <= max_period:
+            return days
+
+
+def suspension_start(leave):
+    leave_period_days = (leave.end_date - leave.start_date).days
+    return subtract_business_days(
+        leave.start_date, suspension_days(leave_period_days)
+    )
+
+
+def suspension_cutoffs(today):
+    # latest start date of a leave whose suspension period (of n business days) already covers today:
+    # the nth business day after today
+    calendar = get_calendar(today)
+    return {days: calendar.add(today, days) for _, days in SUSPENSION_RULES}
+
+
+def suspension_filter(today, start_field="start_date", end_field="end_date"):
+    # builds the § 1º rule as a plain filter, so the database can evaluate it for every leave at once.
+    # only meaningful for leaves that start after today.
+    cutoffs = suspension_cutoffs(today)
+    condition = Q()
+    previous_cutoff = None
+    min_period = None
+
+    for max_period, days in SUSPENSION_RULES:
+        cutoff = cutoffs[days]
+
+        if previous_cutoff is None:
+            # leaves starting within the shortest suspension period are always suspended
+            condition |= Q(**{f"{start_field}__lte": cutoff})
+        else:
+            # after that, each start date is only suspended when the leave is long enough
+            day = previous_cutoff + timedelta(days=1)
+            while day <= cutoff:
+                condition |= Q(
+                    **{
+                        start_field: day,
+                        f"{end_field}__gt": day + timedelta(days=min_period),
+                    }
+                )
+                day += timedelta(days=1)
+
+        previous_cutoff = cutoff
+        min_period = max_period
+
+    return condition
+
+
+def unavailable_users_by_day(first_day, last_day):
+    # {day: ids of the users whose leave or suspension period (§ 1º) covers it}, in a single query.
+    # a suspension lasts at most the longest rule, so only leaves starting up to that many
+    # business days after the last day can reach the period
+    longest_suspension = max(days for _, days in SUSPENSION_RULES)
+    leaves = Leaves.objects.filter(
+        interrupted=False,
+        end_date__gte=first_day,
+        start_date__lte=get_calendar(last_day).add(last_day, longest_suspension),
+    ).only("user_id", "start_date", "end_date")
+
+    unavailable = {
+        first_day + timedelta(days=offset): set()
+        for offset in range((last_day - first_day).days + 1)
+    }
+    for leave in leaves:
+        day = max(suspension_start(leave), first_day)
+        while day <= min(leave.end_date, last_day):
+            unavailable[day].add(leave.user_id)
+            day += timedelta(days=1)
+    return unavailable
+
+
+def unavailable_user_ids(day):
+    return unavailable_users_by_day(day, day)[day]
+
+
+def annotate_availability(users, today=None):
+    # adds current, next and last leave of every user to the queryset, in a single query
+    today = today or now().date()
+
+    leaves = Leaves.objects.filter(user=OuterRef("pk"), interrupted=False)
+    next_leave = leaves.filter(start_date__gt=today).order_by("start_date")
+    last_leave = leaves.filter(end_date__lt=today).order_by("-end_date")
+    ongoing_leave = leaves.filter(start_date__lte=today, end_date__gte=today).order_by(
+        "id"
+    )
+
+    users = users.annotate(
+        next_leave_id=Subquery(next_leave.values("id")[:1]),
+        next_leave_start=Subquery(next_leave.values("start_date")[:1]),
+        next_leave_end=Subquery(next_leave.values("end_date")[:1]),
+        last_leave_id=Subquery(last_leave.values("id")[:1]),
+        ongoing_leave_id=Subquery(ongoing_leave.values("id")[:1]),
+    )
+
+    # the next leave becomes the current one as soon as its suspension period starts
+    users = users.annotate(
+        current_leave_id=Case(
+            When(
+                suspension_filter(today, "next_leave_start", "next_leave_end"),
+                then=F("next_leave_id"),
+            ),
+            default=F("ongoing_leave_id"),
+        )
+    )
+
+    return users.annotate(
+        is_available=Case(
+            When(current_leave_id__isnull=True, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    )
+
+
+def order_by_availability(users):
+    return users.order_by(
+        "is_available",  # unavailable comes first
+        F("next_leave_start").asc(nulls_last=True),  # nearest next leave comes first
+        Lower("username"),  # alphabetical order
+    )
+
+
+def availability_leaves(users):
+    # loads every leave referenced by the annotated users in one query
+    leave_ids = set()
+    for user in users:
+        leave_ids.update(
+            [user.current_leave_id, user.next_leave_id, user.last_leave_id]
+        )
+    leave_ids.discard(None)
+    return Leaves.objects.in_bulk(leave_ids)
+
+
+def availability_transitions(users, today=None):
+    # availability only flips when a suspension period starts (§ 1º) or the day after a leave ends,
+    # so comparing the stored flag with the calculated one finds exactly the users whose date has come
+    return (
+        annotate_availability(users, today)
+        .exclude(available=F("is_available"))
+        .values_list("id", "is_available")
+    )
+
+
+def apply_availability_transitions(transitions):
+    # one UPDATE for the users and one for their leaves, whatever the number of flips
+    transitions = dict(transitions)
+    if not transitions:
+        return 0
+
+    user_ids = list(transitions)
+    available_ids = [user_id for user_id, available in transitions.items() if available]
+
+    get_user_model().objects.filter(id__in=user_ids).update(
+        available=Case(
+            When(id__in=available_ids, then=Value(True)),
+            default=Value(False),
+        )
+    )
+    # leaves stay active while their user is unavailable
+    Leaves.objects.filter(user_id__in=user_ids).update(
+        is_active=Case(
+            When(user_id__in=available_ids, then=Value(False)),
+            default=Value(True),
+        )
+    )
+
+    return len(transitions)
+
+
+def update_availability(user, today=None):
+    # recalculates a single user, used after a leave is created or changed
+    users = get_user_model().objects.filter(id=user.id)
+    transitions = dict(annotate_availability(users, today).values_list("id", "is_available"))
+    apply_availability_transitions(transitions)
+    if user.id in transitions:
+        user.available = transitions[user.id]
@@ -21,6 +21,13 @@ class LeavesForm(forms.ModelForm):
         label="Descrição",
     )
 
+    # § 2º: instead of refusing the leave, the pending demands go to the available colleagues
+    redistribute_demands = forms.BooleanField(
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input d-block"}),
+        label="Redistribuir demandas com prazo no período",
+        required=False,
+    )
+
     def __init__(self, *args, **kwargs):
         # extracting filters
         user_filter = kwargs.pop("user_filter", None)
@@ -118,15 +125,17 @@ class LeavesForm(forms.ModelForm):
                     {"end_date": f"Fora do prazo de até {limit_months} meses."}
                 )
 
-            if user:
+            if user and not cleaned_data.get("redistribute_demands"):
                 pending_demand = Demands.objects.filter(
                     assigned_to=user,
-                    archived=False,
+                    completed=False,
                     due_date__range=(start_date, end_date),
                 )
                 if pending_demand.exists():
                     raise forms.ValidationError(
-                        {"start_date": "Demanda com prazo pendente neste período."}
+                        {
+                            "start_date": "Demanda com prazo pendente neste período. Marque a opção de redistribuir as demandas."
+                        }
                     )
 
         else:
@@ -0,0 +1,52 @@
+# scheduled job that keeps users.available and leaves.is_active up to date (see notes.txt)
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+from leaves.availability import (
+    apply_availability_transitions,
+    availability_transitions,
+)
+from leaves.views import get_users
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Applies the availability changes (leaves and § 1º suspensions) due on the given date."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Reference date in YYYY-MM-DD format (default: today).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only lists the changes, without saving them.",
+        )
+
+    def handle(self, *args, **options):
+        today = now().date()
+        if options["date"]:
+            try:
+                today = datetime.strptime(options["date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Data inválida, use o formato YYYY-MM-DD.")
+
+        transitions = dict(availability_transitions(get_users(), today))
+
+        for user_id, available in transitions.items():
+            status = "disponível" if available else "indisponível"
+            self.stdout.write(f"Usuário {user_id}: {status}")
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(transitions)} alteração(ões) pendente(s).")
+            return
+
+        changed = apply_availability_transitions(transitions)
+        logger.info(
+            f"UPDATE_AVAILABILITY | {changed} usuário(s) atualizado(s) em {today.strftime('%d/%m/%Y')}."
+        )
+        self.stdout.write(self.style.SUCCESS(f"{changed} usuário(s) atualizado(s)."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaves',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(choices=[('', '---------'), ('F', 'Férias'), ('L', 'Licença'), ('R', 'Recesso'), ('S', 'Suspensão')], max_length=25, null=True)),
+                ('observation', models.CharField(blank=True, max_length=255, null=True)),
+                ('start_date', models.DateField(null=True)),
+                ('end_date', models.DateField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('interrupted', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'leaves',
+            },
+        ),
+    ]
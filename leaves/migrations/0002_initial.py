@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 03:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('leaves', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaves',
+            name='responsible',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lea_responsible', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='leaves',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lea_user', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='leaves',
+            index=models.Index(fields=['user', 'interrupted', 'start_date'], name='leaves_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaves',
+            index=models.Index(fields=['user', 'interrupted', 'end_date'], name='leaves_user_end_idx'),
+        ),
+    ]
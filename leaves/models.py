@@ -5,6 +5,18 @@ from django.conf import settings
 class Leaves(models.Model):
     class Meta:
         db_table = "leaves"
+        indexes = [
+            # current and next leave (start_date) of an user
+            models.Index(
+                fields=["user", "interrupted", "start_date"],
+                name="leaves_user_start_idx",
+            ),
+            # last leave (end_date) of an user
+            models.Index(
+                fields=["user", "interrupted", "end_date"],
+                name="leaves_user_end_idx",
+            ),
+        ]
 
     DESCRIPTION_CHOICES = [
         ("", "---------"),
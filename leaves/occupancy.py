@@ -0,0 +1,109 @@
+# team occupancy: how many people are out on each day of a period
+from datetime import timedelta
+from leaves.models import Leaves
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure python sweep gives the same result
+    np = None
+
+
+def load_leaves(first_day, last_day):
+    # every non-interrupted leave overlapping the period, in a single query
+    return (
+        Leaves.objects.filter(
+            interrupted=False,
+            user__is_active=True,
+            start_date__lte=last_day,
+            end_date__gte=first_day,
+        )
+        .order_by("user_id", "start_date")
+        .values_list(
+            "user_id",
+            "start_date",
+            "end_date",
+            "user__username",
+            "user__first_name",
+            "user__last_name",
+        )
+    )
+
+
+def merge_intervals(leaves, first_day, last_day):
+    # clips the leaves to the period and merges overlapping leaves of the same user,
+    # so a person is counted once per day. leaves must be ordered by user and start date.
+    intervals = []
+    names = {}
+
+    for user_id, start_date, end_date, username, first_name, last_name in leaves:
+        names[user_id] = f"{first_name} {last_name}".strip() or username
+        start = (max(start_date, first_day) - first_day).days
+        end = (min(end_date, last_day) - first_day).days
+
+        if intervals and intervals[-1][0] == user_id and start <= intervals[-1][2] + 1:
+            intervals[-1][2] = max(intervals[-1][2], end)
+        else:
+            intervals.append([user_id, start, end])
+
+    return intervals, names
+
+
+def daily_counts(intervals, days):
+    # difference array: +1 on the first day of each interval, -1 after the last one
+    if np is not None:
+        diff = np.zeros(days + 1, dtype=np.int32)
+        if intervals:
+            bounds = np.array([[start, end] for _, start, end in intervals])
+            np.add.at(diff, bounds[:, 0], 1)
+            np.add.at(diff, bounds[:, 1] + 1, -1)
+        return np.cumsum(diff[:days]).tolist()
+
+    diff = [0] * (days + 1)
+    for _, start, end in intervals:
+        diff[start] += 1
+        diff[end + 1] -= 1
+
+    counts = []
+    total = 0
+    for value in diff[:days]:
+        total += value
+        counts.append(total)
+    return counts
+
+
+def occupancy(first_day, last_day):
+    days = (last_day - first_day).days + 1
+    intervals, names = merge_intervals(load_leaves(first_day, last_day), first_day, last_day)
+    counts = daily_counts(intervals, days)
+    return intervals, names, counts
+
+
+def people_out(intervals, names, day_index):
+    return sorted(
+        names[user_id] for user_id, start, end in intervals if start <= day_index <= end
+    )
+
+
+def calendar_weeks(first_day, counts):
+    # groups the days in weeks (monday to sunday) for the heatmap
+    max_count = max(counts, default=0)
+    weeks = []
+    week = [None] * first_day.weekday()
+
+    for index, count in enumerate(counts):
+        week.append(
+            {
+                "date": first_day + timedelta(days=index),
+                "count": count,
+                # cell color intensity, from 0 to 1
+                "opacity": f"{count / max_count:.2f}" if max_count else "0",
+            }
+        )
+        if len(week) == 7:
+            weeks.append(week)
+            week = []
+
+    if week:
+        weeks.append(week + [None] * (7 - len(week)))
+
+    return weeks
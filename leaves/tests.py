@@ -1,3 +1,571 @@
-from django.test import TestCase
+import csv
+from datetime import date, timedelta
+from functools import partial
+from io import StringIO
+from unittest import mock, skipIf
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from leaves.availability import (
+    annotate_availability,
+    suspension_cutoffs,
+    suspension_filter,
+    suspension_start,
+)
+from leaves import occupancy as occupancy_module
+from leaves.models import Leaves
+from leaves.occupancy import (
+    calendar_weeks,
+    daily_counts,
+    merge_intervals,
+    occupancy,
+    people_out,
+)
+from leaves.views import (
+    get_users,
+    last_leaves,
+    next_leaves,
+    ongoing_leaves,
+    search_board_users,
+    search_current_leave,
+    search_last_leave,
+    search_next_leave,
+)
+from utils.business_days import BusinessCalendar, build_calendar, get_calendar, holidays
+from utils.export import iterate_in_chunks
+from utils.testing import QueryPlanMixin
 
-# Create your tests here.
+
+class LeavesQueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = now().date()
+        users = [
+            get_user_model().objects.create(username=f"user{i}", email=f"user{i}@app.com")
+            for i in range(10)
+        ]
+        Leaves.objects.bulk_create(
+            Leaves(
+                user=user,
+                description="F",
+                start_date=today + timedelta(days=30 * i),
+                end_date=today + timedelta(days=30 * i + 10),
+                interrupted=i % 5 == 0,
+            )
+            for user in users
+            for i in range(-5, 5)
+        )
+        cls.user = users[0]
+
+    def test_search_current_leave_uses_index(self):
+        self.assertUsesIndex(ongoing_leaves(self.user), "leaves")
+
+    def test_search_next_leave_uses_index(self):
+        self.assertUsesIndex(next_leaves(self.user)[:1], "leaves")
+
+    def test_search_last_leave_uses_index(self):
+        self.assertUsesIndex(last_leaves(self.user)[:1], "leaves")
+
+
+class BusinessCalendarTest(SimpleTestCase):
+    # 2025: carnaval on 03-03/03-04, sexta-feira santa on 04-18, tiradentes on monday 04-21,
+    # corpus christi on 06-19 and natal on thursday 12-25
+    def setUp(self):
+        self.calendar = BusinessCalendar(2024, 2026, holidays(2024, 2026))
+
+    def test_add(self):
+        cases = [
+            # (day, business days, expected)
+            (date(2025, 6, 9), 1, date(2025, 6, 10)),  # monday
+            (date(2025, 6, 6), 1, date(2025, 6, 9)),  # friday -> monday
+            (date(2025, 6, 7), 1, date(2025, 6, 9)),  # from a saturday
+            (date(2025, 6, 8), 1, date(2025, 6, 9)),  # from a sunday
+            (date(2025, 6, 2), 5, date(2025, 6, 9)),  # a week, ending after a weekend
+            (date(2025, 2, 28), 1, date(2025, 3, 5)),  # carnaval
+            (date(2025, 4, 17), 1, date(2025, 4, 22)),  # sexta-feira santa and tiradentes
+            (date(2025, 4, 16), 2, date(2025, 4, 22)),
+            (date(2025, 6, 18), 1, date(2025, 6, 20)),  # corpus christi
+            (date(2025, 12, 18), 5, date(2025, 12, 26)),  # natal
+            (date(2025, 12, 31), 1, date(2026, 1, 2)),  # next year
+        ]
+        for day, business_days, expected in cases:
+            with self.subTest(day=day, business_days=business_days):
+                self.assertEqual(self.calendar.add(day, business_days), expected)
+
+    def test_subtract(self):
+        cases = [
+            (date(2025, 6, 10), 1, date(2025, 6, 9)),
+            (date(2025, 6, 9), 1, date(2025, 6, 6)),  # monday -> friday
+            (date(2025, 6, 7), 1, date(2025, 6, 6)),  # from a saturday
+            (date(2025, 6, 8), 2, date(2025, 6, 5)),  # from a sunday
+            (date(2025, 6, 9), 5, date(2025, 6, 2)),
+            (date(2025, 3, 5), 1, date(2025, 2, 28)),  # carnaval
+            (date(2025, 4, 22), 1, date(2025, 4, 17)),  # tiradentes and sexta-feira santa
+            (date(2025, 4, 21), 1, date(2025, 4, 17)),  # from a holiday
+            (date(2025, 6, 20), 1, date(2025, 6, 18)),  # corpus christi
+            (date(2026, 1, 2), 1, date(2025, 12, 31)),  # previous year
+        ]
+        for day, business_days, expected in cases:
+            with self.subTest(day=day, business_days=business_days):
+                self.assertEqual(self.calendar.subtract(day, business_days), expected)
+
+    def test_add_and_subtract_are_inverse_on_business_days(self):
+        day = date(2025, 1, 2)
+        while day < date(2025, 12, 20):
+            if self.calendar.is_business_day(day):
+                for business_days in [1, 2, 4]:
+                    later = self.calendar.add(day, business_days)
+                    self.assertEqual(self.calendar.subtract(later, business_days), day)
+            day += timedelta(days=1)
+
+    def test_is_business_day(self):
+        cases = [
+            (date(2025, 6, 18), True),
+            (date(2025, 6, 19), False),  # corpus christi
+            (date(2025, 6, 21), False),  # saturday
+            (date(2025, 6, 22), False),  # sunday
+            (date(2025, 11, 20), False),  # consciência negra
+            (date(2025, 3, 4), False),  # carnaval
+        ]
+        for day, expected in cases:
+            with self.subTest(day=day):
+                self.assertEqual(self.calendar.is_business_day(day), expected)
+
+    @override_settings(BUSINESS_HOLIDAYS=["06-18", "2025-06-17"])
+    def test_local_holidays(self):
+        calendar = BusinessCalendar(2025, 2026, holidays(2025, 2026))
+        self.assertFalse(calendar.is_business_day(date(2025, 6, 18)))
+        self.assertFalse(calendar.is_business_day(date(2025, 6, 17)))
+        self.assertFalse(calendar.is_business_day(date(2026, 6, 18)))
+        self.assertTrue(calendar.is_business_day(date(2026, 6, 17)))
+        self.assertEqual(calendar.add(date(2025, 6, 16), 1), date(2025, 6, 20))
+
+
+class SuspensionFilterTest(TestCase):
+    # thursday, 2025-06-12. next business days: 13, 16, 17, 18 (19 is corpus christi), 20
+    today = date(2025, 6, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="ana", email="ana@app.com")
+
+    def setUp(self):
+        # the calendar is cached with the holidays of the settings
+        build_calendar.cache_clear()
+        self.addCleanup(build_calendar.cache_clear)
+
+    def test_cutoffs(self):
+        self.assertEqual(
+            suspension_cutoffs(self.today),
+            {2: date(2025, 6, 16), 3: date(2025, 6, 17), 4: date(2025, 6, 18)},
+        )
+
+    def test_filter_matches_the_suspension_start(self):
+        cases = [
+            # (start, days of the leave period, suspended today)
+            (date(2025, 6, 13), 5, True),
+            (date(2025, 6, 14), 1, True),  # saturday, within the shortest suspension
+            (date(2025, 6, 15), 30, True),
+            (date(2025, 6, 16), 5, True),  # last day of the 2 business days cutoff
+            (date(2025, 6, 17), 10, False),  # 2 business days: starts on 06-13
+            (date(2025, 6, 17), 11, True),  # 3 business days: starts today
+            (date(2025, 6, 18), 20, False),
+            (date(2025, 6, 18), 21, True),  # 4 business days: starts today
+            (date(2025, 6, 19), 30, False),  # holiday, 4 business days: starts on 06-13
+            (date(2025, 6, 20), 30, False),
+            (date(2025, 7, 1), 60, False),
+        ]
+        leaves = {
+            Leaves.objects.create(
+                user=self.user,
+                description="F",
+                start_date=start,
+                end_date=start + timedelta(days=period),
+            ).id: suspended
+            for start, period, suspended in cases
+        }
+
+        suspended_ids = set(
+            Leaves.objects.filter(suspension_filter(self.today)).values_list("id", flat=True)
+        )
+        for leave in Leaves.objects.all():
+            with self.subTest(start=leave.start_date, end=leave.end_date):
+                self.assertEqual(leave.id in suspended_ids, leaves[leave.id])
+                # same rule as the one applied to a single leave
+                self.assertEqual(suspension_start(leave) <= self.today, leaves[leave.id])
+
+
+class SearchBoardUsersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = get_user_model().objects.create(
+            username="alima", email="ana@app.com", first_name="Ana", last_name="Lima"
+        )
+        cls.bia = get_user_model().objects.create(
+            username="bsouza", email="bia@app.com", first_name="Bia", last_name="Souza"
+        )
+        Leaves.objects.create(
+            user=cls.bia,
+            description="F",
+            start_date=date(2025, 6, 2),
+            end_date=date(2025, 6, 20),
+        )
+        Leaves.objects.create(
+            user=cls.ana,
+            description="L",
+            start_date=date(2025, 7, 1),
+            end_date=date(2025, 7, 5),
+            interrupted=True,
+        )
+
+    def test_search(self):
+        cases = [
+            # (query, month, expected)
+            ("ana lima", "", [self.ana]),
+            ("férias", "", [self.bia]),  # description of an active leave
+            ("licença", "", []),  # interrupted leaves don't count
+            ("", "2025-06", [self.bia]),
+            ("", "2025-07", []),
+            ("ana", "2025-06", []),
+        ]
+        users = get_user_model().objects.order_by("username")
+        for query, month, expected in cases:
+            with self.subTest(query=query, month=month):
+                self.assertEqual(list(search_board_users(users, query, month)), expected)
+
+
+class AvailabilityTest(TestCase):
+    # the board engine (one annotated query) against the searches of a single user
+    @classmethod
+    def setUpTestData(cls):
+        today = now().date()
+        calendar = get_calendar(today)
+
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+
+        def leave(business_days, period):
+            # starts the given business days after today
+            start = calendar.add(today, business_days)
+            return (start, start + timedelta(days=period), False)
+
+        # {username: [(start, end, interrupted)]}
+        leaves = {
+            "ongoing": [(today - timedelta(days=2), today + timedelta(days=3), False)],
+            # the next leave starts within its suspension period (2 business days)
+            "short_suspended": [leave(2, 5)],
+            # one business day after the cutoff
+            "short_available": [leave(3, 5)],
+            # 4 business days for a long leave, 3 for a medium one
+            "long_suspended": [leave(4, 25)],
+            "medium_available": [leave(4, 15)],
+            "past_and_next": [
+                (today - timedelta(days=40), today - timedelta(days=30), False),
+                (today - timedelta(days=20), today - timedelta(days=10), False),
+                (today + timedelta(days=40), today + timedelta(days=45), False),
+                (today + timedelta(days=30), today + timedelta(days=35), False),
+            ],
+            "ongoing_and_next": [
+                (today - timedelta(days=1), today + timedelta(days=1), False),
+                leave(10, 5),
+            ],
+            "interrupted": [(today - timedelta(days=1), today + timedelta(days=1), True)],
+            "no_leaves": [],
+        }
+        for username, periods in leaves.items():
+            user = get_user_model().objects.create(username=username, email=f"{username}@app.com")
+            Leaves.objects.bulk_create(
+                Leaves(
+                    user=user,
+                    description="F",
+                    start_date=start,
+                    end_date=end,
+                    interrupted=interrupted,
+                )
+                for start, end, interrupted in periods
+            )
+
+    def expected(self, user):
+        leaves = [search_current_leave(user), search_next_leave(user), search_last_leave(user)]
+        return [leave.id if leave else None for leave in leaves]
+
+    def test_leaves_match_the_single_user_searches(self):
+        users = annotate_availability(get_users())
+        availability = {}
+        for user in users:
+            with self.subTest(username=user.username):
+                expected = self.expected(user)
+                self.assertEqual(
+                    [user.current_leave_id, user.next_leave_id, user.last_leave_id], expected
+                )
+                self.assertEqual(user.is_available, expected[0] is None)
+            availability[user.username] = user.is_available
+
+        # both sides of the suspension cutoffs are covered
+        self.assertFalse(availability["short_suspended"])
+        self.assertTrue(availability["short_available"])
+        self.assertFalse(availability["long_suspended"])
+        self.assertTrue(availability["medium_available"])
+        self.assertFalse(availability["ongoing"])
+        self.assertTrue(availability["interrupted"])
+
+    def test_board_lists_the_unavailable_first(self):
+        def sort_key(user):
+            # unavailable first, then the nearest next leave (none last), then the username
+            next_leave = search_next_leave(user)
+            return (
+                search_current_leave(user) is None,
+                next_leave is None,
+                next_leave.start_date if next_leave else date.min,
+                user.username.lower(),
+            )
+
+        expected = sorted(get_users(), key=sort_key)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse("leaves_view"))
+        self.assertEqual(
+            [row["user"].username for row in response.context["page_obj"]],
+            [user.username for user in expected],
+        )
+
+
+class UpdateAvailabilityTest(TestCase):
+    # ana's leave: wednesday 2025-06-18 to friday 2025-06-20 (2 business days of suspension,
+    # so she is unavailable from monday 2025-06-16 on)
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = get_user_model().objects.create(username="ana", email="ana@app.com")
+        cls.leave = Leaves.objects.create(
+            user=cls.ana,
+            description="F",
+            start_date=date(2025, 6, 18),
+            end_date=date(2025, 6, 20),
+        )
+        # available, with an old leave kept active: untouched unless she is updated
+        cls.bia = get_user_model().objects.create(username="bia", email="bia@app.com")
+        cls.old_leave = Leaves.objects.create(
+            user=cls.bia,
+            description="F",
+            start_date=date(2025, 1, 6),
+            end_date=date(2025, 1, 10),
+        )
+        # stale flag: no leave, but marked unavailable
+        cls.caio = get_user_model().objects.create(
+            username="caio", email="caio@app.com", available=False
+        )
+
+    def setUp(self):
+        build_calendar.cache_clear()
+        self.addCleanup(build_calendar.cache_clear)
+
+    def update(self, day, *args):
+        out = StringIO()
+        call_command("update_availability", "--date", day, *args, stdout=out)
+        return out.getvalue()
+
+    def available(self):
+        return dict(
+            get_user_model()
+            .objects.filter(id__in=[self.ana.id, self.bia.id, self.caio.id])
+            .values_list("username", "available")
+        )
+
+    def test_dry_run_writes_nothing(self):
+        output = self.update("2025-06-16", "--dry-run")
+        self.assertIn(f"Usuário {self.ana.id}: indisponível", output)
+        self.assertIn("2 alteração(ões) pendente(s).", output)
+        self.assertEqual(self.available(), {"ana": True, "bia": True, "caio": False})
+
+    def test_only_flipped_users_are_updated(self):
+        output = self.update("2025-06-13")
+        self.assertNotIn(f"Usuário {self.ana.id}", output)
+        self.assertNotIn(f"Usuário {self.bia.id}", output)
+        self.assertIn(f"Usuário {self.caio.id}: disponível", output)
+        self.assertIn("1 usuário(s) atualizado(s).", output)
+        self.assertEqual(self.available(), {"ana": True, "bia": True, "caio": True})
+        # bia was not updated, so her leaves were not touched
+        self.old_leave.refresh_from_db()
+        self.assertTrue(self.old_leave.is_active)
+
+        self.assertIn("0 usuário(s) atualizado(s).", self.update("2025-06-13"))
+
+    def test_flips_on_the_suspension_start_and_after_the_leave(self):
+        cases = [
+            # (date, ana available, her leave active)
+            ("2025-06-13", True, True),  # nothing changes (the leave is created active)
+            ("2025-06-16", False, True),  # suspension start (§ 1º)
+            ("2025-06-20", False, True),  # last day of the leave
+            ("2025-06-21", True, False),  # day after the leave
+        ]
+        for day, available, is_active in cases:
+            with self.subTest(day=day):
+                self.update(day)
+                self.assertEqual(self.available()["ana"], available)
+                self.leave.refresh_from_db()
+                self.assertEqual(self.leave.is_active, is_active)
+
+    def test_invalid_date(self):
+        with self.assertRaises(CommandError):
+            self.update("16/06/2025")
+
+
+class LeavesExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create(
+            username="manager", email="manager@app.com", is_staff=True
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.ana = get_user_model().objects.create(username="ana", email="ana@app.com")
+        cls.leaves = Leaves.objects.bulk_create(
+            Leaves(
+                user=cls.ana,
+                description="FL"[i % 2],
+                start_date=date(2025, 1, 1) + timedelta(weeks=i),
+                end_date=date(2025, 1, 3) + timedelta(weeks=i),
+                responsible=cls.manager,
+                interrupted=i == 4,
+            )
+            for i in range(6)
+        )
+        Leaves.objects.create(
+            user=cls.manager,
+            description="R",
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 2),
+        )
+
+    def export(self):
+        with mock.patch(
+            "leaves.views.iterate_in_chunks", partial(iterate_in_chunks, chunk_size=2)
+        ):
+            response = self.client.get(
+                reverse("leaves_active_history_export", args=[self.ana.id])
+            )
+            self.assertEqual(response.status_code, 200)
+            content = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(content.splitlines(), delimiter=";"))
+
+    def test_export_has_the_active_leaves_of_the_user(self):
+        self.client.force_login(self.manager)
+        header, *rows = self.export()
+        self.assertEqual(header[:4], ["ID", "Descrição", "Data início", "Data fim"])
+        expected = [leave for leave in reversed(self.leaves) if not leave.interrupted]
+        self.assertEqual([int(row[0]) for row in rows], [leave.id for leave in expected])
+        self.assertEqual(rows[-1][1:4], ["Férias", "01/01/2025", "03/01/2025"])
+        self.assertEqual({row[5] for row in rows}, {"manager"})
+
+    def test_export_is_for_managers(self):
+        self.client.force_login(self.ana)
+        response = self.client.get(reverse("leaves_active_history_export", args=[self.ana.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+class OccupancyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = get_user_model().objects.create(
+            username="alima", email="ana@app.com", first_name="Ana", last_name="Lima"
+        )
+        cls.bia = get_user_model().objects.create(username="bia", email="bia@app.com")
+        cls.caio = get_user_model().objects.create(
+            username="caio", email="caio@app.com", is_active=False
+        )
+        for user, start_date, end_date, interrupted in [
+            # overlapping and adjacent leaves of ana: out from 06-02 to 06-12
+            (cls.ana, date(2025, 6, 2), date(2025, 6, 6), False),
+            (cls.ana, date(2025, 6, 4), date(2025, 6, 9), False),
+            (cls.ana, date(2025, 6, 5), date(2025, 6, 5), False),
+            (cls.ana, date(2025, 6, 10), date(2025, 6, 12), False),
+            # clipped to the period
+            (cls.bia, date(2025, 5, 20), date(2025, 6, 3), False),
+            (cls.bia, date(2025, 6, 28), date(2025, 7, 10), False),
+            (cls.bia, date(2025, 6, 10), date(2025, 6, 20), True),
+            (cls.caio, date(2025, 6, 1), date(2025, 6, 30), False),
+        ]:
+            Leaves.objects.create(
+                user=user,
+                description="F",
+                start_date=start_date,
+                end_date=end_date,
+                interrupted=interrupted,
+            )
+
+    def test_overlapping_leaves_are_counted_once(self):
+        first_day, last_day = date(2025, 6, 1), date(2025, 6, 30)
+        intervals, names, counts = occupancy(first_day, last_day)
+
+        self.assertEqual(
+            intervals, [[self.ana.id, 1, 11], [self.bia.id, 0, 2], [self.bia.id, 27, 29]]
+        )
+        self.assertEqual(names, {self.ana.id: "Ana Lima", self.bia.id: "bia"})
+        self.assertEqual(len(counts), 30)
+        self.assertEqual(counts[:4], [1, 2, 2, 1])
+        self.assertEqual(counts[11:13], [1, 0])
+        self.assertEqual(counts[27:], [1, 1, 1])
+        self.assertEqual(people_out(intervals, names, 2), ["Ana Lima", "bia"])
+        self.assertEqual(people_out(intervals, names, 20), [])
+
+    def test_merge_intervals(self):
+        first_day, last_day = date(2025, 6, 1), date(2025, 6, 10)
+        leaves = [
+            (1, date(2025, 5, 25), date(2025, 6, 3), "ana", "", ""),  # clipped
+            (1, date(2025, 6, 2), date(2025, 6, 2), "ana", "", ""),  # inside the previous one
+            (1, date(2025, 6, 4), date(2025, 6, 4), "ana", "", ""),  # right after it
+            (1, date(2025, 6, 6), date(2025, 6, 20), "ana", "", ""),
+            (2, date(2025, 6, 3), date(2025, 6, 5), "bia", "Bia", ""),
+        ]
+        intervals, names = merge_intervals(leaves, first_day, last_day)
+        self.assertEqual(intervals, [[1, 0, 3], [1, 5, 9], [2, 2, 4]])
+        self.assertEqual(names, {1: "ana", 2: "Bia"})
+
+    def test_daily_counts_without_numpy(self):
+        with mock.patch("leaves.occupancy.np", None):
+            self.assertEqual(
+                daily_counts([[1, 0, 4], [2, 4, 4], [3, 2, 6]], 7), [1, 1, 2, 2, 3, 1, 1]
+            )
+            self.assertEqual(daily_counts([], 3), [0, 0, 0])
+
+    @skipIf(occupancy_module.np is None, "numpy is not installed")
+    def test_daily_counts_with_numpy_match_the_pure_python_sweep(self):
+        intervals, _, _ = occupancy(date(2025, 6, 1), date(2025, 6, 30))
+        cases = [
+            ([], 30),
+            (intervals, 30),
+            ([[1, 0, 0]], 1),
+            ([[1, 0, 4], [2, 4, 4], [3, 2, 6]], 7),
+        ]
+        for intervals, days in cases:
+            with self.subTest(intervals=intervals):
+                counts = daily_counts(intervals, days)
+                with mock.patch("leaves.occupancy.np", None):
+                    self.assertEqual(counts, daily_counts(intervals, days))
+                # plain ints, for the templates and the json
+                self.assertTrue(all(type(count) is int for count in counts))
+
+    def test_calendar_weeks(self):
+        # june 2025 starts on a sunday and ends on a monday
+        counts = [0] * 30
+        counts[2], counts[29] = 4, 1
+        weeks = calendar_weeks(date(2025, 6, 1), counts)
+
+        self.assertEqual(len(weeks), 6)
+        self.assertTrue(all(len(week) == 7 for week in weeks))
+        self.assertEqual(weeks[0][:6], [None] * 6)
+        self.assertEqual(weeks[0][6]["date"], date(2025, 6, 1))
+        self.assertEqual(weeks[1][1], {"date": date(2025, 6, 3), "count": 4, "opacity": "1.00"})
+        self.assertEqual(weeks[5][0], {"date": date(2025, 6, 30), "count": 1, "opacity": "0.25"})
+        self.assertEqual(weeks[5][1:], [None] * 6)
+        self.assertEqual(
+            [day["date"].weekday() for week in weeks for day in week if day],
+            [(6 + i) % 7 for i in range(30)],
+        )
+        # nobody out: no division by zero
+        week = calendar_weeks(date(2025, 6, 2), [0] * 7)[0]
+        self.assertEqual({day["opacity"] for day in week}, {"0"})
@@ -6,15 +6,29 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import render, redirect
 from django.urls import reverse
-from utils.pagination import make_pagination
+from utils.export import iterate_in_chunks, stream_csv
+from utils.pagination import make_keyset_pagination, make_pagination
+from utils.search import search_users
 from utils.decorators import group_required, deny_if_not_in_group, user_is_in_group
+from utils.date_filters import month_range
 from django.utils.timezone import now
-from django.utils.html import strip_tags
+from django.utils.html import escape, strip_tags
 from django.core.signing import TimestampSigner
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, OuterRef
 from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
 from leaves.models import Leaves
 from leaves.forms import LeavesForm
+from leaves.availability import (
+    annotate_availability,
+    availability_leaves,
+    order_by_availability,
+    suspension_start,
+    update_availability,
+)
+from leaves.occupancy import calendar_weeks, occupancy, people_out
+from demands.services import redistribute_demands
 import logging
 
 
@@ -44,128 +58,51 @@ def get_users(id_user=None):
     )
 
 
-def order_users(users_data):
-    users_data.sort(
-        key=lambda x: (
-            not bool(x["availability"]),  # unavailable comes first
-            (
-                datetime.strptime(x["next_leave"]["start_date"], "%d/%m/%Y")
-                if x["next_leave"]
-                else datetime.max
-            ),  # nearest next leave comes first
-            str(x["user"].username).lower(),  # alphabetical order
-        ),
-    )
-
-
-def process_leave(user, users_data):
-    current_leave = search_current_leave(user)
-
-    if current_leave:
-        make_user_unavailable(user)
-    else:
-        make_user_available(user)
-
-    next_leave = search_next_leave(user)
-    last_leave = search_last_leave(user)
-    availability = determine_availability(current_leave)
-
-    add_user_data(
-        users_data,
-        user,
-        current_leave,
-        next_leave,
-        last_leave,
-        availability,
-    )
-
-
 # § 1º
 def search_current_leave(user):
     today = now().date()
     next_leave = search_next_leave(user)
 
     if next_leave:
-        unavailability_start_date = next_leave.start_date
-        leave_period_days = (next_leave.end_date - next_leave.start_date).days
+        if suspension_start(next_leave) <= today <= next_leave.start_date:
+            return next_leave
 
-        adjustment = 0
-        if leave_period_days <= 10:
-            adjustment = 2
-        elif 10 < leave_period_days <= 20:
-            adjustment = 3
-        elif leave_period_days > 20:
-            adjustment = 4
+    return ongoing_leaves(user).first()
 
-        unavailability_start_date -= timedelta(days=adjustment)
 
-        if unavailability_start_date <= today <= next_leave.start_date:
-            return next_leave
+def search_next_leave(user):
+    return next_leaves(user).first()
+
+
+def search_last_leave(user):
+    return last_leaves(user).first()
 
+
+# querysets behind the searches above (indexed by Leaves.Meta.indexes)
+def ongoing_leaves(user):
+    today = now().date()
     return Leaves.objects.filter(
         user=user,
         interrupted=False,
         start_date__lte=today,
         end_date__gte=today,
-    ).first()
-
-
-def search_next_leave(user):
-    return (
-        Leaves.objects.filter(
-            user=user,
-            interrupted=False,
-            start_date__gt=now().date(),
-        )
-        .order_by("start_date")
-        .first()
-    )
-
-
-def search_last_leave(user):
-    return (
-        Leaves.objects.filter(
-            user=user,
-            interrupted=False,
-            end_date__lt=now().date(),
-        )
-        .order_by("-end_date")
-        .first()
-    )
+    ).order_by("id")
 
 
-# @transaction.atomic
-def make_user_available(user):
-    # making the leave inactive and the user available
-    try:
-        Leaves.objects.filter(
-            user=user,
-            is_active=True,
-        ).update(is_active=False)
-        if hasattr(user, "available"):
-            user.available = True
-            user.save()
-    except Exception as e:
-        logger.error(
-            f"LEAVES_MAKE_USER_AVAILABLE | Erro disponibilizando usuário: {str(e)}"
-        )
+def next_leaves(user):
+    return Leaves.objects.filter(
+        user=user,
+        interrupted=False,
+        start_date__gt=now().date(),
+    ).order_by("start_date")
 
 
-# @transaction.atomic
-def make_user_unavailable(user):
-    # making the leave active and the user unavailable
-    try:
-        Leaves.objects.filter(
-            user=user,
-            is_active=False,
-        ).update(is_active=True)
-        if hasattr(user, "available"):
-            user.available = False
-            user.save()
-    except Exception as e:
-        logger.error(
-            f"LEAVES_MAKE_USER_AVAILABLE | Erro indisponibilizando usuário: {str(e)}"
-        )
+def last_leaves(user):
+    return Leaves.objects.filter(
+        user=user,
+        interrupted=False,
+        end_date__lt=now().date(),
+    ).order_by("-end_date")
 
 
 def determine_availability(current_leave):
@@ -213,6 +150,63 @@ def add_user_data(
     )
 
 
+# builds the board rows from users annotated by annotate_availability
+def build_users_data(users):
+    users = list(users)
+    leaves = availability_leaves(users)
+
+    users_data = []
+    for user in users:
+        current_leave = leaves.get(user.current_leave_id)
+        add_user_data(
+            users_data,
+            user,
+            current_leave,
+            leaves.get(user.next_leave_id),
+            leaves.get(user.last_leave_id),
+            determine_availability(current_leave),
+        )
+    return users_data
+
+
+def search_board_users(users, query="", date_query=""):
+    # search bar: username, full name, e-mail or description of a leave
+    if query:
+        descriptions = [
+            code
+            for code, label in Leaves.DESCRIPTION_CHOICES
+            if code and query in label.lower()
+        ]
+        users = search_users(
+            users,
+            query,
+            Exists(
+                Leaves.objects.filter(
+                    user=OuterRef("pk"),
+                    interrupted=False,
+                    description__in=descriptions,
+                )
+            ),
+        )
+
+    # date input: users with a leave in the month ("YYYY-MM")
+    period = month_range(date_query)
+    if period:
+        first_day, next_month = period
+        users = users.filter(
+            Exists(
+                Leaves.objects.filter(
+                    user=OuterRef("pk"),
+                    interrupted=False,
+                    start_date__lt=next_month,
+                    end_date__gte=first_day,
+                )
+            )
+        )
+
+    return users
+
+
 @login_required
 def leaves_view(request):
     # check if user has permissions
@@ -220,25 +214,18 @@ def leaves_view(request):
 
     # get search filter in url (/?q=abc)
     query = request.GET.get("q", "").strip().lower()
+    # date_query
+    dq = request.GET.get("dq", "").strip()  # "YYYY-MM" format
 
-    users_data = []
     # user views all users data or only his own data
     users = get_users() if can_manage_users else get_users(request.user.id)
+    users = search_board_users(users, query, dq)
+    # current, next and last leave of every user are calculated by the database
+    users = order_by_availability(annotate_availability(users))
 
-    for user in users:
-        process_leave(user, users_data)
-
-    # filters data based on search
-    if query:
-        users_data = [
-            data
-            for data in users_data
-            if any(query in str(data[key]).lower() for key in data)
-        ]
-
-    order_users(users_data)
-
-    page_obj, pagination_range = make_pagination(request, users_data, settings.PER_PAGE)
+    # only the users in the current page are turned into rows
+    page_obj, pagination_range = make_pagination(request, users, settings.PER_PAGE)
+    page_obj.object_list = build_users_data(page_obj.object_list)
 
     return render(
         request,
@@ -251,6 +238,120 @@ def leaves_view(request):
     )
 
 
+# how many people are out on each day of a month or quarter
+@login_required
+@group_required("manage_users")
+def leaves_occupancy(request):
+    today = now().date()
+
+    # get period in url (/?month=YYYY-MM&period=quarter)
+    try:
+        first_day = datetime.strptime(request.GET.get("month", ""), "%Y-%m").date()
+    except ValueError:
+        first_day = today.replace(day=1)
+    period = "quarter" if request.GET.get("period") == "quarter" else "month"
+    months = 3 if period == "quarter" else 1
+    last_day = first_day + relativedelta(months=months) - timedelta(days=1)
+
+    intervals, names, counts = occupancy(first_day, last_day)
+
+    # people out on the selected day (/?day=YYYY-MM-DD)
+    try:
+        selected_day = datetime.strptime(request.GET.get("day", ""), "%Y-%m-%d").date()
+    except ValueError:
+        selected_day = today
+    if first_day <= selected_day <= last_day:
+        selected_people = people_out(
+            intervals, names, (selected_day - first_day).days
+        )
+    else:
+        selected_day = None
+        selected_people = []
+
+    return render(
+        request,
+        "leaves/occupancy.html",
+        {
+            "weeks": calendar_weeks(first_day, counts),
+            "first_day": first_day,
+            "last_day": last_day,
+            "period": period,
+            "previous_month": (first_day - relativedelta(months=months)).strftime("%Y-%m"),
+            "next_month": (first_day + relativedelta(months=months)).strftime("%Y-%m"),
+            "max_count": max(counts, default=0),
+            "selected_day": selected_day,
+            "selected_people": selected_people,
+            "return_page_action": reverse("leaves_view"),
+        },
+    )
+
+
+# § 2º: the open demands of the user due in the leave go to the available colleagues
+def redistribute_leave_demands(request, leave, log_prefix):
+    reassigned, remaining = redistribute_demands(
+        leave.user, leave.start_date, leave.end_date, request.user
+    )
+
+    moved = sum(len(demands) for demands in reassigned.values())
+    if moved:
+        messages.success(request, f"{moved} demanda(s) redistribuída(s).")
+    if remaining:
+        messages.warning(
+            request,
+            f"{len(remaining)} demanda(s) sem usuário disponível para redistribuir.",
+        )
+
+    if settings.SEND_EMAILS == True and reassigned:
+        notify_redistributed_demands(request, leave, reassigned, log_prefix)
+
+
+# one email per recipient with every demand received, sent over a single connection
+def notify_redistributed_demands(request, leave, reassigned, log_prefix):
+    current_site = get_current_site(request)
+    domain = current_site.domain
+    url = f"http://{domain}{reverse('demands_view')}"
+
+    emails = []
+    for user, demands in reassigned.items():
+        if not user.email:
+            continue
+
+        demand_list = "".join(
+            f"<li>{escape(demand.title or '')} (prazo: {demand.due_date.strftime('%d/%m/%Y')})</li>"
+            for demand in demands
+        )
+        email_content = f"""
+        <html>
+            <body>
+                <p>Olá, {user}. Por causa do afastamento de {leave.user}, as seguintes demandas foram redistribuídas à você por {request.user}:</p>
+                <ul>{demand_list}</ul>
+                <p>Veja em: <a href="{url}" target="_blank" rel="noopener noreferrer">Demandas</a></p>
+            </body>
+        </html>
+        """
+
+        email = EmailMultiAlternatives(
+            "Demandas Redistribuídas",
+            strip_tags(email_content),  # generates text version
+            settings.EMAIL_SENDER,
+            [user.email],
+        )
+        email.attach_alternative(email_content, "text/html")
+        emails.append(email)
+
+    if not emails:
+        return
+
+    try:
+        get_connection().send_messages(emails)
+        messages.success(request, f"E-mail enviado para {len(emails)} usuário(s).")
+    except Exception as e:
+        logger.error(
+            f"{log_prefix} | Erro no envio dos emails de redistribuição: {str(e)}."
+        )
+        messages.error(request, "Erro no envio dos emails de redistribuição.")
+
+
 @login_required
 @transaction.atomic
 @group_required("manage_users")
@@ -283,11 +384,10 @@ def leave_create(request, user_id=None):
             if user_id:
                 leave.user = user
             leave.save()
-            current_leave = search_current_leave(leave.user)
-            if current_leave:
-                make_user_unavailable(leave.user)
-            else:
-                make_user_available(leave.user)
+            update_availability(leave.user)
+
+            if form.cleaned_data.get("redistribute_demands"):
+                redistribute_leave_demands(request, leave, "LEAVE_CREATE")
 
             if settings.SEND_EMAILS == True:
                 if leave.user.email:
@@ -415,13 +515,12 @@ def leave_edit(request, user_id, leave_id):
         if form.is_valid():
             leave_form = form.save(commit=False)
             leave_form.responsible = request.user
-            leave.user = user_id
+            leave_form.user = user
             leave_form = form.save()
-            current_leave = search_current_leave(leave.user)
-            if current_leave:
-                make_user_unavailable(leave.user)
-            else:
-                make_user_available(leave.user)
+            update_availability(leave.user)
+
+            if form.cleaned_data.get("redistribute_demands"):
+                redistribute_leave_demands(request, leave_form, "LEAVE_EDIT")
 
             if settings.SEND_EMAILS == True:
                 # get user
@@ -515,6 +614,22 @@ def leave_edit(request, user_id, leave_id):
     )
 
 
+# row of the history tables. show_key: "show_actions" (active leaves) or "show_action" (interrupted leaves)
+def history_row(record, show_key):
+    start_date = record.start_date.strftime("%d/%m/%Y")
+    end_date = record.end_date.strftime("%d/%m/%Y")
+
+    remaining_days = record.end_date - now().date()
+
+    return {
+        "history": record,
+        "period": f"{start_date} - {end_date}",
+        "description": record.get_description_display(),
+        "observation": (record.observation or "---------"),
+        show_key: remaining_days.days >= 0,
+    }
+
+
 @login_required
 def leaves_active_history(request, user_id):
     # get user
@@ -530,38 +645,18 @@ def leaves_active_history(request, user_id):
 
     can_manage_users = user_is_in_group(request, "manage_users")
 
-    # ensures user status update
-    current_leave = search_current_leave(user)
-    if current_leave:
-        make_user_unavailable(user)
-    else:
-        make_user_available(user)
-
     records = Leaves.objects.filter(
         user=user,
         interrupted=False,
-    ).order_by("-start_date")
-
-    data_list = []
-
-    for record in records:
-        start_date = record.start_date.strftime("%d/%m/%Y")
-        end_date = record.end_date.strftime("%d/%m/%Y")
-
-        remaining_days = record.end_date - now().date()
-        show_actions = remaining_days.days >= 0
-
-        data_list.append(
-            {
-                "history": record,
-                "period": f"{start_date} - {end_date}",
-                "description": record.get_description_display(),
-                "observation": (record.observation or "---------"),
-                "show_actions": show_actions,
-            }
-        )
+    )
 
-    page_obj, pagination_range = make_pagination(request, data_list, settings.PER_PAGE)
+    page_obj, pagination_range = make_keyset_pagination(
+        request,
+        records,
+        settings.PER_PAGE,
+        ordering=("-start_date", "-id"),
+        decorate=lambda record: history_row(record, "show_actions"),
+    )
     return_page_action = reverse("leaves_view")
 
     return render(
@@ -577,6 +672,43 @@ def leaves_active_history(request, user_id):
     )
 
 
+# csv of the active leaves history of a user
+@login_required
+@group_required("manage_users")
+def leaves_active_history_export(request, user_id):
+    try:
+        user = get_user_model().objects.get(id=user_id)
+    except get_user_model().DoesNotExist:
+        messages.error(request, "Usuário não encontrado.")
+        return redirect("leaves_view")
+
+    records = Leaves.objects.filter(user=user, interrupted=False).values(
+        "id",
+        "description",
+        "start_date",
+        "end_date",
+        "observation",
+        "responsible__username",
+    )
+    descriptions = dict(Leaves.DESCRIPTION_CHOICES)
+
+    return stream_csv(
+        f"afastamentos_{user.username}.csv",
+        [
+            ("ID", "id"),
+            ("Descrição", "description"),
+            ("Data início", "start_date"),
+            ("Data fim", "end_date"),
+            ("Observação", "observation"),
+            ("Responsável", "responsible__username"),
+        ],
+        (
+            {**record, "description": descriptions.get(record["description"], "")}
+            for record in iterate_in_chunks(records)
+        ),
+    )
+
+
 @login_required
 def leaves_interrupted_history(request, user_id):
     # get user
@@ -592,38 +724,18 @@ def leaves_interrupted_history(request, user_id):
 
     can_manage_users = user_is_in_group(request, "manage_users")
 
-    # ensures user status update
-    current_leave = search_current_leave(user)
-    if current_leave:
-        make_user_unavailable(user)
-    else:
-        make_user_available(user)
-
     records = Leaves.objects.filter(
         user=user,
         interrupted=True,
-    ).order_by("-start_date")
-
-    data_list = []
-
-    for record in records:
-        start_date = record.start_date.strftime("%d/%m/%Y")
-        end_date = record.end_date.strftime("%d/%m/%Y")
-
-        remaining_days = record.end_date - now().date()
-        show_action = remaining_days.days >= 0
-
-        data_list.append(
-            {
-                "history": record,
-                "period": f"{start_date} - {end_date}",
-                "description": record.get_description_display(),
-                "observation": (record.observation or "---------"),
-                "show_action": show_action,
-            }
-        )
+    )
 
-    page_obj, pagination_range = make_pagination(request, data_list, settings.PER_PAGE)
+    page_obj, pagination_range = make_keyset_pagination(
+        request,
+        records,
+        settings.PER_PAGE,
+        ordering=("-start_date", "-id"),
+        decorate=lambda record: history_row(record, "show_action"),
+    )
     return_page_action = reverse("leaves_view")
 
     return render(
@@ -675,11 +787,7 @@ def leave_interrupt(request, user_id, leave_id):
         leave.save()
 
         # check if status changed
-        current_leave = search_current_leave(leave.user)
-        if current_leave:
-            make_user_unavailable(leave.user)
-        else:
-            make_user_available(leave.user)
+        update_availability(leave.user)
 
         if settings.SEND_EMAILS == True:
             if leave.user.email:
@@ -771,11 +879,7 @@ def leave_resume(request, user_id, leave_id):
         leave.save()
 
         # check if status changed
-        current_leave = search_current_leave(leave.user)
-        if current_leave:
-            make_user_unavailable(leave.user)
-        else:
-            make_user_available(leave.user)
+        update_availability(leave.user)
 
         if settings.SEND_EMAILS == True:
             if leave.user.email:
@@ -8,9 +8,22 @@ SECRET_KEY = os.getenv("SECRET_KEY", "INSECURE")
 
 DEBUG = True
 PER_PAGE = 20
+# local holidays, besides the national ones in utils/business_days.py ("MM-DD" every year or "YYYY-MM-DD")
+BUSINESS_HOLIDAYS = []
 SEND_EMAILS = False
 EMAIL_SENDER = "lbarroscarregozi@gmail.com"
 DEFAULT_USER_PASSWORD = "@PassWord123"
+# seconds the demand analytics of a period stay cached (demands/analytics.py)
+ANALYTICS_CACHE_TIMEOUT = 60 * 10
+# login and mfa brute-force protection (utils/throttle.py): failed attempts per username + ip, per
+# username and per ip within the window (seconds), then locked for LOGIN_THROTTLE_LOCKOUT seconds
+LOGIN_THROTTLE_ATTEMPTS = 5
+LOGIN_THROTTLE_USERNAME_ATTEMPTS = 20
+LOGIN_THROTTLE_IP_ATTEMPTS = 50
+LOGIN_THROTTLE_WINDOW = 60 * 5
+LOGIN_THROTTLE_LOCKOUT = 60 * 15
+# request.META key with the client ip, e.g. "HTTP_X_REAL_IP" behind a proxy that sets it
+LOGIN_THROTTLE_IP_HEADER = "REMOTE_ADDR"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -71,6 +84,16 @@ DATABASES = {
     }
 }
 
+# per process memory cache. with several workers, use a shared backend instead (e.g. redis or memcached):
+# the login throttle (utils/throttle.py) and the cross-request group cache (utils/permissions.py)
+# need every worker to see the same counters and versions ("python manage.py check --deploy" warns)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sgp",
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
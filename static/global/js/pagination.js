@@ -7,8 +7,13 @@ document.addEventListener("DOMContentLoaded", function () {
             const url = new URL(window.location.href);
             const params = new URLSearchParams(url.search);
 
-            // updates or adds the 'page' parameter
-            params.set("page", this.getAttribute("href").split("=")[1]);
+            // updates or adds the 'page' parameter (a number or a cursor token)
+            const page = new URLSearchParams(this.getAttribute("href").split("?")[1]).get("page");
+            if (page) {
+                params.set("page", page);
+            } else {
+                params.delete("page");
+            }
 
             // updates url in browser without reloading page
             window.location.href = `${url.pathname}?${params.toString()}`;
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # registers the signal receivers
+        from users import signals  # noqa: F401
+        from django.core import checks
+        from utils.throttle import check_throttle_cache
+
+        checks.register(check_throttle_cache, checks.Tags.caches, deploy=True)
@@ -0,0 +1,50 @@
+from functools import partial
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from users.models import CustomUser
+from utils.context_processors import change_users_count, invalidate_users_count
+from utils.permissions import invalidate_user_groups
+
+
+# memberships changed, from either side: user.groups.add(...) or group.user_set.add(...)
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        # the same object may still be used in this request
+        instance.__dict__.pop("_group_names", None)
+        invalidate_user_groups([instance.pk])
+    elif pk_set:
+        invalidate_user_groups(pk_set)
+    else:
+        # group.user_set.clear() doesn't say which users were removed
+        invalidate_user_groups()
+
+
+# renamed or deleted groups change the names of every member
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_user_groups()
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user_groups([instance.pk])
+    if not instance.is_superuser:
+        transaction.on_commit(partial(change_users_count, -1))
+
+
+# users_qt (utils/context_processors.py): the cache only changes once the transaction is committed
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        if not instance.is_superuser:
+            transaction.on_commit(partial(change_users_count, 1))
+    elif update_fields is None or "is_superuser" in update_fields:
+        # is_superuser may have changed (e.g. last_login updates don't touch it)
+        transaction.on_commit(invalidate_users_count)
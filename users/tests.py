@@ -1,3 +1,431 @@
-from django.test import TestCase
+import csv
+from functools import partial
+from unittest import mock
+import pyotp
+import qrcode
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.views import MFA_QRCODE_MAX_AGE, mfa_qrcode_version
+from utils.context_processors import USERS_COUNT_KEY, get_users_count
+from utils.export import iterate_in_chunks
+from utils.permissions import GROUPS_VERSION_KEY, user_groups_version_key
+from utils.search import search_users
+from utils.throttle import LoginThrottle, throttle_stats
 
-# Create your tests here.
+
+class InvalidFormsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def test_invalid_register_renders_the_form(self):
+        response = self.client.post(reverse("register"), {"username": ""})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_reset_password_renders_the_form(self):
+        response = self.client.post(reverse("reset_password"), {"old_password": "wrong"})
+        self.assertEqual(response.status_code, 200)
+
+
+class GroupPermissionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="manage_users")
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password"
+        )
+        cls.manager.groups.add(cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def status(self):
+        # register is only open to manage_users
+        return self.client.get(reverse("register")).status_code
+
+    def test_removed_user_loses_access_immediately(self):
+        self.assertEqual(self.status(), 200)
+        self.manager.groups.remove(self.group)
+        self.assertEqual(self.status(), 403)
+
+    def test_removed_user_loses_access_immediately_with_a_shared_cache(self):
+        with mock.patch("utils.permissions.cache_is_shared", return_value=True):
+            self.assertEqual(self.status(), 200)
+            self.group.user_set.remove(self.manager)
+            self.assertEqual(self.status(), 403)
+
+            self.group.user_set.add(self.manager)
+            self.assertEqual(self.status(), 200)
+            self.group.name = "other"
+            self.group.save()
+            self.assertEqual(self.status(), 403)
+
+    def test_evicted_versions_do_not_bring_old_groups_back(self):
+        with mock.patch("utils.permissions.cache_is_shared", return_value=True):
+            self.assertEqual(self.status(), 200)
+            self.manager.groups.remove(self.group)
+            self.assertEqual(self.status(), 403)
+
+            cache.delete_many(
+                [GROUPS_VERSION_KEY, user_groups_version_key(self.manager.id)]
+            )
+            self.assertEqual(self.status(), 403)
+
+
+LOGIN_THROTTLE_ATTEMPTS = 3
+LOGIN_THROTTLE_USERNAME_ATTEMPTS = 7
+LOGIN_THROTTLE_IP_ATTEMPTS = 12
+LOGIN_THROTTLE_WINDOW = 60
+LOGIN_THROTTLE_LOCKOUT = 120
+
+
+# the limits are read when the throttle runs
+@override_settings(
+    LOGIN_THROTTLE_ATTEMPTS=LOGIN_THROTTLE_ATTEMPTS,
+    LOGIN_THROTTLE_USERNAME_ATTEMPTS=LOGIN_THROTTLE_USERNAME_ATTEMPTS,
+    LOGIN_THROTTLE_IP_ATTEMPTS=LOGIN_THROTTLE_IP_ATTEMPTS,
+    LOGIN_THROTTLE_WINDOW=LOGIN_THROTTLE_WINDOW,
+    LOGIN_THROTTLE_LOCKOUT=LOGIN_THROTTLE_LOCKOUT,
+)
+class LoginThrottleTest(TestCase):
+    # start of a window, so the attempts of a test never cross a window boundary by accident
+    start = LOGIN_THROTTLE_WINDOW * 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="ana", email="ana@app.com", password="password"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.clock = mock.patch("utils.throttle.time.time", return_value=self.start)
+        self.time = self.clock.start()
+        self.addCleanup(self.clock.stop)
+        logger = mock.patch("utils.throttle.logger")
+        self.logger = logger.start()
+        self.addCleanup(logger.stop)
+
+    def throttle(self, scope="login", username="ana", ip="10.0.0.1"):
+        request = RequestFactory().post("/", REMOTE_ADDR=ip)
+        return LoginThrottle(scope, request, username)
+
+    def fail(self, times, **kwargs):
+        for _ in range(times):
+            self.throttle(**kwargs).failure()
+
+    def test_locks_after_the_limit(self):
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+        self.assertEqual(self.throttle().locked_for(), 0)
+
+        self.fail(1)
+        self.assertIn("Bloqueio por usuário e ip", self.logger.warning.call_args.args[0])
+        self.assertEqual(self.throttle().locked_for(), LOGIN_THROTTLE_LOCKOUT + 1)
+        self.assertEqual(
+            throttle_stats("login"), {"failed": LOGIN_THROTTLE_ATTEMPTS, "locked": 1, "rejected": 1}
+        )
+        # other usernames and ips are not affected
+        self.assertEqual(self.throttle(username="bia").locked_for(), 0)
+        self.assertEqual(self.throttle(ip="10.0.0.2").locked_for(), 0)
+
+    def test_username_is_locked_from_every_ip(self):
+        # a distributed attack stays under the limit of each username + ip bucket
+        for i in range(LOGIN_THROTTLE_USERNAME_ATTEMPTS):
+            self.fail(1, ip=f"10.0.1.{i}")
+        self.assertIn("Bloqueio por usuário:", self.logger.warning.call_args.args[0])
+        self.assertGreater(self.throttle(ip="10.0.2.1").locked_for(), 0)
+        self.assertEqual(self.throttle(username="bia", ip="10.0.1.1").locked_for(), 0)
+
+    def test_ip_is_locked_for_every_username(self):
+        for i in range(LOGIN_THROTTLE_IP_ATTEMPTS):
+            self.fail(1, username=f"user{i}")
+        self.assertGreater(self.throttle(username="bia").locked_for(), 0)
+        self.assertEqual(self.throttle(ip="10.0.0.2").locked_for(), 0)
+
+    def test_lockout_ends(self):
+        self.fail(LOGIN_THROTTLE_ATTEMPTS)
+        self.time.return_value = self.start + LOGIN_THROTTLE_LOCKOUT + 1
+        self.assertEqual(self.throttle().locked_for(), 0)
+
+    def test_sliding_window(self):
+        throttle = self.throttle()
+        bucket_key = throttle.buckets[0][1]
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+
+        # half of the previous window still counts
+        now = self.start + LOGIN_THROTTLE_WINDOW * 1.5
+        self.assertEqual(throttle.attempts(bucket_key, now), (LOGIN_THROTTLE_ATTEMPTS - 1) / 2)
+
+        # two windows later nothing counts
+        self.time.return_value = self.start + LOGIN_THROTTLE_WINDOW * 2
+        self.assertEqual(throttle.attempts(bucket_key, self.time.return_value), 0)
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+        self.assertEqual(self.throttle().locked_for(), 0)
+
+    def test_success_clears_the_attempts(self):
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+        self.throttle().success()
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+        self.assertEqual(self.throttle().locked_for(), 0)
+
+    def test_mfa_is_counted_separately(self):
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1)
+        self.fail(LOGIN_THROTTLE_ATTEMPTS - 1, scope="mfa")
+        self.assertEqual(self.throttle().locked_for(), 0)
+        self.assertEqual(self.throttle(scope="mfa").locked_for(), 0)
+
+        self.fail(1, scope="mfa")
+        self.assertEqual(self.throttle().locked_for(), 0)
+        self.assertGreater(self.throttle(scope="mfa").locked_for(), 0)
+
+    def test_locked_login_does_not_check_the_password(self):
+        for _ in range(LOGIN_THROTTLE_ATTEMPTS):
+            self.client.post(reverse("login"), {"username": "ana", "password": "wrong"})
+
+        with mock.patch("users.views.CustomAuthenticationForm.is_valid") as is_valid:
+            response = self.client.post(
+                reverse("login"), {"username": "ana", "password": "password"}
+            )
+        self.assertEqual(response.status_code, 429)
+        is_valid.assert_not_called()
+
+    def test_wrong_mfa_codes_lock_the_mfa(self):
+        data = {"user_id": self.user.id, "otp_code": "000000", "next_url": "/"}
+        with mock.patch("users.views.verify_mfa_otp", return_value=False):
+            for _ in range(LOGIN_THROTTLE_ATTEMPTS):
+                self.client.post(reverse("mfa"), data)
+
+        with mock.patch("users.views.verify_mfa_otp") as verify:
+            response = self.client.post(reverse("mfa"), data)
+        self.assertEqual(response.status_code, 429)
+        verify.assert_not_called()
+
+
+class SearchUsersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = get_user_model().objects.create(
+            username="alima", email="ana@app.com", first_name="Ana", last_name="Lima"
+        )
+        cls.bia = get_user_model().objects.create(
+            username="bsouza", email="bia@outro.com", first_name="Bia", last_name="Souza"
+        )
+
+    def search(self, query, extra_filter=None):
+        users = get_user_model().objects.order_by("username")
+        return list(search_users(users, query, extra_filter))
+
+    def test_search(self):
+        cases = [
+            ("", [self.ana, self.bia]),
+            ("alim", [self.ana]),  # username
+            ("ana lima", [self.ana]),  # full name
+            ("a s", [self.bia]),
+            ("outro.com", [self.bia]),  # e-mail
+            ("carlos", []),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), expected)
+
+    def test_extra_filter(self):
+        self.assertEqual(self.search("carlos", Q(id=self.bia.id)), [self.bia])
+
+
+class ActiveUsersExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username="manager", email="manager@app.com", password="password", is_staff=True
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        cls.users = [
+            get_user_model().objects.create(
+                username=f"user{i}", email=f"user{i}@app.com", first_name="Ana" if i % 2 else "Bia"
+            )
+            for i in range(7)
+        ]
+        get_user_model().objects.create(
+            username="inactive", email="inactive@app.com", is_active=False
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def export(self, data=None):
+        with mock.patch(
+            "users.views.iterate_in_chunks", partial(iterate_in_chunks, chunk_size=2)
+        ):
+            response = self.client.get(reverse("active_users_export"), data or {})
+            self.assertEqual(response.status_code, 200)
+            content = b"".join(response.streaming_content).decode("utf-8-sig")
+        header, *rows = csv.reader(content.splitlines(), delimiter=";")
+        self.assertEqual(header[:2], ["ID", "Usuário"])
+        return [row[1] for row in rows]
+
+    def test_export_applies_the_search(self):
+        usernames = [user.username for user in reversed(self.users)]
+        self.assertEqual(self.export(), usernames)
+        self.assertEqual(self.export({"q": "ana"}), usernames[1::2])
+        self.assertEqual(self.export({"q": "carlos"}), [])
+
+    def test_export_is_for_managers(self):
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(reverse("active_users_export")).status_code, 403)
+
+
+class MfaQrcodeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(
+            username="ana", email="ana@app.com", mfa_secret=pyotp.random_base32()
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def qrcode(self, version=None):
+        return self.client.get(
+            reverse("mfa_qrcode", args=[version or mfa_qrcode_version(self.user)])
+        )
+
+    def test_qrcode_of_the_current_secret(self):
+        response = self.qrcode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertIn(b"<svg", response.content)
+        self.assertEqual(
+            set(response["Cache-Control"].split(", ")),
+            {"private", "immutable", f"max-age={MFA_QRCODE_MAX_AGE}"},
+        )
+        # the profile shows the same image
+        profile = self.client.get(reverse("profile"))
+        self.assertEqual(
+            profile.context["qrcode_url"],
+            reverse("mfa_qrcode", args=[mfa_qrcode_version(self.user)]),
+        )
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        with mock.patch("users.views.qrcode.make", wraps=qrcode.make) as make:
+            first = self.qrcode()
+            second = self.qrcode()
+        self.assertEqual(make.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_stale_or_unneeded_qrcodes_are_not_found(self):
+        version = mfa_qrcode_version(self.user)
+        self.assertEqual(self.qrcode("0" * 32).status_code, 404)
+
+        # the secret changed: the old url is gone
+        self.user.mfa_secret = pyotp.random_base32()
+        self.user.save()
+        self.assertEqual(self.qrcode(version).status_code, 404)
+        self.assertEqual(self.qrcode().status_code, 200)
+
+        self.user.mfa_enabled = True
+        self.user.save()
+        self.assertEqual(self.qrcode().status_code, 404)
+        self.assertIsNone(self.client.get(reverse("profile")).context["qrcode_url"])
+
+        self.user.mfa_enabled = False
+        self.user.mfa_secret = None
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("mfa_qrcode", args=[version])).status_code, 404)
+        self.assertIsNone(self.client.get(reverse("profile")).context["qrcode_url"])
+
+    def test_login_is_required(self):
+        self.client.logout()
+        self.assertEqual(self.qrcode().status_code, 302)
+
+
+class UsersCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create(
+            username="manager", email="manager@app.com", is_staff=True
+        )
+        cls.manager.groups.add(Group.objects.create(name="manage_users"))
+        get_user_model().objects.create(
+            username="admin", email="admin@app.com", is_superuser=True
+        )
+        cls.ana = get_user_model().objects.create(username="ana", email="ana@app.com")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def counted(self):
+        return get_user_model().objects.filter(is_superuser=False).count()
+
+    def test_count_is_only_read_by_the_templates_that_show_it(self):
+        self.client.get(reverse("profile"))
+        self.assertIsNone(cache.get(USERS_COUNT_KEY))
+
+        response = self.client.get(reverse("active_users"))
+        self.assertContains(response, f"Usuários ({self.counted()})")
+        self.assertEqual(cache.get(USERS_COUNT_KEY), self.counted())
+
+        # then from the cache
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_users_count(), 2)
+        self.assertEqual(len(queries), 0)
+
+    def test_created_and_deleted_users_change_the_count(self):
+        get_users_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            bia = get_user_model().objects.create(username="bia", email="bia@app.com")
+        self.assertEqual(cache.get(USERS_COUNT_KEY), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create(
+                username="root", email="root@app.com", is_superuser=True
+            )
+        self.assertEqual(cache.get(USERS_COUNT_KEY), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bia.delete()
+        self.assertEqual(cache.get(USERS_COUNT_KEY), 2)
+        self.assertEqual(cache.get(USERS_COUNT_KEY), self.counted())
+
+    def test_uncached_count_is_not_changed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create(username="bia", email="bia@app.com")
+        self.assertIsNone(cache.get(USERS_COUNT_KEY))
+        self.assertEqual(get_users_count(), 3)
+
+    def test_saves_that_may_change_is_superuser_invalidate_the_count(self):
+        get_users_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.save(update_fields=["last_login"])
+            self.ana.first_name = "Ana"
+            self.ana.save(update_fields=["first_name"])
+        self.assertEqual(cache.get(USERS_COUNT_KEY), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.is_superuser = True
+            self.ana.save()
+        self.assertIsNone(cache.get(USERS_COUNT_KEY))
+        self.assertEqual(get_users_count(), 1)
+
+        get_users_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.is_superuser = False
+            self.ana.save(update_fields=["is_superuser"])
+        self.assertIsNone(cache.get(USERS_COUNT_KEY))
+        self.assertEqual(get_users_count(), 2)
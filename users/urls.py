@@ -9,10 +9,12 @@ urlpatterns = [
     path("login/", views.login_action, name="login"),
     path("mfa/", views.mfa, name="mfa"),
     path("profile/", views.profile, name="profile"),
+    path("profile/mfa_qrcode/<str:version>.svg", views.mfa_qrcode, name="mfa_qrcode"),  # cached per mfa secret
     path("edit/<int:user_id>", views.edit, name="edit_id"),  # edit another user
     path("edit/", views.edit, name="edit"),  # edit own data
     path("register/", views.register, name="register"),
     path("active_users/", views.active_users, name="active_users"),
+    path("active_users/export/", views.active_users_export, name="active_users_export"),  # csv (same search)
     path("deactivated_users/", views.deactivated_users, name="deactivated_users"),
     path("activate_user/<int:user_id>/", views.activate_user, name="activate_user"),
     path("deactivate_user/<int:user_id>/", views.deactivate_user, name="deactivate_user"),
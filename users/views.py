@@ -4,14 +4,20 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import redirect, render, resolve_url
 from django.urls import reverse
 from utils.decorators import group_required, deny_if_not_in_group, user_is_in_group
+from utils.export import iterate_in_chunks, stream_csv
 from utils.pagination import make_pagination
+from utils.search import search_users
+from utils.throttle import LoginThrottle, lockout_message
 from django.utils.html import strip_tags
 from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
 from django.conf import settings
 from django.contrib import messages
 from django.utils import timezone
 from django.db import transaction, IntegrityError
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import salted_hmac
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
 from users.models import PasswordResetToken
 from users.forms import (
@@ -22,14 +28,17 @@ from users.forms import (
 )
 import pyotp
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import io
-import base64
 import logging
 
 
 logger = logging.getLogger(__name__)
 signer = TimestampSigner()
 
+# seconds the mfa qr code stays cached (server and browser)
+MFA_QRCODE_MAX_AGE = 60 * 60 * 24
+
 
 # home page
 @login_required
@@ -59,9 +68,26 @@ def login_action(request):
 
     # if POST method
     if request.method == "POST":
+        # too many failed attempts: rejected before the password is hashed
+        throttle = LoginThrottle("login", request, request.POST.get("username"))
+        locked_for = throttle.locked_for()
+        if locked_for:
+            messages.error(request, lockout_message(locked_for))
+            return render(
+                request,
+                "users/login.html",
+                {
+                    "form": CustomAuthenticationForm(
+                        initial={"username": request.POST.get("username")}
+                    ),
+                },
+                status=429,
+            )
+
         form = CustomAuthenticationForm(data=request.POST)
 
         if form.is_valid():
+            throttle.success()
             # get the user
             user = form.get_user()
 
@@ -101,6 +127,7 @@ def login_action(request):
 
         # if wrong data or user not found
         else:
+            throttle.failure()
             messages.error(request, "Usuário ou senha incorretos, tente novamente.")
             return render(
                 request,
@@ -176,9 +203,31 @@ def mfa(request):
 
     # if POST method
     if request.method == "POST":
+        # too many wrong codes: rejected before the code is verified
+        throttle = LoginThrottle("mfa", request, str(user.id))
+        locked_for = throttle.locked_for()
+        if locked_for:
+            messages.error(request, lockout_message(locked_for))
+
+            # user in profile page activating mfa
+            if request.user and request.user.is_authenticated:
+                return redirect("profile")
+
+            # user in mfa page authenticating
+            return render(
+                request,
+                "users/mfa.html",
+                {
+                    "user_id": user_id,
+                    "next_url": next_url,
+                    "return_page_action": return_page_action,
+                },
+                status=429,
+            )
 
         # if true
         if verify_mfa_otp(user, otp):
+            throttle.success()
             # user in profile page activating mfa
             if request.user and request.user.is_authenticated:
                 messages.success(request, "MFA ativado.")
@@ -196,6 +245,7 @@ def mfa(request):
 
         # if false
         else:
+            throttle.failure()
             messages.error(request, "Código inválido, tente novamente.")
 
             # user in profile page failed activating mfa
@@ -226,33 +276,53 @@ def profile(request):
     if not user.mfa_enabled:
         messages.warning(request, "Ative autenticação de dois fatores.")
 
+    # the qr code is an image of its own (mfa_qrcode), only shown while mfa is not enabled.
+    # its url carries the version of the secret, so browsers keep it until the secret changes
+    qrcode_url = None
+    if not user.mfa_enabled and user.mfa_secret:
+        qrcode_url = reverse("mfa_qrcode", args=[mfa_qrcode_version(user)])
+
+    return render(request, "users/profile.html", {"qrcode_url": qrcode_url})
+
+
+def mfa_otp_uri(user):
     # pyotp.totp.TOTP(user.mfa_secret) -> creates a totp generator based on the user's secret
     # provisioning_uri(...) -> generates an uri in otpauth://totp/... format that can be scanned by apps like google authenticator
     # name=user.email -> shows user's email in authenticator app.
     # issuer_name="app_name" -> shows application's name in authenticator app
-    otp_uri = pyotp.totp.TOTP(user.mfa_secret).provisioning_uri(
+    return pyotp.totp.TOTP(user.mfa_secret).provisioning_uri(
         name=user.email, issuer_name="my_app"
     )
 
-    # generates a qr code from "otpauth://totp/..." uri
-    qr = qrcode.make(otp_uri)
 
-    # converting the qr code to a base64 string so it can be displayed in html without saving it as a file:
+def mfa_qrcode_version(user):
+    # keyed hash of the uri (secret and email): changes with the secret and doesn't reveal it
+    return salted_hmac("users.mfa_qrcode", mfa_otp_uri(user)).hexdigest()[:32]
+
 
-    # creates a buffer in memory to store the qr code image
-    buffer = io.BytesIO()
-    # saves the qr code to the buffer in png format
-    qr.save(buffer, format="PNG")
-    # moves the cursor to the beginning of the buffer for reading
-    buffer.seek(0)
-    # buffer.getvalue() -> gets image bytes
-    # base64.b64encode(...).decode("utf-8") -> converts the bytes to a base64 encoded string
-    qr_code = base64.b64encode(buffer.getvalue()).decode("utf-8")
+# qr code of the user's mfa secret (svg), generated once per secret
+@login_required
+def mfa_qrcode(request, version):
+    user = request.user
 
-    # generates a data uri that allows the qr code to be displayed in html without needing to save as a file
-    qr_code_data_uri = f"data:image/png;base64,{qr_code}"
-    # passes the base64-encoded image of the qr code to the template in the 'qrcode' variable
-    return render(request, "users/profile.html", {"qrcode": qr_code_data_uri})
+    # old versions (the secret changed) and users with mfa already enabled get nothing
+    if user.mfa_enabled or not user.mfa_secret or version != mfa_qrcode_version(user):
+        raise Http404
+
+    cache_key = f"mfa_qrcode:{version}"
+    svg = cache.get(cache_key)
+    if svg is None:
+        # generates a qr code from "otpauth://totp/..." uri, as a vector image (no pillow involved)
+        qr = qrcode.make(mfa_otp_uri(user), image_factory=SvgPathImage)
+        buffer = io.BytesIO()
+        qr.save(buffer)
+        svg = buffer.getvalue()
+        cache.set(cache_key, svg, MFA_QRCODE_MAX_AGE)
+
+    response = HttpResponse(svg, content_type="image/svg+xml")
+    # the url changes with the secret, so the browser never needs to ask again
+    patch_cache_control(response, private=True, max_age=MFA_QRCODE_MAX_AGE, immutable=True)
+    return response
 
 
 # edit page and edit action
@@ -383,6 +453,29 @@ def register(request):
     )
 
 
+# row of the users tables
+def user_row(user):
+    # use timezone.localtime to put the time registered in the database in the correct time zone
+    return {
+        "user": user,
+        "last_login": (
+            timezone.localtime(user.last_login).strftime("%d/%m/%Y %H:%M")
+            if user.last_login
+            else "---------"
+        ),
+        "updated_at": (
+            timezone.localtime(user.updated_at).strftime("%d/%m/%Y %H:%M")
+            if user.updated_at
+            else "---------"
+        ),
+        "date_joined": (
+            timezone.localtime(user.date_joined).strftime("%d/%m/%Y %H:%M")
+            if user.date_joined
+            else "---------"
+        ),
+    }
+
+
 # active users list
 @login_required
 @group_required("manage_users")
@@ -392,50 +485,19 @@ def active_users(request):
     # get query from url (.../?q=str)
     query = request.GET.get("q", "").strip().lower()
 
-    # list
-    users_data = []
-    # queryset
-    users = (
-        get_user_model()
-        .objects.filter(is_superuser=False, is_staff=False, is_active=True)
-        .order_by("-updated_at", "-date_joined")
+    # queryset (filtered by search)
+    users = search_users(
+        get_user_model().objects.filter(
+            is_superuser=False, is_staff=False, is_active=True
+        ),
+        query,
+    ).order_by("-updated_at", "-date_joined")
+
+    # pagination (only the users in the current page are turned into rows)
+    page_obj, pagination_range = make_pagination(
+        request, users, settings.PER_PAGE, decorate=user_row
     )
 
-    # add each element in the queryset to the list
-    for user in users:
-        # use timezone.localtime to put the time registered in the database in the correct time zone
-        users_data.append(
-            {
-                "user": user,
-                "last_login": (
-                    timezone.localtime(user.last_login).strftime("%d/%m/%Y %H:%M")
-                    if user.last_login
-                    else "---------"
-                ),
-                "updated_at": (
-                    timezone.localtime(user.updated_at).strftime("%d/%m/%Y %H:%M")
-                    if user.updated_at
-                    else "---------"
-                ),
-                "date_joined": (
-                    timezone.localtime(user.date_joined).strftime("%d/%m/%Y %H:%M")
-                    if user.date_joined
-                    else "---------"
-                ),
-            }
-        )
-
-    # filters data based on search
-    if query:
-        users_data = [
-            data
-            for data in users_data
-            if any(query in str(data[key]).lower() for key in data)
-        ]
-
-    # pagination
-    page_obj, pagination_range = make_pagination(request, users_data, settings.PER_PAGE)
-
     return render(
         request,
         "users/users.html",
@@ -447,6 +509,46 @@ def active_users(request):
     )
 
 
+# csv of the active users list (same search)
+@login_required
+@group_required("manage_users")
+def active_users_export(request):
+    query = request.GET.get("q", "").strip().lower()
+
+    users = search_users(
+        get_user_model().objects.filter(
+            is_superuser=False, is_staff=False, is_active=True
+        ),
+        query,
+    ).values(
+        "id",
+        "username",
+        "first_name",
+        "last_name",
+        "email",
+        "available",
+        "last_login",
+        "date_joined",
+        "updated_at",
+    )
+
+    return stream_csv(
+        "usuarios_ativos.csv",
+        [
+            ("ID", "id"),
+            ("Usuário", "username"),
+            ("Nome", "first_name"),
+            ("Sobrenome", "last_name"),
+            ("E-mail", "email"),
+            ("Disponível", "available"),
+            ("Último acesso", "last_login"),
+            ("Cadastrado em", "date_joined"),
+            ("Atualizado em", "updated_at"),
+        ],
+        iterate_in_chunks(users),
+    )
+
+
 # deactivated users list
 @login_required
 @group_required("manage_users")
@@ -456,50 +558,19 @@ def deactivated_users(request):
     # get query from url (.../?q=str)
     query = request.GET.get("q", "").strip().lower()
 
-    # list
-    users_data = []
-    # queryset
-    users = (
-        get_user_model()
-        .objects.filter(is_superuser=False, is_staff=False, is_active=False)
-        .order_by("-updated_at", "-date_joined")
+    # queryset (filtered by search)
+    users = search_users(
+        get_user_model().objects.filter(
+            is_superuser=False, is_staff=False, is_active=False
+        ),
+        query,
+    ).order_by("-updated_at", "-date_joined")
+
+    # pagination (only the users in the current page are turned into rows)
+    page_obj, pagination_range = make_pagination(
+        request, users, settings.PER_PAGE, decorate=user_row
     )
 
-    # add each element in the queryset to the list
-    for user in users:
-        # use timezone.localtime to put the time registered in the database in the correct time zone
-        users_data.append(
-            {
-                "user": user,
-                "last_login": (
-                    timezone.localtime(user.last_login).strftime("%d/%m/%Y %H:%M")
-                    if user.last_login
-                    else "---------"
-                ),
-                "updated_at": (
-                    timezone.localtime(user.updated_at).strftime("%d/%m/%Y %H:%M")
-                    if user.updated_at
-                    else "---------"
-                ),
-                "date_joined": (
-                    timezone.localtime(user.date_joined).strftime("%d/%m/%Y %H:%M")
-                    if user.date_joined
-                    else "---------"
-                ),
-            }
-        )
-
-    # filters data based on search
-    if query:
-        users_data = [
-            data
-            for data in users_data
-            if any(query in str(data[key]).lower() for key in data)
-        ]
-
-    # pagination
-    page_obj, pagination_range = make_pagination(request, users_data, settings.PER_PAGE)
-
     return render(
         request,
         "users/users.html",
@@ -0,0 +1,127 @@
+# precomputed business-day calendar: weekends and holidays are skipped by index arithmetic
+from array import array
+from datetime import date, timedelta
+from functools import lru_cache
+from django.conf import settings
+
+
+# national holidays (month, day)
+FIXED_HOLIDAYS = [
+    (1, 1),  # confraternização universal
+    (4, 21),  # tiradentes
+    (5, 1),  # dia do trabalho
+    (9, 7),  # independência
+    (10, 12),  # nossa senhora aparecida
+    (11, 2),  # finados
+    (11, 15),  # proclamação da república
+    (11, 20),  # consciência negra
+    (12, 25),  # natal
+]
+
+# movable holidays (days after easter sunday)
+EASTER_HOLIDAYS = [
+    -48,  # carnaval (monday)
+    -47,  # carnaval (tuesday)
+    -2,  # sexta-feira santa
+    60,  # corpus christi
+]
+
+# years before and after the current one covered by the default calendar
+CALENDAR_YEARS = 5
+
+
+def easter_sunday(year):
+    # anonymous gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def holidays(first_year, last_year):
+    # local holidays from settings: "MM-DD" (every year) or "YYYY-MM-DD"
+    local_holidays = getattr(settings, "BUSINESS_HOLIDAYS", [])
+
+    days = set()
+    for year in range(first_year, last_year + 1):
+        easter = easter_sunday(year)
+        days.update(date(year, month, day) for month, day in FIXED_HOLIDAYS)
+        days.update(easter + timedelta(days=offset) for offset in EASTER_HOLIDAYS)
+        for holiday in local_holidays:
+            if len(holiday) == 5:
+                days.add(date.fromisoformat(f"{year}-{holiday}"))
+            elif int(holiday[:4]) == year:
+                days.add(date.fromisoformat(holiday))
+    return days
+
+
+class BusinessCalendar:
+    def __init__(self, first_year, last_year, holidays):
+        self.first_ordinal = date(first_year, 1, 1).toordinal()
+        self.last_ordinal = date(last_year, 12, 31).toordinal()
+
+        # ordinals of the business days, in order
+        self.days = array("l")
+        # for every calendar day: how many business days come before it
+        self.ranks = array("l")
+
+        for ordinal in range(self.first_ordinal, self.last_ordinal + 1):
+            self.ranks.append(len(self.days))
+            day = date.fromordinal(ordinal)
+            if day.weekday() < 5 and day not in holidays:
+                self.days.append(ordinal)
+
+    def covers(self, day):
+        return self.first_ordinal <= day.toordinal() <= self.last_ordinal
+
+    def rank(self, day):
+        return self.ranks[day.toordinal() - self.first_ordinal]
+
+    def is_business_day(self, day):
+        rank = self.rank(day)
+        return rank < len(self.days) and self.days[rank] == day.toordinal()
+
+    def subtract(self, day, business_days):
+        # the nth business day before the given day
+        return date.fromordinal(self.days[self.rank(day) - business_days])
+
+    def add(self, day, business_days):
+        # the nth business day after the given day
+        return date.fromordinal(
+            self.days[self.rank(day + timedelta(days=1)) + business_days - 1]
+        )
+
+
+@lru_cache(maxsize=4)
+def build_calendar(first_year, last_year):
+    return BusinessCalendar(first_year, last_year, holidays(first_year, last_year))
+
+
+def get_calendar(*days):
+    # the default calendar is shared by every lookup close to the current year
+    current_year = date.today().year
+    first_year = current_year - CALENDAR_YEARS
+    last_year = current_year + CALENDAR_YEARS
+    for day in days:
+        first_year = min(first_year, day.year - 1)
+        last_year = max(last_year, day.year + 1)
+    return build_calendar(first_year, last_year)
+
+
+def subtract_business_days(day, business_days):
+    return get_calendar(day).subtract(day, business_days)
+
+
+def add_business_days(day, business_days):
+    return get_calendar(day).add(day, business_days)
+
+
+def is_business_day(day):
+    return get_calendar(day).is_business_day(day)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+
+
+# backends that keep their data inside a single process (or don't keep it at all)
+PROCESS_LOCAL_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+
+def cache_is_shared(alias=DEFAULT_CACHE_ALIAS):
+    # true when every worker sees the same cache (e.g. redis, memcached, database)
+    return settings.CACHES[alias]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
@@ -1,7 +1,35 @@
 # usage example of context_processors (/project/settings.py)
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
 from users.models import CustomUser
 
 
+# the count is kept in the cache and updated by users/signals.py.
+# the timeout only bounds how long a missed update may last
+USERS_COUNT_KEY = "users_count"
+USERS_COUNT_TIMEOUT = 60 * 60
+
+
+def get_users_count():
+    users_qt = cache.get(USERS_COUNT_KEY)
+    if users_qt is None:
+        users_qt = CustomUser.objects.filter(is_superuser=False).count()
+        cache.set(USERS_COUNT_KEY, users_qt, USERS_COUNT_TIMEOUT)
+    return users_qt
+
+
+def change_users_count(delta):
+    try:
+        cache.incr(USERS_COUNT_KEY, delta)
+    except ValueError:
+        # not cached: the next read counts again
+        pass
+
+
+def invalidate_users_count():
+    cache.delete(USERS_COUNT_KEY)
+
+
 def users_count(request):
-    users_qt = CustomUser.objects.filter(is_superuser=False).count()
-    return {"users_qt": users_qt}
+    # lazy: only templates that show users_qt read the cache (or the database)
+    return {"users_qt": SimpleLazyObject(get_users_count)}
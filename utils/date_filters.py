@@ -0,0 +1,70 @@
+# date filters taken from the url (e.g. /?dq=YYYY-MM or /?dq_from=YYYY-MM-DD&dq_to=YYYY-MM-DD).
+# periods are half-open (first day included, last day excluded), so they become plain range
+# conditions (column >= x AND column < y) that can use the indexes of the columns
+from datetime import datetime, time, timedelta
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q
+from django.utils.timezone import get_current_timezone, make_aware
+
+
+def month_range(value):
+    # "YYYY-MM" -> (first day of the month, first day of the next month), or None if invalid
+    try:
+        first_day = datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        return None
+    return first_day, first_day + relativedelta(months=1)
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def days_range(start, end):
+    # "YYYY-MM-DD", "YYYY-MM-DD" (both included) -> (start, day after end).
+    # either side may be empty (open period), None if both are empty or invalid
+    first_day = parse_day(start) if start else None
+    last_day = parse_day(end) if end else None
+    if (start and not first_day) or (end and not last_day) or not (first_day or last_day):
+        return None
+    if first_day and last_day and last_day < first_day:
+        first_day, last_day = last_day, first_day
+    return first_day, last_day + timedelta(days=1) if last_day else None
+
+
+def request_period(request, name="dq"):
+    # ?dq=YYYY-MM (a month) or ?dq_from=YYYY-MM-DD&dq_to=YYYY-MM-DD (any period)
+    month = request.GET.get(name, "").strip()
+    if month:
+        return month_range(month)
+    return days_range(
+        request.GET.get(f"{name}_from", "").strip(),
+        request.GET.get(f"{name}_to", "").strip(),
+    )
+
+
+def local_midnight(day):
+    # the first instant of the day in the project time zone (America/Sao_Paulo)
+    return make_aware(datetime.combine(day, time.min), get_current_timezone())
+
+
+def period_filter(period, date_fields=(), datetime_fields=()):
+    # rows with any of the fields inside the period
+    first_day, next_day = period
+    condition = Q()
+
+    for field, convert in [
+        *((field, lambda day: day) for field in date_fields),
+        *((field, local_midnight) for field in datetime_fields),
+    ]:
+        bounds = {}
+        if first_day:
+            bounds[f"{field}__gte"] = convert(first_day)
+        if next_day:
+            bounds[f"{field}__lt"] = convert(next_day)
+        condition |= Q(**bounds)
+
+    return condition
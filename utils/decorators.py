@@ -2,6 +2,7 @@ from functools import wraps
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import HttpResponseForbidden
+from utils.permissions import in_any_group
 
 
 # decorator
@@ -10,8 +11,7 @@ def group_required(*group_names):
         @wraps(view_func)
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            user_groups = request.user.groups.values_list("name", flat=True)
-            if any(group in user_groups for group in group_names):
+            if in_any_group(request.user, group_names):
                 return view_func(request, *args, **kwargs)
             return HttpResponseForbidden(
                 render(request, "global/partials/access_denied.html")
@@ -24,8 +24,7 @@ def group_required(*group_names):
 
 # deny user
 def deny_if_not_in_group(request, *group_names):
-    user_groups = request.user.groups.values_list("name", flat=True)
-    if not any(group in user_groups for group in group_names):
+    if not in_any_group(request.user, group_names):
         return HttpResponseForbidden(
             render(request, "global/partials/access_denied.html")
         )
@@ -36,5 +35,4 @@ def deny_if_not_in_group(request, *group_names):
 def user_is_in_group(request, *group_names):
     if not request.user.is_authenticated:
         return False
-    user_groups = request.user.groups.values_list("name", flat=True)
-    return any(group in user_groups for group in group_names)
+    return in_any_group(request.user, group_names)
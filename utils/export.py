@@ -0,0 +1,61 @@
+# streaming csv export: rows are written while they are read from the database, in chunks,
+# so memory stays flat and the download starts right away whatever the number of rows
+import csv
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from utils.pagination import keyset_filter, keyset_values
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # file-like object for csv.writer: returns the line instead of storing it
+    def write(self, value):
+        return value
+
+
+def iterate_in_chunks(queryset, ordering=("-id",), chunk_size=EXPORT_CHUNK_SIZE):
+    # walks the queryset (.values()) with keyset chunks: each query starts after the last row
+    # of the previous one. unlike .iterator(), the whole result is never buffered by the driver
+    # (mysqlclient buffers it), and the cost of a chunk doesn't grow with the position
+    fields = [field.lstrip("-") for field in ordering]
+    values = None
+    while True:
+        chunk = queryset.order_by(*ordering)
+        if values is not None:
+            chunk = chunk.filter(keyset_filter(ordering, values))
+        rows = list(chunk[:chunk_size])
+
+        yield from rows
+
+        if len(rows) < chunk_size:
+            return
+        values = keyset_values(rows[-1], fields)
+
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Sim" if value else "Não"
+    if hasattr(value, "tzinfo"):
+        return timezone.localtime(value).strftime("%d/%m/%Y %H:%M")
+    if hasattr(value, "strftime"):
+        return value.strftime("%d/%m/%Y")
+    return value
+
+
+def stream_csv(filename, columns, rows):
+    # columns: [(header, key of the row)]; rows: dicts (e.g. iterate_in_chunks)
+    writer = csv.writer(Echo(), delimiter=";")
+
+    def lines():
+        # byte order mark, so spreadsheet programs read the file as utf-8
+        yield "\ufeff" + writer.writerow([header for header, _ in columns])
+        for row in rows:
+            yield writer.writerow([format_value(row[key]) for _, key in columns])
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
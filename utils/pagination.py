@@ -1,6 +1,9 @@
 # https://docs.djangoproject.com/en/3.2/topics/pagination/
 import math
+from django.core import signing
+from django.core.exceptions import BadRequest, ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
 
 
 def make_pagination_range(page_range, qty_pages, current_page):
@@ -40,7 +43,9 @@ def make_pagination_range(page_range, qty_pages, current_page):
     }
 
 
-def make_pagination(request, queryset, per_page, qty_pages=3):
+# queryset can be lazy: only the rows of the current page are fetched.
+# decorate (optional) is called for each of those rows, to build what the template shows.
+def make_pagination(request, queryset, per_page, qty_pages=3, decorate=None):
     try:
         current_page = int(request.GET.get("page", 1))
     except ValueError:
@@ -49,8 +54,154 @@ def make_pagination(request, queryset, per_page, qty_pages=3):
     paginator = Paginator(queryset, per_page)
     page_obj = paginator.get_page(current_page)
 
+    if decorate:
+        page_obj.object_list = [decorate(obj) for obj in page_obj.object_list]
+
     pagination_range = make_pagination_range(
         paginator.page_range, qty_pages, current_page
     )
 
     return page_obj, pagination_range
+
+
+# keyset (cursor) pagination: no COUNT(*) and no OFFSET, so deep pages cost the same as the first one.
+# the queryset is ordered by the given indexed fields (the last one must be unique, e.g. "-id")
+# and the "page" parameter carries a signed token with the values of the boundary row.
+KEYSET_SALT = "utils.pagination.keyset"
+
+
+# tampered, foreign or unreadable token (a 400 response if not handled by the view)
+class InvalidKeysetToken(BadRequest):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_token=None, previous_token=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+
+def keyset_values(obj, fields):
+    return [
+        obj[field] if isinstance(obj, dict) else getattr(obj, field) for field in fields
+    ]
+
+
+def keyset_filter(ordering, values, reverse=False):
+    # rows after the given values in the ordering: (a, b) > (x, y) means a > x or (a = x and b > y)
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != reverse
+        condition |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal[name] = value
+    return condition
+
+
+def make_keyset_token(ordering, values, direction):
+    return signing.dumps(
+        {
+            "o": list(ordering),
+            "v": [None if value is None else str(value) for value in values],
+            "d": direction,
+        },
+        salt=KEYSET_SALT,
+        compress=True,
+    )
+
+
+def read_keyset_token(token, queryset, ordering):
+    # returns (values, direction), or (None, "next") for the first page (no token).
+    # an invalid token raises InvalidKeysetToken instead of silently showing the first page
+    if not token:
+        return None, "next"
+    try:
+        data = signing.loads(token, salt=KEYSET_SALT)
+        if data["o"] != list(ordering) or data["d"] not in ("next", "previous"):
+            raise ValueError
+        if len(data["v"]) != len(ordering) or None in data["v"]:
+            # null values can't be compared, the filter would skip or repeat rows
+            raise ValueError
+        values = [
+            queryset.model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, data["v"])
+        ]
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+        raise InvalidKeysetToken("Cursor de paginação inválido.")
+    return values, data["d"]
+
+
+def make_keyset_pagination(
+    request,
+    queryset,
+    per_page,
+    ordering=("-updated_at", "-id"),
+    decorate=None,
+    page_param="page",
+):
+    fields = [field.lstrip("-") for field in ordering]
+    values, direction = read_keyset_token(
+        request.GET.get(page_param, ""), queryset, ordering
+    )
+
+    if direction == "previous":
+        # walks the ordering backwards from the first row of the page the user came from
+        reversed_ordering = [
+            field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+        ]
+        rows = list(
+            queryset.filter(keyset_filter(ordering, values, reverse=True)).order_by(
+                *reversed_ordering
+            )[: per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        rows = list(queryset.order_by(*ordering)[: per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = values is not None
+
+    next_token = (
+        make_keyset_token(ordering, keyset_values(rows[-1], fields), "next")
+        if rows and has_next
+        else None
+    )
+    previous_token = (
+        make_keyset_token(ordering, keyset_values(rows[0], fields), "previous")
+        if rows and has_previous
+        else None
+    )
+
+    if decorate:
+        rows = [decorate(obj) for obj in rows]
+
+    page_obj = KeysetPage(rows, next_token, previous_token)
+    pagination_range = {
+        "keyset": True,
+        "pagination": [],
+        "next_page": next_token,
+        "previous_page": previous_token,
+    }
+
+    return page_obj, pagination_range
@@ -0,0 +1,67 @@
+# group names of the users, read once per request and, with a shared cache backend, cached across
+# requests. the cache key carries a version, bumped by users/signals.py whenever memberships or groups
+# change. a process-local cache (locmem) would keep other workers on old versions, so it isn't used
+import time
+from django.core.cache import cache
+from utils.caches import cache_is_shared
+
+
+# seconds the group names of a user stay cached (bounds how long a lost version may go unnoticed)
+GROUPS_CACHE_TIMEOUT = 60 * 10
+GROUPS_VERSION_KEY = "user_groups_version"
+
+
+def user_groups_version_key(user_id):
+    return f"{GROUPS_VERSION_KEY}:{user_id}"
+
+
+def groups_version(user_id):
+    # global version (groups renamed or deleted) and the user's version (memberships changed)
+    keys = [GROUPS_VERSION_KEY, user_groups_version_key(user_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # never cached or evicted: a new version, so entries of an older one can't come back
+            version = time.time_ns()
+            cache.add(key, version, None)
+            versions[key] = cache.get(key, version)
+    return ".".join(str(versions[key]) for key in keys)
+
+
+def invalidate_user_groups(user_ids=None):
+    # None invalidates every user
+    keys = (
+        [GROUPS_VERSION_KEY]
+        if user_ids is None
+        else [user_groups_version_key(user_id) for user_id in user_ids]
+    )
+    # a new version instead of a delete: entries being written meanwhile become unreachable
+    version = time.time_ns()
+    cache.set_many({key: version for key in keys}, None)
+
+
+def user_group_names(user):
+    # frozenset of the user's group names
+    if not user.is_authenticated:
+        return frozenset()
+
+    # per request: request.user lives as long as the request
+    group_names = getattr(user, "_group_names", None)
+    if group_names is not None:
+        return group_names
+
+    if cache_is_shared():
+        key = f"user_groups:{user.pk}:{groups_version(user.pk)}"
+        group_names = cache.get(key)
+        if group_names is None:
+            group_names = frozenset(user.groups.values_list("name", flat=True))
+            cache.set(key, group_names, GROUPS_CACHE_TIMEOUT)
+    else:
+        group_names = frozenset(user.groups.values_list("name", flat=True))
+
+    user._group_names = group_names
+    return group_names
+
+
+def in_any_group(user, group_names):
+    return not user_group_names(user).isdisjoint(group_names)
@@ -0,0 +1,21 @@
+# search bar of the users lists (users and leaves board)
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+
+
+def search_users(users, query, extra_filter=None):
+    # username, full name or e-mail containing the query, or any extra condition of the list
+    if not query:
+        return users
+
+    condition = (
+        Q(username__icontains=query)
+        | Q(full_name__icontains=query)
+        | Q(email__icontains=query)
+    )
+    if extra_filter is not None:
+        condition |= extra_filter
+
+    return users.annotate(
+        full_name=Concat("first_name", Value(" "), "last_name")
+    ).filter(condition)
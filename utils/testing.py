@@ -0,0 +1,21 @@
+import re
+from django.db import connection
+
+
+# mixin for TestCase: checks the query plan (EXPLAIN) of a queryset in the test database
+class QueryPlanMixin:
+    def assertUsesIndex(self, queryset, table):
+        if connection.vendor == "mysql":
+            plan = queryset.explain(format="json")
+            # access_type ALL is a full table scan
+            self.assertNotRegex(plan, r'"access_type":\s*"ALL"')
+            self.assertRegex(plan, r'"key":\s*"\w+"')
+        elif connection.vendor == "sqlite":
+            plan = queryset.explain()
+            self.assertRegex(plan, rf"SEARCH {table} USING (COVERING )?INDEX")
+            self.assertIsNone(re.search(rf"SCAN {table}$", plan, re.MULTILINE))
+        elif connection.vendor == "postgresql":
+            plan = queryset.explain()
+            self.assertNotIn(f"Seq Scan on {table}", plan)
+        else:
+            self.skipTest(f"EXPLAIN não verificado para {connection.vendor}.")
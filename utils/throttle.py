@@ -0,0 +1,169 @@
+# brute-force protection for the login and mfa forms: failed attempts are counted per
+# username + client ip, per username and per client ip in a sliding window kept in the cache. once a limit is
+# reached the key is locked, and locked attempts are rejected before any password is hashed.
+# the limits only hold across workers with a shared cache backend (see check_throttle_cache)
+import hashlib
+import logging
+import time
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from utils.caches import cache_is_shared
+
+
+logger = logging.getLogger(__name__)
+
+# defaults of the LOGIN_THROTTLE_* settings. they are read on every attempt, so per-environment
+# values and override_settings apply
+THROTTLE_DEFAULTS = {
+    # failed attempts of a username from the same ip within the window
+    "LOGIN_THROTTLE_ATTEMPTS": 5,
+    # failed attempts of a username from any ip within the window (one account attacked from many ips)
+    "LOGIN_THROTTLE_USERNAME_ATTEMPTS": 20,
+    # failed attempts from the same ip (any username) within the window
+    "LOGIN_THROTTLE_IP_ATTEMPTS": 50,
+    # window and lockout in seconds
+    "LOGIN_THROTTLE_WINDOW": 60 * 5,
+    "LOGIN_THROTTLE_LOCKOUT": 60 * 15,
+    # request.META key with the client ip (e.g. "HTTP_X_REAL_IP" behind a proxy that sets it)
+    "LOGIN_THROTTLE_IP_HEADER": "REMOTE_ADDR",
+}
+
+
+def throttle_setting(name):
+    return getattr(settings, name, THROTTLE_DEFAULTS[name])
+
+
+THROTTLE_PREFIX = "throttle"
+# events counted by throttle_stats
+THROTTLE_EVENTS = ["failed", "locked", "rejected"]
+
+
+def client_ip(request):
+    # first address of the header (x-forwarded-for style lists)
+    header = throttle_setting("LOGIN_THROTTLE_IP_HEADER")
+    return request.META.get(header, "").split(",")[0].strip() or "unknown"
+
+
+def hashed(value):
+    # fixed length and safe characters for the cache keys
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def count_event(scope, event):
+    key = f"{THROTTLE_PREFIX}:stats:{scope}:{event}"
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(key, 1, None)
+
+
+def throttle_stats(scope):
+    # {event: total} since the cache started (per process with the local memory cache)
+    keys = {event: f"{THROTTLE_PREFIX}:stats:{scope}:{event}" for event in THROTTLE_EVENTS}
+    values = cache.get_many(keys.values())
+    return {event: values.get(key, 0) for event, key in keys.items()}
+
+
+class LoginThrottle:
+    def __init__(self, scope, request, username):
+        self.scope = scope
+        self.ip = client_ip(request)
+        self.username = (username or "").strip().lower()
+        self.window = throttle_setting("LOGIN_THROTTLE_WINDOW")
+        self.lockout = throttle_setting("LOGIN_THROTTLE_LOCKOUT")
+        # (name, key, limit) of each bucket. the username + ip bucket comes first (see success)
+        self.buckets = [
+            (
+                "usuário e ip",
+                hashed(f"user_ip|{self.username}|{self.ip}"),
+                throttle_setting("LOGIN_THROTTLE_ATTEMPTS"),
+            ),
+            (
+                "usuário",
+                hashed(f"user|{self.username}"),
+                throttle_setting("LOGIN_THROTTLE_USERNAME_ATTEMPTS"),
+            ),
+            ("ip", hashed(f"ip|{self.ip}"), throttle_setting("LOGIN_THROTTLE_IP_ATTEMPTS")),
+        ]
+
+    def key(self, kind, bucket_key):
+        return f"{THROTTLE_PREFIX}:{self.scope}:{kind}:{bucket_key}"
+
+    def locked_for(self):
+        # seconds until the lockout ends (0 if the attempt can go on)
+        lockouts = cache.get_many(
+            [self.key("lock", bucket_key) for _, bucket_key, _ in self.buckets]
+        )
+        remaining = max(lockouts.values(), default=0) - time.time()
+        if remaining <= 0:
+            return 0
+
+        count_event(self.scope, "rejected")
+        logger.warning(
+            f"{self.scope.upper()}_THROTTLE | Tentativa bloqueada: usuário {self.username!r}, ip {self.ip}."
+        )
+        return int(remaining) + 1
+
+    def window_keys(self, bucket_key, now):
+        window = int(now // self.window)
+        return (
+            self.key(f"window:{window}", bucket_key),
+            self.key(f"window:{window - 1}", bucket_key),
+        )
+
+    def attempts(self, bucket_key, now):
+        # sliding window: the previous window weighs as much as it still overlaps the current one
+        current_key, previous_key = self.window_keys(bucket_key, now)
+        counts = cache.get_many([current_key, previous_key])
+        overlap = 1 - (now % self.window) / self.window
+        return counts.get(current_key, 0) + counts.get(previous_key, 0) * overlap
+
+    def failure(self):
+        now = time.time()
+        count_event(self.scope, "failed")
+
+        for name, bucket_key, limit in self.buckets:
+            current_key, _ = self.window_keys(bucket_key, now)
+            # both windows are needed while the next one is current
+            if not cache.add(current_key, 1, self.window * 2):
+                try:
+                    cache.incr(current_key)
+                except ValueError:
+                    cache.set(current_key, 1, self.window * 2)
+
+            if self.attempts(bucket_key, now) >= limit:
+                cache.set(self.key("lock", bucket_key), now + self.lockout, self.lockout)
+                count_event(self.scope, "locked")
+                logger.warning(
+                    f"{self.scope.upper()}_THROTTLE | Bloqueio por {name}: usuário {self.username!r}, "
+                    f"ip {self.ip}, {self.lockout} segundos. Totais: {throttle_stats(self.scope)}."
+                )
+
+    def success(self):
+        # the username is no longer under attack from this ip. the username bucket (other ips)
+        # and the ip bucket are kept
+        _, bucket_key, _ = self.buckets[0]
+        now = time.time()
+        cache.delete_many([*self.window_keys(bucket_key, now), self.key("lock", bucket_key)])
+
+
+def lockout_message(seconds):
+    minutes = (seconds + 59) // 60
+    return f"Muitas tentativas. Tente novamente em {minutes} minuto(s)."
+
+
+# registered by users.apps (python manage.py check --deploy)
+def check_throttle_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        checks.Warning(
+            "The default cache is local to each process: the login throttle limits apply per worker.",
+            hint="Use a shared cache backend (e.g. redis or memcached) in CACHES['default'].",
+            id="utils.W001",
+        )
+    ]